@@ -0,0 +1,112 @@
+'''
+Created on Oct 19, 2026
+
+@author: eric5946
+
+Cache plan: the tiles of every cache level that have contours in them.
+
+The cache job (C03) draws every tile over the update extent, most of them
+empty at the 1128 and 2257 scales. The plan samples the contour lines every
+quarter of the finest tile and looks up the tiles of every level under the
+samples (TilingScheme), plus a margin of CONTOUR_CACHE_PLAN_MARGIN pixels for
+the line width and labels drawn over the tile edge. The planned tiles are
+written as polygons with Tile_Level and Tile_Scale, so the cache can be built
+one level at a time over only its tiles. The tiles that aren't in the plan are
+never drawn and the cache serves its blank tile for them.
+'''
+import arcpy
+from datetime import datetime
+
+import numpy
+
+from ngce.Utility import doTime
+from ngce.contour.ContourConfig import CONTOUR_SCALES_LIST, TILING_SCHEME, CONTOUR_CACHE_PLAN_MARGIN
+from ngce.contour import TilingScheme
+
+
+TILE_KEY = 1 << 32  # Row and col in one integer key
+
+
+'''
+--------------------------------------------------------------------------------
+Samples the line at least every step, keeping the vertices
+--------------------------------------------------------------------------------
+'''
+def densifyLine(points, step):
+    deltas = numpy.diff(points, axis=0)
+    counts = numpy.maximum(1, numpy.ceil(numpy.hypot(deltas[:, 0], deltas[:, 1]) / step)).astype(numpy.int64)
+    segments = numpy.repeat(numpy.arange(len(deltas)), counts)
+    firsts = numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    ratios = (numpy.arange(counts.sum()) - firsts) / numpy.repeat(counts, counts).astype(numpy.float64)
+    return numpy.vstack([points[segments] + deltas[segments] * ratios[:, None], points[-1:]])
+
+
+'''
+--------------------------------------------------------------------------------
+Returns the keys (row * TILE_KEY + col) of the level's tiles within margin map
+units of the samples
+--------------------------------------------------------------------------------
+'''
+def getSampleTileKeys(scheme, level, samples, margin):
+    keys = []
+    for offset_x, offset_y in [[-margin, -margin], [-margin, margin], [margin, -margin], [margin, margin]]:
+        rows, cols = scheme.getTileIndexes(level, samples[:, 0] + offset_x, samples[:, 1] + offset_y)
+        keys.append(rows * TILE_KEY + cols)
+    return numpy.unique(numpy.concatenate(keys))
+
+
+'''
+--------------------------------------------------------------------------------
+Returns {level: [rows, cols]} of the tiles of the scales the contours are in
+--------------------------------------------------------------------------------
+'''
+def getCachePlan(in_fc, scales=CONTOUR_SCALES_LIST, xml_path=TILING_SCHEME, margin_pixels=CONTOUR_CACHE_PLAN_MARGIN):
+    a = datetime.now()
+    scheme = TilingScheme.TilingScheme(xml_path)
+    spatial_ref = scheme.getSpatialReference()
+    levels = sorted([scheme.getLevel(scale) for scale in scales])
+    step = min([scheme.getTileSize(level)[0] for level in levels]) / 4.0
+    margins = dict([[level, margin_pixels * float(scheme.resolutions[scheme.levels == level][0])] for level in levels])
+
+    level_keys = dict([[level, set()] for level in levels])
+    with arcpy.da.SearchCursor(in_fc, ["SHAPE@"]) as cursor:  # @UndefinedVariable
+        for row in cursor:
+            shape = row[0]
+            if shape is None:
+                continue
+            if shape.spatialReference is not None and shape.spatialReference.factoryCode <> spatial_ref.factoryCode:
+                shape = shape.projectAs(spatial_ref)
+            for part in shape:
+                points = numpy.array([[point.X, point.Y] for point in part if point is not None], dtype=numpy.float64)
+                if len(points) < 2:
+                    continue
+                samples = densifyLine(points, step)
+                for level in levels:
+                    level_keys[level].update(getSampleTileKeys(scheme, level, samples, margins[level]).tolist())
+
+    plan = {}
+    for level in levels:
+        keys = numpy.array(sorted(level_keys[level]), dtype=numpy.int64)
+        plan[level] = [keys // TILE_KEY, keys % TILE_KEY]
+    doTime(a, "Planned {} cache tiles from {}".format(sum([len(plan[level][0]) for level in levels]), in_fc))
+    return plan
+
+
+'''
+--------------------------------------------------------------------------------
+Writes the planned tiles as polygons with Tile_Level, Tile_Scale, Tile_Row and
+Tile_Col (same as TilingScheme.writeTilePolygons).
+Returns [[scale, tile count], ...] of the levels
+--------------------------------------------------------------------------------
+'''
+def writeCachePlan(in_fc, out_path, scales=CONTOUR_SCALES_LIST, xml_path=TILING_SCHEME):
+    scheme = TilingScheme.TilingScheme(xml_path)
+    plan = getCachePlan(in_fc, scales, xml_path)
+    TilingScheme.createTileFeatureClass(out_path, scheme.getSpatialReference())
+    counts = []
+    with arcpy.da.InsertCursor(out_path, TilingScheme.getTileFieldNames()) as cursor:  # @UndefinedVariable
+        for level in sorted(plan.keys()):
+            rows, cols = plan[level]
+            TilingScheme.insertTilePolygons(cursor, scheme, level, rows, cols)
+            counts.append([scheme.getScale(level), len(rows)])
+    return counts
@@ -0,0 +1,270 @@
+'''
+Created on Oct 19, 2026
+
+@author: eric5946
+
+Reads, writes and merges Esri compact cache V2 bundles.
+
+C04 imports a project's cache into the master service through the server
+(ImportMapServerCache), which re-reads the whole project cache. The project
+and master caches share the tiling scheme, so the project's tiles can be merged
+into the master's bundle files directly, one process per bundle.
+
+A bundle holds 128 x 128 tiles of one level (Lnn folder) and is named after its
+first row and col in hex (R0080C0100.bundle):
+    header      64 bytes (version 3, 16384 records, 5 byte offsets, ...)
+    index       16384 uint64 records, row by row: the low 40 bits are the
+                offset of the tile data, the high 24 bits its size (0 if the
+                tile is empty)
+    tiles       each tile's data follows its 4 byte size
+A target bundle is only rewritten if a tile's content (md5) changed. Other
+merges into the same master can run at the same time, so a target bundle is
+read and rewritten while holding its lock file (<bundle>.lock, created with
+O_EXCL) and the new bundle replaces the old one in a single move.
+ImportMapServerCache and the server don't take the lock, see
+CONTOUR_CACHE_MERGE.
+'''
+import ctypes
+from datetime import datetime
+import errno
+from functools import partial
+import hashlib
+from multiprocessing import Pool, cpu_count
+import os
+import struct
+import time
+import xml.etree.ElementTree as ET
+
+import numpy
+
+from ngce.Utility import doTime
+
+
+CPU_HANDICAP = 1
+BUNDLE_SIZE = 128  # Tiles across a bundle
+RECORD_COUNT = BUNDLE_SIZE * BUNDLE_SIZE
+HEADER_SIZE = 64
+INDEX_SIZE = RECORD_COUNT * 8
+SIZE_SHIFT = numpy.uint64(40)
+OFFSET_MASK = numpy.uint64((1 << 40) - 1)
+BUNDLE_EXTENSION = ".bundle"
+COMPACT_V2 = "esriMapCacheStorageModeCompactV2"
+LOCK_EXTENSION = ".lock"
+LOCK_WAIT = 0.5  # Seconds between tries to take a bundle lock
+LOCK_TIMEOUT = 600  # Seconds to wait for a bundle lock before failing the merge
+MOVEFILE_REPLACE_EXISTING = 0x1
+MOVEFILE_WRITE_THROUGH = 0x8
+
+
+def getBundleName(row, col):
+    return "R{:04x}C{:04x}{}".format(row - row % BUNDLE_SIZE, col - col % BUNDLE_SIZE, BUNDLE_EXTENSION)
+
+
+def getLevelFolderName(level):
+    return "L{:02d}".format(level)
+
+
+'''
+--------------------------------------------------------------------------------
+Returns the first row and col of the bundle from its name
+--------------------------------------------------------------------------------
+'''
+def getBundleOrigin(bundle_name):
+    name = os.path.splitext(os.path.basename(bundle_name))[0].upper()
+    col_index = name.index("C")
+    return int(name[1:col_index], 16), int(name[col_index + 1:], 16)
+
+
+def isCompactV2(conf_path):
+    storage = ET.parse(conf_path).getroot().find("CacheStorageInfo/StorageFormat")
+    return storage is not None and storage.text == COMPACT_V2
+
+
+'''
+--------------------------------------------------------------------------------
+Reads the tiles of a bundle.
+Returns {record: tile data} of the tiles that aren't empty (record is
+row * 128 + col within the bundle)
+--------------------------------------------------------------------------------
+'''
+def readBundle(bundle_path):
+    tiles = {}
+    if os.path.exists(bundle_path):
+        with open(bundle_path, "rb") as bundle:
+            data = bundle.read()
+        index = numpy.frombuffer(data, dtype="<u8", count=RECORD_COUNT, offset=HEADER_SIZE)
+        sizes = index >> SIZE_SHIFT
+        offsets = index & OFFSET_MASK
+        for record in numpy.flatnonzero(sizes > 0):
+            offset = int(offsets[record])
+            tiles[int(record)] = data[offset:offset + int(sizes[record])]
+    return tiles
+
+
+'''
+--------------------------------------------------------------------------------
+Takes the lock of a bundle, waiting up to LOCK_TIMEOUT seconds for another
+merge to release it.
+Returns the path of the lock file
+--------------------------------------------------------------------------------
+'''
+def lockBundle(bundle_path):
+    folder = os.path.dirname(bundle_path)
+    if not os.path.exists(folder):
+        try:
+            os.makedirs(folder)
+        except OSError:
+            # Made by another merge in the meantime
+            if not os.path.isdir(folder):
+                raise
+    lock_path = bundle_path + LOCK_EXTENSION
+    start = time.time()
+    while True:
+        try:
+            lock = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.write(lock, str(os.getpid()))
+            os.close(lock)
+            return lock_path
+        except OSError as e:
+            if e.errno <> errno.EEXIST:
+                raise
+        if time.time() - start > LOCK_TIMEOUT:
+            raise Exception("Timed out waiting for the bundle lock {}".format(lock_path))
+        time.sleep(LOCK_WAIT)
+
+
+def unlockBundle(lock_path):
+    os.remove(lock_path)
+
+
+'''
+--------------------------------------------------------------------------------
+Moves the file over the target in one step (rename on POSIX, MoveFileEx on
+Windows where rename won't replace a file), so readers see the old or the new
+file and never a missing one.
+--------------------------------------------------------------------------------
+'''
+def replaceFile(source_path, target_path):
+    if os.name == "nt":
+        if not ctypes.windll.kernel32.MoveFileExW(unicode(source_path), unicode(target_path), MOVEFILE_REPLACE_EXISTING | MOVEFILE_WRITE_THROUGH):  # @UndefinedVariable
+            raise ctypes.WinError()  # @UndefinedVariable
+    else:
+        os.rename(source_path, target_path)
+
+
+'''
+--------------------------------------------------------------------------------
+Writes the tiles ({record: tile data}) as a bundle. It's written under a
+temporary name and moved over the bundle, so a failed write doesn't leave a
+broken bundle. The caller holds the bundle lock.
+--------------------------------------------------------------------------------
+'''
+def writeBundle(bundle_path, tiles):
+    index = numpy.zeros(RECORD_COUNT, dtype="<u8")
+    chunks = []
+    offset = HEADER_SIZE + INDEX_SIZE
+    max_size = 0
+    for record in sorted(tiles.keys()):
+        tile = tiles[record]
+        chunks.append(struct.pack("<I", len(tile)))
+        chunks.append(tile)
+        offset = offset + 4
+        index[record] = (len(tile) << 40) | offset
+        offset = offset + len(tile)
+        max_size = max(max_size, len(tile))
+
+    header = struct.pack("<IIIIQQQIIIIII", 3, RECORD_COUNT, max_size, 5, 4, offset, 40, 20 + INDEX_SIZE, 3, 16, RECORD_COUNT, 5, INDEX_SIZE)
+    folder = os.path.dirname(bundle_path)
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    tmp_path = "{}.tmp".format(bundle_path)
+    with open(tmp_path, "wb") as bundle:
+        bundle.write(header)
+        bundle.write(index.tostring())
+        for chunk in chunks:
+            bundle.write(chunk)
+    replaceFile(tmp_path, bundle_path)
+
+
+'''
+--------------------------------------------------------------------------------
+Process pool task: merges the tiles of a source bundle into the target bundle
+of the same name. tile_range is the first row, last row, first col and last
+col of the tiles to merge (None for all of them).
+Returns [tiles changed, tiles in the source]
+--------------------------------------------------------------------------------
+'''
+def mergeBundle(tile_range, paths):
+    source_path, target_path = paths
+    source_tiles = readBundle(source_path)
+    if tile_range is not None and len(source_tiles) > 0:
+        first_row, first_col = getBundleOrigin(source_path)
+        first, last, left, right = tile_range
+        source_tiles = dict([[record, tile] for record, tile in source_tiles.iteritems()
+                             if first <= first_row + record // BUNDLE_SIZE <= last and left <= first_col + record % BUNDLE_SIZE <= right])
+
+    if len(source_tiles) == 0:
+        return [0, 0]
+
+    # The target is read under the lock so a merge running at the same time isn't overwritten
+    changed = 0
+    lock_path = lockBundle(target_path)
+    try:
+        target_tiles = readBundle(target_path)
+        for record, tile in source_tiles.iteritems():
+            target_tile = target_tiles.get(record)
+            if target_tile is None or len(target_tile) <> len(tile) or hashlib.md5(target_tile).digest() <> hashlib.md5(tile).digest():
+                target_tiles[record] = tile
+                changed = changed + 1
+        if changed > 0:
+            writeBundle(target_path, target_tiles)
+    finally:
+        unlockBundle(lock_path)
+    return [changed, len(source_tiles)]
+
+
+'''
+--------------------------------------------------------------------------------
+Merges the bundles of every level of the source cache (the _alllayers folder)
+into the target cache, one process per bundle. tile_ranges is
+{level folder name: [first row, last row, first col, last col]} to only merge
+the tiles in those ranges, levels that aren't in it are merged whole.
+Returns [tiles changed, tiles in the source]
+--------------------------------------------------------------------------------
+'''
+def mergeCache(source_folder, target_folder, tile_ranges=None):
+    a = datetime.now()
+    if tile_ranges is None:
+        tile_ranges = {}
+    changed = 0
+    total = 0
+    pool = Pool(processes=max(1, cpu_count() - CPU_HANDICAP))
+    try:
+        for level_name in sorted(os.listdir(source_folder)):
+            source_level = os.path.join(source_folder, level_name)
+            if not os.path.isdir(source_level):
+                continue
+            tile_range = tile_ranges.get(level_name)
+            paths = [[os.path.join(source_level, f), os.path.join(target_folder, level_name, f)]
+                     for f in os.listdir(source_level) if f.lower().endswith(BUNDLE_EXTENSION)]
+            if tile_range is not None:
+                # Skip the bundles outside the range
+                paths = [path for path in paths if isBundleInRange(path[0], tile_range)]
+            level_changed = 0
+            level_total = 0
+            for bundle_changed, bundle_total in pool.imap_unordered(partial(mergeBundle, tile_range), paths):
+                level_changed = level_changed + bundle_changed
+                level_total = level_total + bundle_total
+            a = doTime(a, "\t{}: Merged {} changed of {} tiles from {} bundles".format(level_name, level_changed, level_total, len(paths)))
+            changed = changed + level_changed
+            total = total + level_total
+    finally:
+        pool.close()
+        pool.join()
+    return [changed, total]
+
+
+def isBundleInRange(bundle_path, tile_range):
+    first_row, first_col = getBundleOrigin(bundle_path)
+    first, last, left, right = tile_range
+    return first_row <= last and first_row + BUNDLE_SIZE > first and first_col <= right and first_col + BUNDLE_SIZE > left
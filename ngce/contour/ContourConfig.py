@@ -13,6 +13,14 @@ CONTOUR_SCALES_STRING = "9027.977411;4513.988705;2256.994353;1128.497176"
 CONTOUR_SCALES_NUM = 4
 CONTOUR_2FT_SERVICE_NAME = "CONT_2FT"
 CACHE_INSTANCES = 6  # This should be increased based on server resources
+CONTOUR_CACHE_PLAN = True  # Only build the cache tiles with contours in them (CachePlan) instead of every tile over the raster boundary
+CONTOUR_CACHE_PLAN_MARGIN = 32  # Pixels around the contours (line width, labels) whose tiles are built too
+CONTOUR_CACHE_MERGE = False  # Merge the project's compact cache bundles into the master cache files instead of ImportMapServerCache, only safe when nothing but other C04 merges writes the master cache
+CONTOUR_VECTOR_TILES = False  # Write the contour vector tiles (MBTiles) to the cache folder before the server cache is built, nothing serves them yet
+CONTOUR_MVT_LAYER = "contours"
+CONTOUR_MVT_EXTENT = 4096  # Tile coordinates across a vector tile
+CONTOUR_MVT_BUFFER = 64  # Tile coordinates of the lines kept around a vector tile
+CONTOUR_MVT_SIMPLIFY = 0.5  # Pixels of the level's resolution the vector tile lines are simplified by
 # CACHE_FOLDER = "E:/arcgisserver/directories/arcgiscache"
 #CACHE_FOLDER = r"\\aiotxftw6na01data\SMB03\elevation\LiDAR\cache" #Replaced with following line 22 Mar 2019 BJN
 CACHE_FOLDER = r"\\aiotxftw6na01\SMB03\elevation\LiDAR\cache"
@@ -23,6 +31,15 @@ CONTOUR_NAME_WM = 'Contours_WM'
 CONTOUR_INTERVAL = 2
 CONTOUR_UNIT = "FOOT_US"
 CONTOUR_SMOOTH_UNIT = 0.0001  # Decimal degrees. Larger values create smoother contours
+CONTOUR_SIMPLIFY_UNIT = 0.000001  # Decimal degrees
+CONTOUR_NUMPY_ENGINE = True  # Trace the tile contours with ContourEngine instead of the Contour/SimplifyLine/SmoothLine/Clip tools
+CONTOUR_STITCH = True  # Join the tile contours on the seams instead of buffering the tiles (needs CONTOUR_NUMPY_ENGINE)
+CONTOUR_STITCH_HALO = 2  # Cells read around the tile footprint when stitching
+CONTOUR_VERIFY_CHECKSUM = False  # Read back the tile outputs and match their checksum on resume instead of their size and modification time
+CONTOUR_APPEND_CHUNK = 10000  # Rows per insert when appending the tile contours to the merged outputs
+CONTOUR_SPOT_HEIGHTS = False  # Write the HIGH/LOW spot heights of every tile (O12_Spots_<name>.shp), nothing merges or publishes them yet
+CONTOUR_SPOT_HALO = 100  # Cells read around the tile for the spot heights, the regions crossing the tile edge have to close within it
+CONTOUR_SPOT_MIN_CELLS = 4  # Smallest region between two contours that gets a spot height
 DISTANCE_TO_CLIP_MOSAIC_DATASET = 200  # Meters. Note if too small, contours from different tiles wont smooth together
 DISTANCE_TO_CLIP_CONTOURS = 5  # Meters. Note larger numbers will create too much overlap
 CONTOUR_GDB_NAME = r"Contours.gdb"
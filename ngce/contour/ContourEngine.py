@@ -0,0 +1,759 @@
+'''
+Created on Oct 19, 2026
+
+@author: eric5946
+
+NumPy contour engine for the tiled contours (C01).
+
+Replaces the Contour -> SimplifyLine -> SmoothLine (PAEK) -> Clip chain, and
+its O08..O10 intermediate shapefiles, with one read of the tile's DTM block
+and one write of the clipped contours:
+    1. marching squares over the block at every multiple of the interval
+       (the cell corners are the pixel centers, saddles are resolved by the
+       mean of the cell)
+    2. the segments are chained into lines through their shared cell edges
+    3. Douglas-Peucker simplification (CONTOUR_SIMPLIFY_UNIT) and PAEK style
+       smoothing (CONTOUR_SMOOTH_UNIT), a Gaussian weighted average of the
+       line over a window the length of the tolerance. Like the cartography
+       tools the tolerances are in decimal degrees.
+    4. the lines are clipped to the tile polygon and written with a single
+       insert cursor with the final contour fields (CONTOUR, CTYPE, INDEX,
+       UNITS and name)
+
+In stitching mode (CONTOUR_STITCH) the tiles aren't buffered. Every tile is
+traced with a halo of CONTOUR_STITCH_HALO cells and its lines are clipped to
+the footprint. The lines the clip didn't cut are smoothed and written by the
+tile like any other contours. Only the raw lines with an end on the footprint
+edge (the seams) are saved. stitchContours then joins those ends by level and
+end point and smooths the joined lines, so the contours are continuous across
+the tiles without the overlap, and only the seam lines are held in memory.
+'''
+import arcpy
+from collections import defaultdict
+from datetime import datetime
+from itertools import izip
+import math
+import os
+
+import numpy
+
+from ngce.Utility import doTime
+from ngce.contour.ContourConfig import CONTOUR_SMOOTH_UNIT, CONTOUR_SIMPLIFY_UNIT, CONTOUR_STITCH_HALO, \
+    CONTOUR_APPEND_CHUNK
+
+
+METERS_PER_DEGREE = 111319.49079327357  # WGS 84 equator
+SMOOTH_SAMPLES = 8  # Resampled vertices per smoothing tolerance
+
+CONTOUR_TYPES = [10, 20, 50, 100, 500, 1000, 5000]
+CONTOUR_FIELDS = [["CONTOUR", "DOUBLE", None], ["CTYPE", "LONG", None], ["INDEX", "LONG", None], ["UNITS", "TEXT", 20], ["name", "TEXT", 79]]
+
+# Cell edges, the corners are top left (r, c), top right (r, c+1),
+# bottom right (r+1, c+1) and bottom left (r+1, c)
+TOP = 0
+RIGHT = 1
+BOTTOM = 2
+LEFT = 3
+EDGE_FROM_ROW = numpy.array([0, 0, 1, 0])
+EDGE_FROM_COL = numpy.array([0, 1, 0, 0])
+EDGE_TO_ROW = numpy.array([0, 1, 1, 1])
+EDGE_TO_COL = numpy.array([1, 1, 1, 0])
+EDGE_VERTICAL = numpy.array([0, 1, 0, 1])
+
+# Segments (edge pairs) of every cell case. The case is
+# 8 * top left + 4 * top right + 2 * bottom right + bottom left (corner >= level)
+# 16 and 17 are the saddles 5 and 10 with the cell mean above the level
+SADDLE_5_ABOVE = 16
+SADDLE_10_ABOVE = 17
+CASE_SEGMENTS = numpy.array([
+    [[-1, -1], [-1, -1]],  # 0
+    [[LEFT, BOTTOM], [-1, -1]],  # 1
+    [[BOTTOM, RIGHT], [-1, -1]],  # 2
+    [[LEFT, RIGHT], [-1, -1]],  # 3
+    [[TOP, RIGHT], [-1, -1]],  # 4
+    [[TOP, RIGHT], [LEFT, BOTTOM]],  # 5
+    [[TOP, BOTTOM], [-1, -1]],  # 6
+    [[LEFT, TOP], [-1, -1]],  # 7
+    [[LEFT, TOP], [-1, -1]],  # 8
+    [[TOP, BOTTOM], [-1, -1]],  # 9
+    [[LEFT, TOP], [BOTTOM, RIGHT]],  # 10
+    [[TOP, RIGHT], [-1, -1]],  # 11
+    [[LEFT, RIGHT], [-1, -1]],  # 12
+    [[BOTTOM, RIGHT], [-1, -1]],  # 13
+    [[LEFT, BOTTOM], [-1, -1]],  # 14
+    [[-1, -1], [-1, -1]],  # 15
+    [[LEFT, TOP], [BOTTOM, RIGHT]],  # 16
+    [[TOP, RIGHT], [LEFT, BOTTOM]]  # 17
+])
+
+
+'''
+--------------------------------------------------------------------------------
+Converts a tolerance in decimal degrees to the units of the spatial reference
+--------------------------------------------------------------------------------
+'''
+def getMapTolerance(tolerance, spatial_ref):
+    if spatial_ref.type == "Geographic":
+        return tolerance
+    return tolerance * METERS_PER_DEGREE / spatial_ref.metersPerUnit
+
+
+'''
+--------------------------------------------------------------------------------
+Reads the block of the (referenced) mosaic dataset under the extent, snapped to
+the raster cells, plus halo cells on every side. NoData is NaN.
+Returns values, x of the left edge, y of the top edge, cell width, cell height
+or None if the block is less than 2 x 2 cells
+--------------------------------------------------------------------------------
+'''
+def readBlock(md_path, extent, halo=0):
+    raster = arcpy.Raster(md_path)
+    cell_width = raster.meanCellWidth
+    cell_height = raster.meanCellHeight
+    r_extent = raster.extent
+
+    x_min = r_extent.XMin + math.floor((max(extent.XMin - halo * cell_width, r_extent.XMin) - r_extent.XMin) / cell_width) * cell_width
+    y_max = r_extent.YMax - math.floor((r_extent.YMax - min(extent.YMax + halo * cell_height, r_extent.YMax)) / cell_height) * cell_height
+    cols = int(math.ceil((min(extent.XMax + halo * cell_width, r_extent.XMax) - x_min) / cell_width))
+    rows = int(math.ceil((y_max - max(extent.YMin - halo * cell_height, r_extent.YMin)) / cell_height))
+    if cols < 2 or rows < 2:
+        return None
+
+    values = arcpy.RasterToNumPyArray(raster, arcpy.Point(x_min, y_max - rows * cell_height), cols, rows, numpy.nan)
+    return values.astype(numpy.float64), x_min, y_max, cell_width, cell_height
+
+
+'''
+--------------------------------------------------------------------------------
+Marching squares over every level (multiple of the interval) at once.
+Only the cells a level crosses are visited: a cell with corners from z_min to
+z_max is crossed by the levels in (z_min, z_max].
+Returns the level index of every segment and the row, col and edge id of both
+segment ends (rows and cols are fractional pixel positions)
+--------------------------------------------------------------------------------
+'''
+def getSegments(values, interval):
+    cols = values.shape[1]
+    tl = values[:-1, :-1]
+    tr = values[:-1, 1:]
+    br = values[1:, 1:]
+    bl = values[1:, :-1]
+    # NaN corners propagate, those cells aren't contoured
+    cell_min = numpy.minimum(numpy.minimum(tl, tr), numpy.minimum(br, bl))
+    cell_max = numpy.maximum(numpy.maximum(tl, tr), numpy.maximum(br, bl))
+    cells = numpy.flatnonzero(numpy.isfinite(cell_min))
+    k_first = numpy.floor(cell_min.flat[cells] / interval).astype(numpy.int64) + 1
+    k_last = numpy.floor(cell_max.flat[cells] / interval).astype(numpy.int64)
+    counts = numpy.maximum(k_last - k_first + 1, 0)
+
+    # One (cell, level) pair per crossing
+    cells = numpy.repeat(cells, counts)
+    k = numpy.repeat(k_first, counts) + numpy.arange(len(cells)) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    levels = k * float(interval)
+    r = cells // (cols - 1)
+    c = cells % (cols - 1)
+
+    z_tl = values[r, c]
+    z_tr = values[r, c + 1]
+    z_br = values[r + 1, c + 1]
+    z_bl = values[r + 1, c]
+    cases = (z_tl >= levels) * 8 + (z_tr >= levels) * 4 + (z_br >= levels) * 2 + (z_bl >= levels) * 1
+    center_above = (z_tl + z_tr + z_br + z_bl) / 4.0 >= levels
+    cases[(cases == 5) & center_above] = SADDLE_5_ABOVE
+    cases[(cases == 10) & center_above] = SADDLE_10_ABOVE
+
+    first = CASE_SEGMENTS[cases, 0]
+    second = CASE_SEGMENTS[cases, 1]
+    has_first = first[:, 0] >= 0
+    has_second = second[:, 0] >= 0
+    seg_k = numpy.concatenate([k[has_first], k[has_second]])
+    seg_r = numpy.concatenate([r[has_first], r[has_second]])
+    seg_c = numpy.concatenate([c[has_first], c[has_second]])
+    seg_levels = numpy.concatenate([levels[has_first], levels[has_second]])
+    seg_edges = numpy.concatenate([first[has_first], second[has_second]])
+
+    ends = []
+    for end in range(2):
+        edges = seg_edges[:, end]
+        r0 = seg_r + EDGE_FROM_ROW[edges]
+        c0 = seg_c + EDGE_FROM_COL[edges]
+        r1 = seg_r + EDGE_TO_ROW[edges]
+        c1 = seg_c + EDGE_TO_COL[edges]
+        z0 = values[r0, c0]
+        t = (seg_levels - z0) / (values[r1, c1] - z0)
+        # Edges are shared by the neighbor cells, so they're named by their first pixel
+        ends.append([r0 + t * (r1 - r0), c0 + t * (c1 - c0), (r0 * cols + c0) * 2 + EDGE_VERTICAL[edges]])
+
+    return seg_k, ends[0], ends[1]
+
+
+'''
+--------------------------------------------------------------------------------
+Chains the segments (pairs of edge ids) of one level into lines.
+Every edge is shared by at most 2 segments, so the lines are paths through the
+edges: open lines start at an edge with 1 segment (the block border or NoData),
+what's left are closed rings.
+Returns a list of lines, each a list of edge ids (closed rings repeat the first)
+--------------------------------------------------------------------------------
+'''
+def chainSegments(from_ids, to_ids):
+    neighbors = defaultdict(list)
+    for from_id, to_id in izip(from_ids, to_ids):
+        neighbors[from_id].append(to_id)
+        neighbors[to_id].append(from_id)
+
+    lines = []
+    visited = set()
+    starts = [edge_id for edge_id, edge_neighbors in neighbors.iteritems() if len(edge_neighbors) == 1]
+    for start in starts + neighbors.keys():
+        if start in visited:
+            continue
+        visited.add(start)
+        line = [start]
+        edge_id = start
+        while True:
+            next_id = None
+            for neighbor in neighbors[edge_id]:
+                if neighbor not in visited:
+                    next_id = neighbor
+                    break
+            if next_id is None:
+                break
+            visited.add(next_id)
+            line.append(next_id)
+            edge_id = next_id
+        if len(line) > 2 and start in neighbors[line[-1]]:
+            line.append(start)
+        if len(line) > 1:
+            lines.append(line)
+    return lines
+
+
+'''
+--------------------------------------------------------------------------------
+Traces the contours of the values at every multiple of the interval
+Returns a list of [level, points] with points as an n x 2 array of (col, row)
+pixel positions
+--------------------------------------------------------------------------------
+'''
+def traceContours(values, interval):
+    contours = []
+    seg_k, from_end, to_end = getSegments(values, interval)
+    if len(seg_k) == 0:
+        return contours
+
+    order = numpy.argsort(seg_k, kind="mergesort")
+    seg_k = seg_k[order]
+    from_end = [part[order] for part in from_end]
+    to_end = [part[order] for part in to_end]
+    bounds = numpy.flatnonzero(numpy.diff(seg_k)) + 1
+    for first, last in izip(numpy.concatenate([[0], bounds]), numpy.concatenate([bounds, [len(seg_k)]])):
+        level = seg_k[first] * float(interval)
+        from_ids = from_end[2][first:last]
+        to_ids = to_end[2][first:last]
+        ids, index = numpy.unique(numpy.concatenate([from_ids, to_ids]), return_index=True)
+        points = numpy.column_stack([numpy.concatenate([from_end[1][first:last], to_end[1][first:last]])[index],
+                                     numpy.concatenate([from_end[0][first:last], to_end[0][first:last]])[index]])
+        for line in chainSegments(from_ids.tolist(), to_ids.tolist()):
+            contours.append([level, points[numpy.searchsorted(ids, line)]])
+    return contours
+
+
+'''
+--------------------------------------------------------------------------------
+Douglas-Peucker line simplification, keeps the first and last points
+--------------------------------------------------------------------------------
+'''
+def simplifyLine(points, tolerance):
+    if len(points) < 3 or tolerance <= 0:
+        return points
+    keep = numpy.zeros(len(points), dtype=bool)
+    keep[0] = True
+    keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while len(stack) > 0:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        dx, dy = points[last] - points[first]
+        inner = points[first + 1:last] - points[first]
+        length = math.hypot(dx, dy)
+        if length > 0:
+            distance = numpy.abs(inner[:, 0] * dy - inner[:, 1] * dx) / length
+        else:
+            # Closed ring, distance from the start
+            distance = numpy.hypot(inner[:, 0], inner[:, 1])
+        index = numpy.argmax(distance)
+        if distance[index] > tolerance:
+            split = first + 1 + index
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return points[keep]
+
+
+'''
+--------------------------------------------------------------------------------
+PAEK style smoothing: the line is resampled at even steps and every vertex is
+moved to the Gaussian weighted average of the line within half the tolerance
+on either side. Open lines keep their end points, closed rings wrap around.
+--------------------------------------------------------------------------------
+'''
+def smoothLine(points, tolerance, closed):
+    if len(points) < 3 or tolerance <= 0:
+        return points
+    distance = numpy.concatenate([[0], numpy.cumsum(numpy.hypot(*numpy.diff(points, axis=0).T))])
+    length = distance[-1]
+    step = float(tolerance) / SMOOTH_SAMPLES
+    if length <= step * 2:
+        return points
+
+    stations = numpy.linspace(0, length, int(math.ceil(length / step)) + 1)
+    half = SMOOTH_SAMPLES / 2
+    offsets = numpy.arange(-half, half + 1, dtype=numpy.float64)
+    weights = numpy.exp(-0.5 * (offsets / (half / 2.0)) ** 2)
+    smoothed = []
+    for axis in range(2):
+        samples = numpy.interp(stations, distance, points[:, axis])
+        if closed:
+            samples = samples[:-1]
+            padded = numpy.take(samples, numpy.arange(-half, len(samples) + half), mode="wrap")
+            samples = numpy.convolve(padded, weights / weights.sum(), "valid")
+            samples = numpy.append(samples, samples[0])
+        else:
+            first = samples[0]
+            last = samples[-1]
+            samples = numpy.convolve(samples, weights, "same") / numpy.convolve(numpy.ones(len(samples)), weights, "same")
+            samples[0] = first
+            samples[-1] = last
+        smoothed.append(samples)
+    return numpy.column_stack(smoothed)
+
+
+'''
+--------------------------------------------------------------------------------
+Returns True if the extent of the points is outside the extent
+--------------------------------------------------------------------------------
+'''
+def isOutside(points, extent):
+    x_min, y_min = points.min(axis=0)
+    x_max, y_max = points.max(axis=0)
+    return x_max < extent.XMin or x_min > extent.XMax or y_max < extent.YMin or y_min > extent.YMax
+
+
+'''
+--------------------------------------------------------------------------------
+Clips the line to the polygon
+Returns a list of the clipped parts (n x 2 arrays)
+--------------------------------------------------------------------------------
+'''
+def clipLine(points, clip_poly, spatial_ref):
+    parts = []
+    if not isOutside(points, clip_poly.extent):
+        line = getPolyline(points, spatial_ref).intersect(clip_poly, 2)
+        for part in line:
+            part = numpy.array([[point.X, point.Y] for point in part if point is not None])
+            if len(part) > 1:
+                parts.append(part)
+    return parts
+
+
+'''
+--------------------------------------------------------------------------------
+Contour type (CTYPE) of the contour values, the largest of CONTOUR_TYPES the
+value is a multiple of, otherwise 2
+--------------------------------------------------------------------------------
+'''
+def getContourTypes(levels):
+    types = numpy.full(len(levels), 2, dtype=numpy.int32)
+    for multiple in CONTOUR_TYPES:
+        types[numpy.mod(levels, multiple) == 0] = multiple
+    return types
+
+
+'''
+--------------------------------------------------------------------------------
+Index contour (INDEX) flag of the contour values, 1 for every fifth interval
+--------------------------------------------------------------------------------
+'''
+def getContourIndexes(levels, interval):
+    return (numpy.mod(levels, int(interval * 5)) == 0).astype(numpy.int32)
+
+
+def createContourFeatureClass(out_path, spatial_ref):
+    out_folder, out_name = os.path.split(out_path)
+    arcpy.CreateFeatureclass_management(out_path=out_folder, out_name=out_name, geometry_type="POLYLINE", spatial_reference=spatial_ref)
+    for field_name, field_type, field_length in CONTOUR_FIELDS:
+        arcpy.AddField_management(in_table=out_path, field_name=field_name, field_type=field_type, field_length=field_length)
+
+
+def getContourFieldNames():
+    return ["SHAPE@"] + [field[0] for field in CONTOUR_FIELDS]
+
+
+'''
+--------------------------------------------------------------------------------
+Creates a polyline feature class with the final contour fields and writes the
+lines in one insert, CTYPE and INDEX are calculated from the levels up front.
+lines is an iterable of polylines (or None to skip the level), names is the
+name of every line.
+If projected_path is given the lines are also projected to projected_ref and
+written there in the same pass.
+Returns the number of features written
+--------------------------------------------------------------------------------
+'''
+def writeContourFeatures(out_path, spatial_ref, levels, lines, names, interval, units, projected_path=None, projected_ref=None):
+    createContourFeatureClass(out_path, spatial_ref)
+    if projected_path is not None:
+        createContourFeatureClass(projected_path, projected_ref)
+
+    levels = numpy.array(levels, dtype=numpy.float64)
+    types = getContourTypes(levels)
+    indexes = getContourIndexes(levels, interval)
+    count = 0
+    projected_cursor = None
+    with arcpy.da.InsertCursor(out_path, getContourFieldNames()) as cursor:  # @UndefinedVariable
+        try:
+            if projected_path is not None:
+                projected_cursor = arcpy.da.InsertCursor(projected_path, getContourFieldNames())  # @UndefinedVariable
+            for line, level, contour_type, contour_index, name in izip(lines, levels, types, indexes, names):
+                if line is not None:
+                    row = [line, float(level), int(contour_type), int(contour_index), units, name]
+                    cursor.insertRow(row)
+                    if projected_cursor is not None:
+                        projected_cursor.insertRow([line.projectAs(projected_ref)] + row[1:])
+                    count = count + 1
+        finally:
+            del projected_cursor
+    return count
+
+
+def getPolyline(points, spatial_ref):
+    return arcpy.Polyline(arcpy.Array([arcpy.Point(x, y) for x, y in points]), spatial_ref)
+
+
+def getClippedPolyline(points, clip_poly, spatial_ref):
+    line = None
+    if not isOutside(points, clip_poly.extent):
+        line = getPolyline(points, spatial_ref).intersect(clip_poly, 2)
+        if line.length <= 0:
+            line = None
+    return line
+
+
+'''
+--------------------------------------------------------------------------------
+Clips the contour lines ([level, points] in map units) to the polygon and
+writes them with the final contour fields
+Returns the number of features written
+--------------------------------------------------------------------------------
+'''
+def writeContours(out_path, contours, clip_poly, spatial_ref, name, interval, units, projected_path=None, projected_ref=None):
+    lines = (getClippedPolyline(points, clip_poly, spatial_ref) for level, points in contours)
+    return writeContourFeatures(out_path, spatial_ref, [level for level, points in contours], lines, [name] * len(contours), interval, units, projected_path, projected_ref)
+
+
+'''
+--------------------------------------------------------------------------------
+Copies the contours of the Contour tool chain (SHAPE, CONTOUR) to a feature
+class with the final contour fields
+Returns the number of features written
+--------------------------------------------------------------------------------
+'''
+def copyContours(in_path, out_path, name, interval, units, projected_path=None, projected_ref=None):
+    rows = [row for row in arcpy.da.SearchCursor(in_path, ["SHAPE@", "CONTOUR"]) if row[0] is not None]  # @UndefinedVariable
+    return writeContourFeatures(out_path, arcpy.Describe(in_path).spatialReference, [row[1] for row in rows], [row[0] for row in rows], [name] * len(rows), interval, units, projected_path, projected_ref)
+
+
+'''
+--------------------------------------------------------------------------------
+Traces the contours of the mosaic dataset under the extent (plus halo cells on
+every side) at every multiple of the interval
+Returns a list of [level, points] with the points in map units
+--------------------------------------------------------------------------------
+'''
+def getContourLines(md_path, extent, interval, halo=0):
+    a = datetime.now()
+    contours = []
+    block = readBlock(md_path, extent, halo)
+    if block is not None:
+        values, x_min, y_max, cell_width, cell_height = block
+        a = doTime(a, "\tRead {} x {} block from {}".format(values.shape[1], values.shape[0], md_path))
+        for level, points in traceContours(values, interval):
+            # Pixel positions to the pixel centers in map units
+            points = numpy.column_stack([x_min + (points[:, 0] + 0.5) * cell_width, y_max - (points[:, 1] + 0.5) * cell_height])
+            contours.append([level, points])
+        doTime(a, "\tTraced {} contour lines".format(len(contours)))
+    return contours
+
+
+def isClosed(points):
+    return len(points) > 3 and numpy.array_equal(points[0], points[-1])
+
+
+'''
+--------------------------------------------------------------------------------
+Creates the clipped, simplified and smoothed contours of the mosaic dataset
+under the extent at every multiple of the interval, with the final contour
+fields (name is the tile name). If projected_path is given they're also
+written there projected to projected_ref.
+Returns the number of contour features written to out_path
+--------------------------------------------------------------------------------
+'''
+def createContours(md_path, extent, clip_poly, interval, out_path, name, units, smooth_tolerance=CONTOUR_SMOOTH_UNIT, simplify_tolerance=CONTOUR_SIMPLIFY_UNIT, projected_path=None, projected_ref=None):
+    a = datetime.now()
+    spatial_ref = arcpy.Describe(md_path).spatialReference
+    smooth_tolerance = getMapTolerance(smooth_tolerance, spatial_ref)
+    simplify_tolerance = getMapTolerance(simplify_tolerance, spatial_ref)
+
+    contours = []
+    for level, points in getContourLines(md_path, extent, interval):
+        closed = isClosed(points)
+        points = simplifyLine(points, simplify_tolerance)
+        points = smoothLine(points, smooth_tolerance, closed)
+        points = simplifyLine(points, simplify_tolerance)
+        contours.append([level, points])
+
+    count = writeContours(out_path, contours, clip_poly, spatial_ref, name, interval, units, projected_path, projected_ref)
+    doTime(a, "\tWrote {} contours to {}".format(count, out_path))
+    return count
+
+
+def getTileLinesPath(folder, name):
+    return os.path.join(folder, "O11_Lines_{}.npz".format(name))
+
+
+'''
+--------------------------------------------------------------------------------
+Saves the lines of a tile as level, offset (of the first point) and points
+arrays. The file is written under a temporary name and renamed, so it only
+exists when it's complete.
+--------------------------------------------------------------------------------
+'''
+def saveTileLines(lines_path, contours):
+    levels = numpy.array([level for level, points in contours], dtype=numpy.float64)
+    counts = numpy.array([len(points) for level, points in contours], dtype=numpy.int64)
+    offsets = numpy.concatenate([[0], numpy.cumsum(counts)]).astype(numpy.int64)
+    points = numpy.zeros((0, 2), dtype=numpy.float64)
+    if len(contours) > 0:
+        points = numpy.concatenate([points for level, points in contours])
+
+    tmp_path = "{}.tmp.npz".format(os.path.splitext(lines_path)[0])
+    numpy.savez(tmp_path, levels=levels, offsets=offsets, points=points)
+    if os.path.exists(lines_path):
+        os.remove(lines_path)
+    os.rename(tmp_path, lines_path)
+
+
+def loadTileLines(lines_path):
+    data = numpy.load(lines_path)
+    levels = data["levels"]
+    offsets = data["offsets"]
+    points = data["points"]
+    return [[levels[i], points[offsets[i]:offsets[i + 1]]] for i in range(len(levels))]
+
+
+'''
+--------------------------------------------------------------------------------
+Returns True if the clip cut the line, so an end of the part is on the footprint
+edge and has to be joined with the neighbor tile. Parts that are rings or end
+where the traced line ends (the edge of the data) are complete.
+--------------------------------------------------------------------------------
+'''
+def isSeamLine(part, points, snap):
+    if isClosed(part):
+        return False
+    for end in [part[0], part[-1]]:
+        if min(math.hypot(*(end - points[0])), math.hypot(*(end - points[-1]))) > snap:
+            return True
+    return False
+
+
+'''
+--------------------------------------------------------------------------------
+Stitching mode tile task: traces the tile with a halo of a few cells and clips
+the lines to the tile footprint.
+ - Lines the clip didn't cut are simplified, smoothed and written to out_path
+   (and projected_path) with the final contour fields, same as createContours.
+ - Lines cut by the clip end exactly on the footprint, where the neighbor
+   tile's lines start. They're saved raw to lines_path to be joined later by
+   stitchContours.
+Returns the number of lines written plus the number of seam lines saved
+--------------------------------------------------------------------------------
+'''
+def createTileLines(md_path, footprint, interval, lines_path, out_path, name, units, smooth_tolerance=CONTOUR_SMOOTH_UNIT, simplify_tolerance=CONTOUR_SIMPLIFY_UNIT,
+                    halo=CONTOUR_STITCH_HALO, projected_path=None, projected_ref=None):
+    a = datetime.now()
+    spatial_ref = arcpy.Describe(md_path).spatialReference
+    smooth_tolerance = getMapTolerance(smooth_tolerance, spatial_ref)
+    simplify_tolerance = getMapTolerance(simplify_tolerance, spatial_ref)
+
+    seam_contours = []
+    levels = []
+    lines = []
+    for level, points in getContourLines(md_path, footprint.extent, interval, halo):
+        for part in clipLine(points, footprint, spatial_ref):
+            if isSeamLine(part, points, simplify_tolerance):
+                # Simplifying keeps the end points, so they still match the neighbors
+                seam_contours.append([level, simplifyLine(part, simplify_tolerance)])
+            else:
+                closed = isClosed(part)
+                part = simplifyLine(part, simplify_tolerance)
+                part = smoothLine(part, smooth_tolerance, closed)
+                levels.append(level)
+                lines.append(getPolyline(simplifyLine(part, simplify_tolerance), spatial_ref))
+
+    count = writeContourFeatures(out_path, spatial_ref, levels, lines, [name] * len(lines), interval, units, projected_path, projected_ref)
+    saveTileLines(lines_path, seam_contours)
+    doTime(a, "\tWrote {} contours to {} and saved {} seam lines to {}".format(count, out_path, len(seam_contours), lines_path))
+    return count + len(seam_contours)
+
+
+'''
+--------------------------------------------------------------------------------
+Joins the lines at ends of the same level within the snap distance (the ends
+on the seams between tiles).
+Returns a list of [level, points, closed, index of the first line]
+--------------------------------------------------------------------------------
+'''
+def stitchLines(contours, snap):
+    # Match every end with the nearest free end of the same level on a snap grid
+    free_ends = defaultdict(list)
+    partner = {}
+    for i, (level, points) in enumerate(contours):
+        for end in range(2):
+            point = points[-end]
+            key_x = int(math.floor(point[0] / snap))
+            key_y = int(math.floor(point[1] / snap))
+            end_id = i * 2 + end
+            match = None
+            match_distance = snap
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    for other_id in free_ends[(level, key_x + dx, key_y + dy)]:
+                        if other_id // 2 == i or other_id in partner:
+                            continue
+                        other = contours[other_id // 2][1][-(other_id % 2)]
+                        distance = math.hypot(point[0] - other[0], point[1] - other[1])
+                        if distance <= match_distance:
+                            match = other_id
+                            match_distance = distance
+            if match is None:
+                free_ends[(level, key_x, key_y)].append(end_id)
+            else:
+                partner[end_id] = match
+                partner[match] = end_id
+
+    # Walk the chains from the unmatched ends, what's left are rings
+    stitched = []
+    visited = [False] * len(contours)
+    starts = [end_id for end_id in range(len(contours) * 2) if end_id not in partner]
+    for start_id in starts + [i * 2 for i in range(len(contours))]:
+        if visited[start_id // 2]:
+            continue
+        parts = []
+        line_id = start_id // 2
+        entry = start_id % 2
+        while line_id is not None and not visited[line_id]:
+            visited[line_id] = True
+            points = contours[line_id][1]
+            if entry == 1:
+                points = points[::-1]
+            parts.append(points if len(parts) == 0 else points[1:])
+            next_id = partner.get(line_id * 2 + 1 - entry)
+            line_id = None
+            if next_id is not None:
+                line_id = next_id // 2
+                entry = next_id % 2
+
+        points = numpy.concatenate(parts)
+        closed = len(points) > 3 and math.hypot(*(points[0] - points[-1])) <= snap
+        if closed:
+            points[-1] = points[0]
+        stitched.append([contours[start_id // 2][0], points, closed, start_id // 2])
+    return stitched
+
+
+'''
+--------------------------------------------------------------------------------
+Stitches the seam lines of the tiles, smooths and simplifies the joined lines,
+and inserts them with the final contour fields through the [OCS, projected]
+appenders (the projected rows are projected to projected_ref). name is the
+tile the line starts in.
+Returns the number of features written
+--------------------------------------------------------------------------------
+'''
+def stitchContours(lines_paths, appenders, spatial_ref, interval, units, smooth_tolerance=CONTOUR_SMOOTH_UNIT, simplify_tolerance=CONTOUR_SIMPLIFY_UNIT, projected_ref=None):
+    a = datetime.now()
+    smooth_tolerance = getMapTolerance(smooth_tolerance, spatial_ref)
+    simplify_tolerance = getMapTolerance(simplify_tolerance, spatial_ref)
+
+    contours = []
+    names = []
+    for lines_path in lines_paths:
+        name = os.path.splitext(os.path.basename(lines_path))[0][len("O11_Lines_"):]
+        tile_contours = loadTileLines(lines_path)
+        contours.extend(tile_contours)
+        names.extend([name] * len(tile_contours))
+    a = doTime(a, "Loaded {} seam contour lines from {} tiles".format(len(contours), len(lines_paths)))
+
+    stitched = stitchLines(contours, simplify_tolerance)
+    a = doTime(a, "Stitched {} seam contour lines into {}".format(len(contours), len(stitched)))
+    del contours
+
+    levels = numpy.array([line[0] for line in stitched], dtype=numpy.float64)
+    types = getContourTypes(levels)
+    indexes = getContourIndexes(levels, interval)
+    count = 0
+    for i, (level, points, closed, first_line) in enumerate(stitched):
+        line = getPolyline(simplifyLine(smoothLine(points, smooth_tolerance, closed), simplify_tolerance), spatial_ref)
+        row = [line, float(level), int(types[i]), int(indexes[i]), units, names[first_line]]
+        appenders[0].insertRow(row)
+        if len(appenders) > 1:
+            appenders[1].insertRow([line.projectAs(projected_ref)] + row[1:])
+        stitched[i] = None
+        count = count + 1
+    for appender in appenders:
+        appender.flush()
+    doTime(a, "Wrote {} stitched contours".format(count))
+    return count
+
+
+'''
+--------------------------------------------------------------------------------
+Appends contour feature classes (with the final contour fields) to an output
+feature class as they arrive. The rows are buffered and inserted in chunks of
+chunk_size, call flush() when done. Each input is only appended once.
+--------------------------------------------------------------------------------
+'''
+class ContourAppender(object):
+
+    def __init__(self, out_path, spatial_ref, chunk_size=CONTOUR_APPEND_CHUNK):
+        self.out_path = out_path
+        self.chunk_size = chunk_size
+        self.rows = []
+        self.appended = set()
+        self.count = 0
+        if not arcpy.Exists(out_path):
+            createContourFeatureClass(out_path, spatial_ref)
+
+    def append(self, in_path):
+        if in_path not in self.appended:
+            self.appended.add(in_path)
+            with arcpy.da.SearchCursor(in_path, getContourFieldNames()) as cursor:  # @UndefinedVariable
+                for row in cursor:
+                    if row[0] is not None:
+                        self.insertRow(row)
+
+    def insertRow(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if len(self.rows) > 0:
+            with arcpy.da.InsertCursor(self.out_path, getContourFieldNames()) as cursor:  # @UndefinedVariable
+                for row in self.rows:
+                    cursor.insertRow(row)
+            self.count = self.count + len(self.rows)
+            self.rows = []
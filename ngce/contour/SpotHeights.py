@@ -0,0 +1,183 @@
+'''
+Created on Oct 19, 2026
+
+@author: eric5946
+
+High and low spot heights of the contour tiles (C01).
+
+generateHighLow used to build the polygons between the clipped contours
+(FeatureToPolygon, MultipartToSinglepart), delete the polygons with holes
+through a feature layer and add Z_MEAN with AddSurfaceInformation. The polygons
+left are the hill tops and the depressions, the areas a single contour closes
+around.
+
+This module finds the same areas on the DTM block of the tile, without building
+any polygons:
+    1. every cell gets the band between two contour levels, floor(z / interval)
+    2. the cells are labeled into connected regions of the same band
+       (4 connected, union-find over the neighbor pairs)
+    3. a region whose neighbors are all in a lower band is a HIGH, all in a
+       higher band a LOW. Regions touching NoData or the edge of the block
+       aren't closed by a contour and are skipped.
+    4. Z_MEAN, the cell count and the highest (lowest) cell of every region are
+       taken in the same pass, and the spot is written on that cell
+'''
+import arcpy
+from datetime import datetime
+import os
+
+import numpy
+
+from ngce.Utility import doTime
+from ngce.contour import ContourEngine
+from ngce.contour.ContourConfig import CONTOUR_SPOT_HALO, CONTOUR_SPOT_MIN_CELLS
+
+
+HIGH = "HIGH"
+LOW = "LOW"
+SPOT_FIELDS = [["TYPE", "TEXT", 4], ["ELEV", "DOUBLE", None], ["Z_MEAN", "DOUBLE", None], ["CELLS", "LONG", None], ["name", "TEXT", 79]]
+
+
+def getSpotHeightsPath(folder, name):
+    return os.path.join(folder, "O12_Spots_{}.shp".format(name))
+
+
+'''
+--------------------------------------------------------------------------------
+Returns the flat indexes of every pair of 4 connected cells as from, to arrays
+--------------------------------------------------------------------------------
+'''
+def getNeighborPairs(rows, cols):
+    ids = numpy.arange(rows * cols, dtype=numpy.int32).reshape(rows, cols)
+    from_ids = numpy.concatenate([ids[:, :-1].ravel(), ids[:-1, :].ravel()])
+    to_ids = numpy.concatenate([ids[:, 1:].ravel(), ids[1:, :].ravel()])
+    return from_ids, to_ids
+
+
+'''
+--------------------------------------------------------------------------------
+Union-find over the pairs of connected cells: the larger root of every pair is
+hooked onto the smaller one and the paths are compressed, until both cells of
+every pair have the same root.
+Returns the root (lowest flat index of the region) of every cell
+--------------------------------------------------------------------------------
+'''
+def labelRegions(size, from_ids, to_ids):
+    parent = numpy.arange(size, dtype=numpy.int32)
+    while True:
+        from_roots = parent[from_ids]
+        to_roots = parent[to_ids]
+        differs = from_roots <> to_roots
+        if not differs.any():
+            break
+        numpy.minimum.at(parent, numpy.maximum(from_roots, to_roots)[differs], numpy.minimum(from_roots, to_roots)[differs])
+        # Compress, so every cell points at its root again
+        while True:
+            grand_parents = parent[parent]
+            if numpy.array_equal(grand_parents, parent):
+                break
+            parent = grand_parents
+    return parent
+
+
+'''
+--------------------------------------------------------------------------------
+Finds the regions between two contour levels that a single contour closes
+around in a block of elevations (NaN is NoData).
+Returns a list of [type, row, col, elevation, mean elevation, cell count] with
+the row and col of the highest cell of a HIGH and the lowest of a LOW
+--------------------------------------------------------------------------------
+'''
+def findSpotHeights(values, interval, min_cells=CONTOUR_SPOT_MIN_CELLS):
+    rows, cols = values.shape
+    size = rows * cols
+    z = values.ravel()
+    valid = numpy.isfinite(z)
+    bands = numpy.zeros(size, dtype=numpy.int64)
+    bands[valid] = numpy.floor(z[valid] / interval).astype(numpy.int64)
+
+    from_ids, to_ids = getNeighborPairs(rows, cols)
+    both_valid = valid[from_ids] & valid[to_ids]
+    same = both_valid & (bands[from_ids] == bands[to_ids])
+    roots = labelRegions(size, from_ids[same], to_ids[same])
+
+    # Which side of the region the neighbor bands are on
+    has_lower = numpy.zeros(size, dtype=bool)
+    has_higher = numpy.zeros(size, dtype=bool)
+    across = both_valid & ~same
+    for cell_ids, other_ids in [[from_ids[across], to_ids[across]], [to_ids[across], from_ids[across]]]:
+        lower = bands[other_ids] < bands[cell_ids]
+        has_lower[roots[cell_ids[lower]]] = True
+        has_higher[roots[cell_ids[~lower]]] = True
+
+    # Regions on NoData or the edge of the block aren't closed
+    is_open = numpy.zeros(size, dtype=bool)
+    edge = numpy.zeros((rows, cols), dtype=bool)
+    edge[0, :] = True
+    edge[-1, :] = True
+    edge[:, 0] = True
+    edge[:, -1] = True
+    is_open[roots[edge.ravel() & valid]] = True
+    nodata = valid[from_ids] <> valid[to_ids]
+    is_open[roots[from_ids[nodata & valid[from_ids]]]] = True
+    is_open[roots[to_ids[nodata & valid[to_ids]]]] = True
+
+    # Z_MEAN, cell count and the highest and lowest cell of every region
+    valid_ids = numpy.flatnonzero(valid)
+    cells = numpy.bincount(roots[valid_ids], minlength=size)
+    z_sums = numpy.bincount(roots[valid_ids], weights=z[valid_ids], minlength=size)
+    order = valid_ids[numpy.lexsort((z[valid_ids], roots[valid_ids]))]
+    order_roots = roots[order]
+    is_first = numpy.ones(len(order), dtype=bool)
+    is_first[1:] = order_roots[1:] <> order_roots[:-1]
+    is_last = numpy.ones(len(order), dtype=bool)
+    is_last[:-1] = order_roots[:-1] <> order_roots[1:]
+    lowest = numpy.zeros(size, dtype=numpy.int64)
+    lowest[order_roots[is_first]] = order[is_first]
+    highest = numpy.zeros(size, dtype=numpy.int64)
+    highest[order_roots[is_last]] = order[is_last]
+
+    closed = (roots == numpy.arange(size)) & valid & ~is_open & (cells >= min_cells)
+    spots = []
+    for spot_type, regions, spot_ids in [[HIGH, numpy.flatnonzero(closed & has_lower & ~has_higher), highest],
+                                         [LOW, numpy.flatnonzero(closed & has_higher & ~has_lower), lowest]]:
+        for region, cell in zip(regions, spot_ids[regions]):
+            spots.append([spot_type, cell // cols, cell % cols, z[cell], z_sums[region] / cells[region], cells[region]])
+    return spots
+
+
+def createSpotFeatureClass(out_path, spatial_ref):
+    out_folder, out_name = os.path.split(out_path)
+    arcpy.CreateFeatureclass_management(out_path=out_folder, out_name=out_name, geometry_type="POINT", spatial_reference=spatial_ref)
+    for field_name, field_type, field_length in SPOT_FIELDS:
+        arcpy.AddField_management(in_table=out_path, field_name=field_name, field_type=field_type, field_length=field_length)
+
+
+'''
+--------------------------------------------------------------------------------
+Writes the HIGH and LOW spot heights of the mosaic dataset under the extent to
+a point feature class (TYPE, ELEV, Z_MEAN, CELLS and name). The block is read
+with a halo of cells so the regions crossing the tile edge are closed, only the
+spots inside clip_poly are written.
+Returns the number of spot heights written
+--------------------------------------------------------------------------------
+'''
+def createSpotHeights(md_path, extent, clip_poly, interval, out_path, name, halo=CONTOUR_SPOT_HALO):
+    a = datetime.now()
+    spatial_ref = arcpy.Describe(md_path).spatialReference
+    spots = []
+    block = ContourEngine.readBlock(md_path, extent, halo)
+    if block is not None:
+        values, x_min, y_max, cell_width, cell_height = block
+        spots = findSpotHeights(values, interval)
+
+    createSpotFeatureClass(out_path, spatial_ref)
+    count = 0
+    with arcpy.da.InsertCursor(out_path, ["SHAPE@"] + [field[0] for field in SPOT_FIELDS]) as cursor:  # @UndefinedVariable
+        for spot_type, row, col, elevation, mean_elevation, cells in spots:
+            point = arcpy.PointGeometry(arcpy.Point(x_min + (col + 0.5) * cell_width, y_max - (row + 0.5) * cell_height), spatial_ref)
+            if clip_poly.contains(point):
+                cursor.insertRow([point, spot_type, float(elevation), float(mean_elevation), int(cells), name])
+                count = count + 1
+    doTime(a, "\tWrote {} spot heights to {}".format(count, out_path))
+    return count
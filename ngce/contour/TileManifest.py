@@ -0,0 +1,172 @@
+'''
+Created on Oct 19, 2026
+
+@author: eric5946
+
+Completion manifest for the contour (C01) and annotation (C02) tiles.
+
+The resume checks used to open every tile's outputs over the network to decide
+whether it was finished. Now each worker writes one record when it finishes a
+tile, in a single transaction, to a SQLite database in the scratch folder:
+    name            tile name
+    feature_count   features written
+    checksum        md5 of the output files
+    parameter_hash  md5 of the parameters the tile was made with
+    file_stats      size and modification time of the output files
+The resume checks read the manifest once. A tile is complete if it has a
+record made with the same parameters, so changing a parameter re-creates the
+tiles. Before a tile is skipped its outputs are checked against the record
+(getVerified): a missing or changed output re-creates the tile. The check only
+stats the outputs, reading them back for the checksum is the explicit verify
+mode (CONTOUR_VERIFY_CHECKSUM).
+'''
+from datetime import datetime
+import hashlib
+import os
+
+from ngce.raster import TileStats
+
+
+MANIFEST_NAME = "TileManifest.sqlite"
+MANIFEST_TABLE = "completed_tiles"
+MANIFEST_COLUMNS = ["kind", "name", "feature_count", "checksum", "parameter_hash", "updated", "file_stats"]
+
+CONTOUR = "contour"
+ANNOTATION = "annotation"
+MERGE = "merge"  # The merged outputs, recorded when they're complete
+
+CHECKSUM_BLOCK_SIZE = 1024 * 1024
+
+
+def getManifestPath(scratch_path):
+    return os.path.join(scratch_path, MANIFEST_NAME)
+
+
+def createTables(connection):
+    connection.execute("CREATE TABLE IF NOT EXISTS {} (kind TEXT NOT NULL, name TEXT NOT NULL, feature_count INTEGER, checksum TEXT, parameter_hash TEXT, updated TEXT, PRIMARY KEY (kind, name))".format(MANIFEST_TABLE))
+    # Manifests from before the file stats were recorded
+    columns = [row[1] for row in connection.execute("PRAGMA table_info({})".format(MANIFEST_TABLE))]
+    if "file_stats" not in columns:
+        connection.execute("ALTER TABLE {} ADD COLUMN file_stats TEXT".format(MANIFEST_TABLE))
+
+
+'''
+--------------------------------------------------------------------------------
+Returns the hash of a list of parameter values
+--------------------------------------------------------------------------------
+'''
+def getParameterHash(parameters):
+    return hashlib.md5("|".join([str(parameter) for parameter in parameters])).hexdigest()
+
+
+'''
+--------------------------------------------------------------------------------
+Returns the md5 of the contents of the files (missing files are skipped)
+--------------------------------------------------------------------------------
+'''
+def getChecksum(file_paths):
+    checksum = hashlib.md5()
+    for file_path in file_paths:
+        if os.path.exists(file_path):
+            with open(file_path, "rb") as in_file:
+                block = in_file.read(CHECKSUM_BLOCK_SIZE)
+                while len(block) > 0:
+                    checksum.update(block)
+                    block = in_file.read(CHECKSUM_BLOCK_SIZE)
+    return checksum.hexdigest()
+
+
+'''
+--------------------------------------------------------------------------------
+Returns the size and modification time of the files ("-" for a missing file)
+--------------------------------------------------------------------------------
+'''
+def getFileStats(file_paths):
+    file_stats = []
+    for file_path in file_paths:
+        if os.path.exists(file_path):
+            stat = os.stat(file_path)
+            file_stats.append("{}:{}".format(stat.st_size, int(stat.st_mtime)))
+        else:
+            file_stats.append("-")
+    return "|".join(file_stats)
+
+
+def _setCompleted(connection, row):
+    connection.execute("INSERT OR REPLACE INTO {} ({}) VALUES (?, ?, ?, ?, ?, ?, ?)".format(MANIFEST_TABLE, ", ".join(MANIFEST_COLUMNS)), row)
+
+
+'''
+--------------------------------------------------------------------------------
+Records a finished tile
+--------------------------------------------------------------------------------
+'''
+def setCompleted(manifest_path, kind, name, feature_count, checksum, parameter_hash, file_stats=None):
+    TileStats.runStoreTransaction(manifest_path, createTables, _setCompleted, [kind, name, feature_count, checksum, parameter_hash, str(datetime.now()), file_stats])
+
+
+'''
+--------------------------------------------------------------------------------
+Records a finished tile with the checksum and file stats of its outputs
+--------------------------------------------------------------------------------
+'''
+def setFilesCompleted(manifest_path, kind, name, feature_count, out_paths, parameter_hash):
+    setCompleted(manifest_path, kind, name, feature_count, getChecksum(out_paths), parameter_hash, getFileStats(out_paths))
+
+
+def _getRecords(connection, kind):
+    result = {}
+    for row in connection.execute("SELECT name, feature_count, parameter_hash, checksum, file_stats FROM {} WHERE kind = ?".format(MANIFEST_TABLE), [kind]):
+        result[row[0]] = [row[1], row[2], row[3], row[4]]
+    return result
+
+
+'''
+--------------------------------------------------------------------------------
+Returns {name: [feature_count, parameter_hash, checksum, file_stats]} of every
+finished tile
+--------------------------------------------------------------------------------
+'''
+def getRecords(manifest_path, kind):
+    result = {}
+    if os.path.exists(manifest_path):
+        result = TileStats.runStoreTransaction(manifest_path, createTables, _getRecords, kind)
+    return result
+
+
+'''
+--------------------------------------------------------------------------------
+Returns {name: feature_count} of the tiles finished with the parameter hash
+--------------------------------------------------------------------------------
+'''
+def getCompleted(manifest_path, kind, parameter_hash):
+    result = {}
+    for name, record in getRecords(manifest_path, kind).iteritems():
+        if record[1] == parameter_hash:
+            result[name] = record[0]
+    return result
+
+
+'''
+--------------------------------------------------------------------------------
+Returns {name: feature_count} of the tiles finished with the parameter hash
+whose outputs all exist and still match the recorded file stats (size and
+modification time). With full, the outputs are read and matched against the
+recorded checksum instead. Records without file stats are checksummed.
+getPaths(name) returns the output paths of a tile, in the order they were
+recorded.
+--------------------------------------------------------------------------------
+'''
+def getVerified(manifest_path, kind, parameter_hash, getPaths, full=False):
+    result = {}
+    for name, record in getRecords(manifest_path, kind).iteritems():
+        if record[1] == parameter_hash:
+            out_paths = getPaths(name)
+            if all([os.path.exists(out_path) for out_path in out_paths]):
+                if full or record[3] is None:
+                    is_verified = getChecksum(out_paths) == record[2]
+                else:
+                    is_verified = getFileStats(out_paths) == record[3]
+                if is_verified:
+                    result[name] = record[0]
+    return result
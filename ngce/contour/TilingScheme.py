@@ -0,0 +1,211 @@
+'''
+Created on Oct 19, 2026
+
+@author: eric5946
+
+Cache tiling scheme arithmetic (NRCS_tilingScheme.xml).
+
+The tile polygons used to come from MapServerCacheTilingSchemeToPolygons,
+which needs a copy of the template MXD repointed at the contours. The tiles of
+a tiling scheme are a regular grid from the tile origin (top left), so they
+can be calculated from the scheme directly:
+    tile size (map units)   tile cols (rows) x resolution of the level
+    col                     floor((x - origin x) / tile width)
+    row                     floor((origin y - y) / tile height)
+Every function works on numpy arrays of points, rows and cols at once.
+'''
+import arcpy
+from datetime import datetime
+import math
+import os
+import xml.etree.ElementTree as ET
+
+import numpy
+
+from ngce.Utility import doTime
+from ngce.contour.ContourConfig import TILING_SCHEME
+
+
+SCALE_TOLERANCE = 0.000001  # Relative difference of the scales that are the same level
+SUPERTILE_SIZE = 2048  # Pixels of the tiles drawn together when caching with antialiasing
+TILE_FIELDS = [["Tile_Level", "LONG"], ["Tile_Scale", "DOUBLE"], ["Tile_Row", "LONG"], ["Tile_Col", "LONG"]]
+
+
+def getText(element, path):
+    return element.find(path).text
+
+
+class TilingScheme(object):
+    '''
+    --------------------------------------------------------------------------------
+    The origin, tile size, DPI and levels (LODs) of a cache tiling scheme xml.
+    levels, scales and resolutions are numpy arrays in the order of the xml.
+    --------------------------------------------------------------------------------
+    '''
+    def __init__(self, xml_path=TILING_SCHEME):
+        tile_info = ET.parse(xml_path).getroot().find("TileCacheInfo")
+        self.xml_path = xml_path
+        self.wkt = getText(tile_info, "SpatialReference/WKT")
+        self.origin_x = float(getText(tile_info, "TileOrigin/X"))
+        self.origin_y = float(getText(tile_info, "TileOrigin/Y"))
+        self.tile_cols = int(getText(tile_info, "TileCols"))
+        self.tile_rows = int(getText(tile_info, "TileRows"))
+        self.dpi = int(getText(tile_info, "DPI"))
+        lods = tile_info.findall("LODInfos/LODInfo")
+        self.levels = numpy.array([int(getText(lod, "LevelID")) for lod in lods], dtype=numpy.int32)
+        self.scales = numpy.array([float(getText(lod, "Scale")) for lod in lods], dtype=numpy.float64)
+        self.resolutions = numpy.array([float(getText(lod, "Resolution")) for lod in lods], dtype=numpy.float64)
+
+    def getSpatialReference(self):
+        spatial_ref = arcpy.SpatialReference()
+        spatial_ref.loadFromString(self.wkt)
+        return spatial_ref
+
+    '''
+    Returns the level ID of the scale, raises ValueError if it isn't in the scheme
+    '''
+    def getLevel(self, scale):
+        matches = numpy.flatnonzero(numpy.abs(self.scales - float(scale)) <= self.scales * SCALE_TOLERANCE)
+        if len(matches) == 0:
+            raise ValueError("Scale {} isn't a level of the tiling scheme {}".format(scale, self.xml_path))
+        return int(self.levels[matches[0]])
+
+    def getScale(self, level):
+        return float(self.scales[self.levels == level][0])
+
+    '''
+    Returns the width and height of the level's tiles in map units, or of the
+    supertiles (tile_size pixels square) if tile_size is given
+    '''
+    def getTileSize(self, level, tile_size=None):
+        resolution = float(self.resolutions[self.levels == level][0])
+        if tile_size is not None:
+            return tile_size * resolution, tile_size * resolution
+        return self.tile_cols * resolution, self.tile_rows * resolution
+
+    '''
+    Returns the rows and cols of the level's tiles under the points
+    '''
+    def getTileIndexes(self, level, x, y, tile_size=None):
+        tile_width, tile_height = self.getTileSize(level, tile_size)
+        cols = numpy.floor((numpy.asarray(x, dtype=numpy.float64) - self.origin_x) / tile_width).astype(numpy.int64)
+        rows = numpy.floor((self.origin_y - numpy.asarray(y, dtype=numpy.float64)) / tile_height).astype(numpy.int64)
+        return rows, cols
+
+    '''
+    Returns x min, y min, x max and y max of the tiles
+    '''
+    def getTileBounds(self, level, rows, cols, tile_size=None):
+        tile_width, tile_height = self.getTileSize(level, tile_size)
+        x_min = self.origin_x + numpy.asarray(cols, dtype=numpy.float64) * tile_width
+        y_max = self.origin_y - numpy.asarray(rows, dtype=numpy.float64) * tile_height
+        return x_min, y_max - tile_height, x_min + tile_width, y_max
+
+    '''
+    Returns the row and col ranges (first, last inclusive) of the level's tiles
+    covering the extent (in the scheme's spatial reference). If clip_to_horizon
+    the tiles are limited to the ones inside the scheme's world (from the origin
+    to the opposite corner of the projection).
+    '''
+    def getTileRange(self, level, x_min, y_min, x_max, y_max, tile_size=None, clip_to_horizon=True):
+        rows, cols = self.getTileIndexes(level, [x_min, x_max], [y_max, y_min], tile_size)
+        first_row, last_row = int(rows[0]), int(rows[1])
+        first_col, last_col = int(cols[0]), int(cols[1])
+        if clip_to_horizon:
+            tile_width, tile_height = self.getTileSize(level, tile_size)
+            max_col = int(math.ceil(-2 * self.origin_x / tile_width)) - 1
+            max_row = int(math.ceil(2 * self.origin_y / tile_height)) - 1
+            first_row, last_row = max(first_row, 0), min(last_row, max_row)
+            first_col, last_col = max(first_col, 0), min(last_col, max_col)
+        return first_row, last_row, first_col, last_col
+
+    '''
+    Returns the rows and cols of every tile of the level covering the extent
+    '''
+    def getExtentTiles(self, level, x_min, y_min, x_max, y_max, tile_size=None, clip_to_horizon=True):
+        first_row, last_row, first_col, last_col = self.getTileRange(level, x_min, y_min, x_max, y_max, tile_size, clip_to_horizon)
+        rows, cols = numpy.mgrid[first_row:last_row + 1, first_col:last_col + 1]
+        return rows.ravel(), cols.ravel()
+
+    def getExtentTileCount(self, level, x_min, y_min, x_max, y_max, tile_size=None, clip_to_horizon=True):
+        first_row, last_row, first_col, last_col = self.getTileRange(level, x_min, y_min, x_max, y_max, tile_size, clip_to_horizon)
+        return max(0, last_row - first_row + 1) * max(0, last_col - first_col + 1)
+
+
+'''
+--------------------------------------------------------------------------------
+Returns the extent of the feature class in the spatial reference of the scheme
+--------------------------------------------------------------------------------
+'''
+def getSchemeExtent(in_fc, xml_path=TILING_SCHEME):
+    extent = arcpy.Describe(in_fc).extent
+    spatial_ref = TilingScheme(xml_path).getSpatialReference()
+    if extent.spatialReference is not None and extent.spatialReference.factoryCode <> spatial_ref.factoryCode:
+        extent = extent.projectAs(spatial_ref)
+    return extent
+
+
+def getTileFieldNames():
+    return ["SHAPE@"] + [field[0] for field in TILE_FIELDS]
+
+
+def createTileFeatureClass(out_path, spatial_ref):
+    out_folder, out_name = os.path.split(out_path)
+    arcpy.CreateFeatureclass_management(out_path=out_folder, out_name=out_name, geometry_type="POLYGON", spatial_reference=spatial_ref)
+    for field_name, field_type in TILE_FIELDS:
+        arcpy.AddField_management(in_table=out_path, field_name=field_name, field_type=field_type)
+
+
+'''
+--------------------------------------------------------------------------------
+Inserts the polygons of the level's tiles (rows, cols) with the cursor of a
+tile feature class (getTileFieldNames).
+Returns the number of tiles inserted
+--------------------------------------------------------------------------------
+'''
+def insertTilePolygons(cursor, scheme, level, rows, cols, tile_size=None):
+    spatial_ref = scheme.getSpatialReference()
+    level_scale = scheme.getScale(level)
+    x_mins, y_mins, x_maxs, y_maxs = scheme.getTileBounds(level, rows, cols, tile_size)
+    for row, col, x_min, y_min, x_max, y_max in zip(rows, cols, x_mins, y_mins, x_maxs, y_maxs):
+        polygon = arcpy.Polygon(arcpy.Array([arcpy.Point(x_min, y_min), arcpy.Point(x_min, y_max), arcpy.Point(x_max, y_max),
+                                             arcpy.Point(x_max, y_min), arcpy.Point(x_min, y_min)]), spatial_ref)
+        cursor.insertRow([polygon, level, level_scale, int(row), int(col)])
+    return len(rows)
+
+
+'''
+--------------------------------------------------------------------------------
+Writes the tile polygons of the scales covering the extent to one feature class
+with Tile_Level, Tile_Scale, Tile_Row and Tile_Col (like
+MapServerCacheTilingSchemeToPolygons). With antialiasing the polygons are the
+supertiles the cache is drawn with.
+Returns the number of tiles written
+--------------------------------------------------------------------------------
+'''
+def writeTilePolygons(out_path, extent, scales, xml_path=TILING_SCHEME, antialiasing=True, clip_to_horizon=True):
+    a = datetime.now()
+    scheme = TilingScheme(xml_path)
+    spatial_ref = scheme.getSpatialReference()
+    tile_size = SUPERTILE_SIZE if antialiasing else None
+    createTileFeatureClass(out_path, spatial_ref)
+
+    count = 0
+    with arcpy.da.InsertCursor(out_path, getTileFieldNames()) as cursor:  # @UndefinedVariable
+        for scale in scales:
+            level = scheme.getLevel(scale)
+            rows, cols = scheme.getExtentTiles(level, extent.XMin, extent.YMin, extent.XMax, extent.YMax, tile_size, clip_to_horizon)
+            count = count + insertTilePolygons(cursor, scheme, level, rows, cols, tile_size)
+    doTime(a, "Wrote {} tile polygons to {}".format(count, out_path))
+    return count
+
+
+'''
+--------------------------------------------------------------------------------
+Returns [[scale, tile count], ...] of the scales over the feature class
+--------------------------------------------------------------------------------
+'''
+def getTileCounts(in_fc, scales, xml_path=TILING_SCHEME):
+    scheme = TilingScheme(xml_path)
+    extent = getSchemeExtent(in_fc, xml_path)
+    return [[scale, scheme.getExtentTileCount(scheme.getLevel(scale), extent.XMin, extent.YMin, extent.XMax, extent.YMax)] for scale in scales]
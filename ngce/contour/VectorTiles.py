@@ -0,0 +1,374 @@
+'''
+Created on Oct 19, 2026
+
+@author: eric5946
+
+Offline vector tiles (Mapbox Vector Tiles in an MBTiles file) of the contours.
+
+The contour cache is rendered on ArcGIS Server (C03), which ties up the server
+for hours per project. This module makes the tiles locally from Contours_WM:
+    1. the contours are read once and clipped to the tiles of the coarsest
+       level (jobs), a contour crossing tiles is split between the jobs
+    2. a process pool makes every tile of the levels inside a job: the lines
+       are clipped to the tile (plus CONTOUR_MVT_BUFFER), simplified with a
+       tolerance of CONTOUR_MVT_SIMPLIFY pixels of the level's resolution and
+       encoded as a gzipped MVT (version 2) layer with the CONTOUR, INDEX and
+       CTYPE attributes
+    3. the tiles are written to the MBTiles (SQLite) as the jobs finish
+The tiles are the levels of the tiling scheme (NRCS_tilingScheme.xml) at the
+contour scales, which are the web mercator zoom levels. The protobuf encoding
+is written out here so there's no dependency to install.
+'''
+import arcpy
+from datetime import datetime
+from functools import partial
+import gzip
+import json
+from multiprocessing import Pool, cpu_count
+import os
+import struct
+from StringIO import StringIO
+
+import numpy
+
+from ngce.Utility import doTime
+from ngce.contour import ContourEngine
+from ngce.contour.ContourConfig import CONTOUR_SCALES_LIST, TILING_SCHEME, CONTOUR_MVT_LAYER, CONTOUR_MVT_EXTENT, \
+    CONTOUR_MVT_BUFFER, CONTOUR_MVT_SIMPLIFY
+from ngce.contour.TilingScheme import TilingScheme
+from ngce.raster import TileStats
+
+
+CPU_HANDICAP = 1
+ATTRIBUTE_FIELDS = ["CONTOUR", "INDEX", "CTYPE"]
+
+# Protobuf wire types
+VARINT = 0
+FIXED64 = 1
+LENGTH_DELIMITED = 2
+
+# MVT geometry
+LINESTRING = 2
+MOVE_TO = 1
+LINE_TO = 2
+
+
+def encodeVarint(value):
+    data = bytearray()
+    while value > 0x7F:
+        data.append((value & 0x7F) | 0x80)
+        value >>= 7
+    data.append(value)
+    return data
+
+
+def encodeKey(field, wire_type):
+    return encodeVarint((field << 3) | wire_type)
+
+
+def encodeBytes(field, data):
+    return encodeKey(field, LENGTH_DELIMITED) + encodeVarint(len(data)) + data
+
+
+def encodePacked(field, values):
+    data = bytearray()
+    for value in values:
+        data += encodeVarint(value)
+    return encodeBytes(field, data)
+
+
+def zigZag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+'''
+--------------------------------------------------------------------------------
+MVT Value message: integers as sint, other numbers as double
+--------------------------------------------------------------------------------
+'''
+def encodeValue(value):
+    if isinstance(value, basestring):
+        return encodeBytes(1, bytearray(value.encode("utf-8")))
+    if isinstance(value, (int, long)):
+        return encodeKey(6, VARINT) + encodeVarint(zigZag(value))
+    return encodeKey(3, FIXED64) + bytearray(struct.pack("<d", value))
+
+
+'''
+--------------------------------------------------------------------------------
+MVT geometry commands of a multi line string, the parts are integer arrays of
+tile coordinates. Every parameter is the zigzag delta from the previous point.
+--------------------------------------------------------------------------------
+'''
+def encodeGeometry(parts):
+    commands = []
+    x = 0
+    y = 0
+    for part in parts:
+        deltas = numpy.diff(numpy.vstack([[x, y], part]), axis=0)
+        commands.append(MOVE_TO | (1 << 3))
+        commands.extend([zigZag(int(deltas[0, 0])), zigZag(int(deltas[0, 1]))])
+        commands.append(LINE_TO | ((len(part) - 1) << 3))
+        for dx, dy in deltas[1:]:
+            commands.extend([zigZag(int(dx)), zigZag(int(dy))])
+        x, y = int(part[-1, 0]), int(part[-1, 1])
+    return commands
+
+
+'''
+--------------------------------------------------------------------------------
+Encodes the features ([parts, attribute values]) as a gzipped tile with one
+layer. The attribute values are shared through the layer's keys and values.
+--------------------------------------------------------------------------------
+'''
+def encodeTile(features, layer_name=CONTOUR_MVT_LAYER, extent=CONTOUR_MVT_EXTENT):
+    values = []
+    value_ids = {}
+    layer = encodeKey(15, VARINT) + encodeVarint(2) + encodeBytes(1, bytearray(layer_name))
+    for feature_id, (parts, attributes) in enumerate(features):
+        tags = []
+        for key_id, value in enumerate(attributes):
+            if value is not None:
+                # By type too, CONTOUR 10.0 and CTYPE 10 are different values
+                value_key = (type(value), value)
+                if value_key not in value_ids:
+                    value_ids[value_key] = len(values)
+                    values.append(value)
+                tags.extend([key_id, value_ids[value_key]])
+        feature = encodeKey(1, VARINT) + encodeVarint(feature_id + 1)
+        feature += encodePacked(2, tags)
+        feature += encodeKey(3, VARINT) + encodeVarint(LINESTRING)
+        feature += encodePacked(4, encodeGeometry(parts))
+        layer += encodeBytes(2, feature)
+    for key in ATTRIBUTE_FIELDS:
+        layer += encodeBytes(3, bytearray(key))
+    for value in values:
+        layer += encodeBytes(4, encodeValue(value))
+    layer += encodeKey(5, VARINT) + encodeVarint(extent)
+
+    out_file = StringIO()
+    gzip_file = gzip.GzipFile(fileobj=out_file, mode="wb")
+    gzip_file.write(str(encodeBytes(3, layer)))
+    gzip_file.close()
+    return out_file.getvalue()
+
+
+'''
+--------------------------------------------------------------------------------
+Clips a line to the box (Liang-Barsky on every segment at once).
+Returns the parts of the line inside the box
+--------------------------------------------------------------------------------
+'''
+def clipLineToBox(points, x_min, y_min, x_max, y_max):
+    starts = points[:-1]
+    deltas = points[1:] - starts
+    t0 = numpy.zeros(len(starts))
+    t1 = numpy.ones(len(starts))
+    visible = numpy.ones(len(starts), dtype=bool)
+    for p, q in [[-deltas[:, 0], starts[:, 0] - x_min], [deltas[:, 0], x_max - starts[:, 0]],
+                 [-deltas[:, 1], starts[:, 1] - y_min], [deltas[:, 1], y_max - starts[:, 1]]]:
+        visible &= ~((p == 0) & (q < 0))
+        with numpy.errstate(divide="ignore", invalid="ignore"):
+            r = q / p
+        entering = p < 0
+        leaving = p > 0
+        t0[entering] = numpy.maximum(t0[entering], r[entering])
+        t1[leaving] = numpy.minimum(t1[leaving], r[leaving])
+    visible &= t0 <= t1
+
+    segments = numpy.flatnonzero(visible)
+    if len(segments) == 0:
+        return []
+    # A segment continues the part of the one before it if the line doesn't leave the box in between
+    continues = numpy.zeros(len(segments), dtype=bool)
+    continues[1:] = (segments[1:] == segments[:-1] + 1) & (t1[segments[:-1]] == 1) & (t0[segments[1:]] == 0)
+    clip_starts = starts[segments] + t0[segments, None] * deltas[segments]
+    clip_ends = starts[segments] + t1[segments, None] * deltas[segments]
+    part_starts = numpy.flatnonzero(~continues)
+    parts = []
+    for first, last in zip(part_starts, list(part_starts[1:]) + [len(segments)]):
+        parts.append(numpy.vstack([clip_starts[first:first + 1], clip_ends[first:last]]))
+    return parts
+
+
+'''
+--------------------------------------------------------------------------------
+Converts the map coordinates of a part to integer tile coordinates (y down)
+and drops the repeated points.
+Returns the part or None if less than 2 points are left
+--------------------------------------------------------------------------------
+'''
+def toTileCoordinates(part, x_min, y_max, tile_width, tile_height, extent=CONTOUR_MVT_EXTENT):
+    tile_points = numpy.column_stack([numpy.round((part[:, 0] - x_min) / tile_width * extent),
+                                      numpy.round((y_max - part[:, 1]) / tile_height * extent)]).astype(numpy.int64)
+    keep = numpy.ones(len(tile_points), dtype=bool)
+    keep[1:] = numpy.any(tile_points[1:] <> tile_points[:-1], axis=1)
+    tile_points = tile_points[keep]
+    if len(tile_points) < 2:
+        return None
+    return tile_points
+
+
+'''
+--------------------------------------------------------------------------------
+Makes the features of one tile from the lines ([points, attribute values])
+--------------------------------------------------------------------------------
+'''
+def getTileFeatures(lines, x_min, y_min, x_max, y_max, resolution):
+    tile_width = x_max - x_min
+    tile_height = y_max - y_min
+    buffer_width = tile_width * CONTOUR_MVT_BUFFER / float(CONTOUR_MVT_EXTENT)
+    buffer_height = tile_height * CONTOUR_MVT_BUFFER / float(CONTOUR_MVT_EXTENT)
+    features = []
+    for points, attributes in lines:
+        parts = []
+        for part in clipLineToBox(points, x_min - buffer_width, y_min - buffer_height, x_max + buffer_width, y_max + buffer_height):
+            part = toTileCoordinates(ContourEngine.simplifyLine(part, resolution * CONTOUR_MVT_SIMPLIFY), x_min, y_max, tile_width, tile_height)
+            if part is not None:
+                parts.append(part)
+        if len(parts) > 0:
+            features.append([parts, attributes])
+    return features
+
+
+def getBounds(points):
+    return points[:, 0].min(), points[:, 1].min(), points[:, 0].max(), points[:, 1].max()
+
+
+def intersects(bounds, x_min, y_min, x_max, y_max):
+    return bounds[0] <= x_max and bounds[2] >= x_min and bounds[1] <= y_max and bounds[3] >= y_min
+
+
+'''
+--------------------------------------------------------------------------------
+Process pool task: makes every tile of the levels inside one tile of the
+coarsest level. job is [level, row, col, lines]
+Returns a list of [zoom, col, row, tile data] of the tiles with features
+--------------------------------------------------------------------------------
+'''
+def createJobTiles(xml_path, levels, job):
+    scheme = TilingScheme(xml_path)
+    job_level, job_row, job_col, lines = job
+    job_bounds = scheme.getTileBounds(job_level, job_row, job_col)
+    line_bounds = [getBounds(points) for points, attributes in lines]
+    tiles = []
+    for level in levels:
+        resolution = float(scheme.resolutions[scheme.levels == level][0])
+        # The tiles of the level inside the job tile, shrunk a little so the neighbor tiles aren't included
+        rows, cols = scheme.getExtentTiles(level, job_bounds[0] + resolution, job_bounds[1] + resolution, job_bounds[2] - resolution, job_bounds[3] - resolution)
+        x_mins, y_mins, x_maxs, y_maxs = scheme.getTileBounds(level, rows, cols)
+        for row, col, x_min, y_min, x_max, y_max in zip(rows, cols, x_mins, y_mins, x_maxs, y_maxs):
+            margin = (x_max - x_min) * CONTOUR_MVT_BUFFER / float(CONTOUR_MVT_EXTENT)
+            tile_lines = [line for line, bounds in zip(lines, line_bounds) if intersects(bounds, x_min - margin, y_min - margin, x_max + margin, y_max + margin)]
+            features = getTileFeatures(tile_lines, x_min, y_min, x_max, y_max, resolution)
+            if len(features) > 0:
+                tiles.append([level, int(col), int(row), encodeTile(features)])
+    return tiles
+
+
+'''
+--------------------------------------------------------------------------------
+Reads the contours and groups them by the tiles of the level they touch. A job
+only gets the parts of the line inside its tile (plus the buffer), not the
+whole line.
+Returns a list of jobs [level, row, col, lines] with lines as [points, values]
+--------------------------------------------------------------------------------
+'''
+def getJobs(in_fc, scheme, level):
+    tile_width, tile_height = scheme.getTileSize(level)
+    margin_x = tile_width * CONTOUR_MVT_BUFFER / float(CONTOUR_MVT_EXTENT)
+    margin_y = tile_height * CONTOUR_MVT_BUFFER / float(CONTOUR_MVT_EXTENT)
+    jobs = {}
+    with arcpy.da.SearchCursor(in_fc, ["SHAPE@"] + ATTRIBUTE_FIELDS) as cursor:  # @UndefinedVariable
+        for row in cursor:
+            if row[0] is None:
+                continue
+            attributes = [row[1] if row[1] is None else float(row[1])] + [value if value is None else int(value) for value in row[2:]]
+            for part in row[0]:
+                points = numpy.array([[point.X, point.Y] for point in part if point is not None], dtype=numpy.float64)
+                if len(points) < 2:
+                    continue
+                x_min, y_min, x_max, y_max = getBounds(points)
+                first_row, last_row, first_col, last_col = scheme.getTileRange(level, x_min - margin_x, y_min - margin_y, x_max + margin_x, y_max + margin_y)
+                for tile_row in range(first_row, last_row + 1):
+                    for tile_col in range(first_col, last_col + 1):
+                        if first_row == last_row and first_col == last_col:
+                            tile_parts = [points]
+                        else:
+                            tile_x_min, tile_y_min, tile_x_max, tile_y_max = scheme.getTileBounds(level, tile_row, tile_col)
+                            tile_parts = clipLineToBox(points, tile_x_min - margin_x, tile_y_min - margin_y, tile_x_max + margin_x, tile_y_max + margin_y)
+                        for tile_part in tile_parts:
+                            jobs.setdefault((tile_row, tile_col), []).append([tile_part, attributes])
+    return [[level, key[0], key[1], lines] for key, lines in jobs.iteritems()]
+
+
+def createTables(connection):
+    connection.execute("CREATE TABLE IF NOT EXISTS metadata (name TEXT, value TEXT)")
+    connection.execute("CREATE TABLE IF NOT EXISTS tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)")
+    connection.execute("CREATE UNIQUE INDEX IF NOT EXISTS tile_index ON tiles (zoom_level, tile_column, tile_row)")
+
+
+def _addTiles(connection, tiles):
+    # MBTiles rows count from the bottom (TMS)
+    connection.executemany("INSERT OR REPLACE INTO tiles (zoom_level, tile_column, tile_row, tile_data) VALUES (?, ?, ?, ?)",
+                           [[zoom, col, (1 << zoom) - 1 - row, buffer(data)] for zoom, col, row, data in tiles])
+
+
+def _setMetadata(connection, metadata):
+    connection.execute("DELETE FROM metadata")
+    connection.executemany("INSERT INTO metadata (name, value) VALUES (?, ?)", metadata)
+
+
+'''
+--------------------------------------------------------------------------------
+MBTiles metadata, bounds and center are in WGS 84
+--------------------------------------------------------------------------------
+'''
+def getMetadata(in_fc, name, levels):
+    extent = arcpy.Describe(in_fc).extent.projectAs(arcpy.SpatialReference(4326))
+    vector_layers = [{"id": CONTOUR_MVT_LAYER, "fields": {"CONTOUR": "Number", "INDEX": "Number", "CTYPE": "Number"},
+                      "minzoom": min(levels), "maxzoom": max(levels)}]
+    return [["name", name],
+            ["format", "pbf"],
+            ["type", "overlay"],
+            ["version", "2"],
+            ["minzoom", str(min(levels))],
+            ["maxzoom", str(max(levels))],
+            ["bounds", "{},{},{},{}".format(extent.XMin, extent.YMin, extent.XMax, extent.YMax)],
+            ["center", "{},{},{}".format((extent.XMin + extent.XMax) / 2.0, (extent.YMin + extent.YMax) / 2.0, min(levels))],
+            ["json", json.dumps({"vector_layers": vector_layers})]]
+
+
+'''
+--------------------------------------------------------------------------------
+Writes the vector tiles of the web mercator contours at the scales to an
+MBTiles file. An existing file is replaced.
+Returns the number of tiles written
+--------------------------------------------------------------------------------
+'''
+def createVectorTiles(in_fc, out_path, name, scales=CONTOUR_SCALES_LIST, xml_path=TILING_SCHEME):
+    a = datetime.now()
+    aa = a
+    scheme = TilingScheme(xml_path)
+    levels = sorted([scheme.getLevel(scale) for scale in scales])
+    jobs = getJobs(in_fc, scheme, levels[0])
+    a = doTime(a, "Read contours into {} level {} jobs from {}".format(len(jobs), levels[0], in_fc))
+
+    if os.path.exists(out_path):
+        os.remove(out_path)
+    TileStats.runStoreTransaction(out_path, createTables, _setMetadata, getMetadata(in_fc, name, levels))
+
+    count = 0
+    pool = Pool(processes=max(1, cpu_count() - CPU_HANDICAP))
+    try:
+        for done, tiles in enumerate(pool.imap_unordered(partial(createJobTiles, xml_path, levels), jobs)):
+            if len(tiles) > 0:
+                TileStats.runStoreTransaction(out_path, createTables, _addTiles, tiles)
+                count = count + len(tiles)
+            if (done + 1) % 100 == 0:
+                a = doTime(a, "\tWrote {} tiles of {} of {} jobs".format(count, done + 1, len(jobs)))
+    finally:
+        pool.close()
+        pool.join()
+    doTime(aa, "Wrote {} vector tiles to {}".format(count, out_path))
+    return count
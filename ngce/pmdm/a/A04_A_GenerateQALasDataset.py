@@ -19,6 +19,7 @@ from ngce.folders import ProjectFolders
 from ngce.las import LAS
 from ngce.pmdm import RunUtil
 from ngce.pmdm.a import A04_C_ConsolidateLASInfo
+from ngce.raster import TileStats
 
 
 PROCESS_DELAY = 1
@@ -116,6 +117,10 @@ def createLasStatistics(fileList, target_path, spatial_reference=None, isClassif
                 else:
                     # arcpy.AddMessage("Waiting for process list to clear {} jobs".format(len(processList)))
                     time.sleep(PROCESS_DELAY)
+
+        # The workers leave their stats in parts, merge them with a single writer
+        merged = TileStats.mergeWorkerStores(TileStats.getStatStorePath(target_path))
+        arcpy.AddMessage("\tMerged {} stat store parts".format(merged))
 # BRUCE's code here
         if runAgain and len(fileList_repeat) > 0:
             # try to clean up any errors along the way
@@ -194,6 +199,8 @@ def getLasFileProcessList(start_dir, target_path, createQARasters, isClassified,
     ext = ".las"
     fileList = []
     arcpy.AddMessage("getLasFileProcessList: Starting in dir {}".format(start_dir))
+    # Read the processed file names from the statistics store once instead of once per file
+    stat_names = TileStats.getLasStatNames(TileStats.getStatStorePath(target_path))
     for root, dirs, files in os.walk(start_dir):  # @UnusedVariable
         for f in files:
             if f.upper().endswith(ext.upper()):
@@ -203,7 +210,7 @@ def getLasFileProcessList(start_dir, target_path, createQARasters, isClassified,
                 if returnFirst:
                     return f_path
 
-                if A04_B_CreateLASStats.isProcessFile(f_path, target_path, createQARasters, isClassified):
+                if A04_B_CreateLASStats.isProcessFile(f_path, target_path, createQARasters, isClassified, stat_names=stat_names):
                     fileList.append(f_path)
 
     return fileList
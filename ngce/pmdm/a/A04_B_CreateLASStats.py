@@ -5,7 +5,6 @@ Created on Jun 15, 2017
 '''
 import arcpy
 import copy
-import csv
 from datetime import datetime
 import os
 from shutil import copyfile
@@ -19,7 +18,7 @@ from ngce.folders.FoldersConfig import ELEVATION, FIRST, LAST, lasClassified_dir
     pulse_count_dir, point_count_dir
 from ngce.las import LAS
 from ngce.pmdm import RunUtil
-from ngce.raster import RasterConfig, Raster
+from ngce.raster import RasterConfig, Raster, TileStats, ZHistogram, COG
 from ngce.raster.RasterConfig import MEAN, MAX, MIN, STAND_DEV, XMIN, XMAX, YMIN, \
     YMAX, V_NAME, V_UNIT, H_NAME, H_UNIT, H_WKID, FIELD_INFO, \
     AREA, NAME, PATH, IS_CLASSIFIED, POINT_COUNT, POINT_PERCENT, POINT_SPACING, \
@@ -50,7 +49,7 @@ KEY_LIST = [MAX, MEAN, MIN, RANGE, STAND_DEV, XMIN, YMIN, XMAX, YMAX, V_NAME, V_
 Determines if a file needs to be processed or not by looking at all the derivatives
 --------------------------------------------------------------------------------
 '''
-def isProcessFile(f_path, target_path, createQARasters=False, isClassified=True, createMissingRasters=False):
+def isProcessFile(f_path, target_path, createQARasters=False, isClassified=True, createMissingRasters=False, stat_names=None):
     process_file = False
 
     if f_path is not None and os.path.exists(f_path) and os.path.exists(target_path):
@@ -81,9 +80,10 @@ def isProcessFile(f_path, target_path, createQARasters=False, isClassified=True,
         if not os.path.exists(out_lasd_path):
             process_file = True
 
-        # stat file exists
-        stat_file_path = os.path.join(stat_out_folder, "S_{}.txt".format(f_name))
-        if not os.path.exists(stat_file_path):
+        # stats exist in the project statistics store
+        if stat_names is None:
+            stat_names = TileStats.getLasStatNames(TileStats.getStatStorePath(target_path))
+        if f_name not in stat_names:
             process_file = True
 
         # point file info exists
@@ -666,10 +666,11 @@ def addInfoFileFieldsToBound(vector_bound_path, info_file_path):
 
 '''
 --------------------------------------------------------------------------------
-Adds the exported statistics file S_<name>.txt values to the bound feature class
+Adds the LAS file statistics values (from the project statistics store) to the bound feature class
+stat_rows = [[item, category, pt_cnt, percent, z_min, z_max], ...]
 --------------------------------------------------------------------------------
 '''
-def addStatFileFieldsToBound(vector_bound_path, stat_file_path):
+def addStatFieldsToBound(vector_bound_path, stat_rows):
     clazz_data = {}
     for clazz in range(0, 18):
         if clazz <> 7:
@@ -680,77 +681,73 @@ def addStatFileFieldsToBound(vector_bound_path, stat_file_path):
                             FIELD_INFO[RANGE][0]:None}
 
     try:
-        reader = csv.reader(open(stat_file_path, 'rb'))
-        indx = 0
-        for row in reader:
+        for row in stat_rows:
             clazz = None
             field_name = None
-            indx = indx + 1
-            if indx > 2:
-                item = str(row[1])
-                category = str(row[2])
-                if category == "Returns":
-                    if item == "First":
-                        field_name = FIRST_RETURNS
-                    elif item == "Second":
-                        field_name = SECOND_RETURNS
-                    elif item == "Third":
-                        field_name = THIRD_RETURNS
-                    elif item == "Fourth":
-                        field_name = FOURTH_RETURNS
-                    elif item == "Single":
-                        field_name = SINGLE_RETURNS
-                    elif item == "First_of_Many":
-                        field_name = FIRST_OF_MANY_RETURNS
-                    elif item == "Last_of_Many":
-                        field_name = LAST_OF_MANY_RETURNS
-                    elif item == "All":
-                        field_name = ALL_RETURNS
-                elif category == "ClassCodes":
-                    clazz = None
-                    try:
-                        clazz = int(item.split("_")[0])
-                        if clazz is not None and (clazz == 18 or clazz == 7 or clazz > 18):
-                            clazz = None
-                    except:
-                        pass
-
-
-                if not (clazz is None and field_name is None):
-                    pt_cnt = None if row[3] is None else float(row[3])
-                    percent = None if row[4] is None else float(row[4])
-                    z_min = None if row[5] is None else float(row[5])
-                    z_max = None if row[6] is None else float(row[6])
-                    z_range = 0
-                    if z_min > -430 and z_max < 15000:
-                        z_range = z_max - z_min
-
-                    field_props = {FIELD_INFO[POINT_COUNT][0]:pt_cnt,
-                        FIELD_INFO[POINT_PERCENT][0]:percent,
-                        FIELD_INFO[MIN][0]:z_min,
-                        FIELD_INFO[MAX][0]:z_max,
-                        FIELD_INFO[RANGE][0]:z_range}
-
-                    if clazz is not None and clazz >= 0 and clazz <> 7 and clazz < 18:
-                        clazz_data[clazz] = field_props
-                    elif field_name is not None:
-                        for field_post in [FIELD_INFO[POINT_COUNT], FIELD_INFO[POINT_PERCENT], FIELD_INFO[MIN], FIELD_INFO[MAX], FIELD_INFO[RANGE]]:
-                            field_shpname = None
-                            field_alias = None
-                            field_type = None
-                            field_length = None
-                            field_value = None
-
-                            field_shpname = "{}_{}".format(FIELD_INFO[field_name][0], field_post[0])
-                            field_alias = "{} {}".format(FIELD_INFO[field_name][1], field_post[1])
-                            field_type = field_post[2]
-                            field_length = field_post[3]
-                            field_value = field_props[field_post[0]]
-
-                            # arcpy.AddMessage("\t\tAdding field: name'{}' alias'{}' type'{}' len'{}' value'{}'".format(field_shpname, field_alias, field_type, field_length, field_value))
-                            arcpy.AddField_management(in_table=vector_bound_path, field_name=field_shpname, field_alias=field_alias, field_type=field_type, field_length=field_length, field_is_nullable="NULLABLE", field_is_required="NON_REQUIRED")
-                            if field_value is not None:
-                                arcpy.CalculateField_management(in_table=vector_bound_path, field=field_shpname, expression=field_value, expression_type="PYTHON_9.3")
+            item = str(row[0])
+            category = str(row[1])
+            if category == "Returns":
+                if item == "First":
+                    field_name = FIRST_RETURNS
+                elif item == "Second":
+                    field_name = SECOND_RETURNS
+                elif item == "Third":
+                    field_name = THIRD_RETURNS
+                elif item == "Fourth":
+                    field_name = FOURTH_RETURNS
+                elif item == "Single":
+                    field_name = SINGLE_RETURNS
+                elif item == "First_of_Many":
+                    field_name = FIRST_OF_MANY_RETURNS
+                elif item == "Last_of_Many":
+                    field_name = LAST_OF_MANY_RETURNS
+                elif item == "All":
+                    field_name = ALL_RETURNS
+            elif category == "ClassCodes":
+                clazz = None
+                try:
+                    clazz = int(item.split("_")[0])
+                    if clazz is not None and (clazz == 18 or clazz == 7 or clazz > 18):
+                        clazz = None
+                except:
+                    pass
+
+
+            if not (clazz is None and field_name is None):
+                pt_cnt = None if row[2] is None else float(row[2])
+                percent = None if row[3] is None else float(row[3])
+                z_min = None if row[4] is None else float(row[4])
+                z_max = None if row[5] is None else float(row[5])
+                z_range = 0
+                if z_min > -430 and z_max < 15000:
+                    z_range = z_max - z_min
+
+                field_props = {FIELD_INFO[POINT_COUNT][0]:pt_cnt,
+                    FIELD_INFO[POINT_PERCENT][0]:percent,
+                    FIELD_INFO[MIN][0]:z_min,
+                    FIELD_INFO[MAX][0]:z_max,
+                    FIELD_INFO[RANGE][0]:z_range}
+
+                if clazz is not None and clazz >= 0 and clazz <> 7 and clazz < 18:
+                    clazz_data[clazz] = field_props
+                elif field_name is not None:
+                    for field_post in [FIELD_INFO[POINT_COUNT], FIELD_INFO[POINT_PERCENT], FIELD_INFO[MIN], FIELD_INFO[MAX], FIELD_INFO[RANGE]]:
+                        field_shpname = None
+                        field_alias = None
+                        field_type = None
+                        field_length = None
+                        field_value = None
+
+                        field_shpname = "{}_{}".format(FIELD_INFO[field_name][0], field_post[0])
+                        field_alias = "{} {}".format(FIELD_INFO[field_name][1], field_post[1])
+                        field_type = field_post[2]
+                        field_length = field_post[3]
+                        field_value = field_props[field_post[0]]
+
+                        # arcpy.AddMessage("\t\tAdding field: name'{}' alias'{}' type'{}' len'{}' value'{}'".format(field_shpname, field_alias, field_type, field_length, field_value))
+                        arcpy.AddField_management(in_table=vector_bound_path, field_name=field_shpname, field_alias=field_alias, field_type=field_type, field_length=field_length, field_is_nullable="NULLABLE", field_is_required="NON_REQUIRED")
+                        if field_value is not None:
+                            arcpy.CalculateField_management(in_table=vector_bound_path, field=field_shpname, expression=field_value, expression_type="PYTHON_9.3")
 
         for field_post in [FIELD_INFO[POINT_COUNT], FIELD_INFO[POINT_PERCENT], FIELD_INFO[MIN], FIELD_INFO[MAX], FIELD_INFO[RANGE]]:
             for clazz in clazz_data.keys():
@@ -772,7 +769,7 @@ def addStatFileFieldsToBound(vector_bound_path, stat_file_path):
                 if field_value is not None:
                     arcpy.CalculateField_management(in_table=vector_bound_path, field=field_shpname, expression=field_value, expression_type="PYTHON_9.3")
     except:
-        arcpy.AddWarning("\tERROR: Failed to add Stat file info {} to boundary {}".format(stat_file_path, vector_bound_path))
+        arcpy.AddWarning("\tERROR: Failed to add Stat info {} to boundary {}".format(stat_rows, vector_bound_path))
         raise
 
 '''
@@ -810,7 +807,7 @@ It also misses concave edges, not as accurate as B in this case.
 It performs 10x faster than the other 'B' method
 --------------------------------------------------------------------------------
 '''
-def createVectorBoundaryC(f_path, vector_bound_path, isClassified, stat_props=None):
+def createVectorBoundaryC(f_path, vector_bound_path, isClassified, stat_props=None, stat_store_path=None):
     a = datetime.now()
     aa = a
 
@@ -881,12 +878,14 @@ def createVectorBoundaryC(f_path, vector_bound_path, isClassified, stat_props=No
             raise Exception("  WARNING: Failed to find raster props {}".format(stat_props))
 
         parent_path = os.path.split(vector_bound_path)[0]
-        stat_file_path = os.path.join(parent_path, "S_{}.txt".format(f_name))
-        if os.path.exists(stat_file_path):
-            addStatFileFieldsToBound(vector_bound_path, stat_file_path)
+        stat_rows = None
+        if stat_store_path is not None:
+            stat_rows = TileStats.getLasStats(stat_store_path, f_name).get(f_name, None)
+        if stat_rows is not None and len(stat_rows) > 0:
+            addStatFieldsToBound(vector_bound_path, stat_rows)
         else:
-            arcpy.AddWarning("  WARNING: Failed to find stat file {}".format(stat_file_path))
-            raise Exception("  WARNING: Failed to find stat file {}".format(stat_file_path))
+            arcpy.AddWarning("  WARNING: Failed to find stats for {} in {}".format(f_name, stat_store_path))
+            raise Exception("  WARNING: Failed to find stats for {} in {}".format(f_name, stat_store_path))
 
         info_file_path = os.path.join(parent_path, "I_{}.shp".format(f_name))
         if os.path.exists(info_file_path):
@@ -1132,6 +1131,9 @@ def exportElevation(target_path, isClassified, f_name, lasd_path, createMissingR
                     z_factor="1"
                     )
 
+                if RasterConfig.COG_OUTPUT:
+                    COG.convertToCOG(out_raster_path)
+
                 arcpy.BuildPyramidsandStatistics_management(
                     in_workspace=out_raster_path,
                     build_pyramids="NONE",
@@ -1209,6 +1211,9 @@ def exportIntensity(target_path, isClassified, f_name, lasd_path, createMissingR
                     z_factor="1"
                     )
 
+                if RasterConfig.COG_OUTPUT:
+                    COG.convertToCOG(out_raster_path)
+
                 arcpy.BuildPyramidsandStatistics_management(
                     in_workspace=out_raster_path,
                     build_pyramids="NONE",
@@ -1261,6 +1266,39 @@ def getCellSize(spatial_reference, cell_size, createMissingRasters=False):
     return result
 
 
+'''
+--------------------------------------------------------------------------------
+Creates the Z histogram of the first and last return elevation rasters
+and saves it in the project statistics store. A05 uses the merged histograms
+to find the valid Z range for the project.
+--------------------------------------------------------------------------------
+'''
+def createElevationHistogram(target_path, isClassified, f_name, stat_store_path):
+    a = datetime.now()
+    names = ["_" + FIRST, "_" + LAST]
+    if not isClassified:
+        # Using a generic name for non-classified data
+        names = [""]
+
+    histograms = []
+    for name in names:
+        out_folder = os.path.join(target_path, ELEVATION)
+        if len(name) > 0:
+            out_folder = os.path.join(target_path, ELEVATION, name[1:])
+
+        out_raster_path = os.path.join(out_folder, "{}{}.tif".format(f_name, name))
+        if not os.path.exists(out_raster_path):
+            out_raster_path = os.path.join(out_folder, "C_{}{}.tif".format(f_name, name))
+
+        if os.path.exists(out_raster_path):
+            histograms.append(ZHistogram.createRasterHistogram(out_raster_path))
+        else:
+            arcpy.AddWarning("\tWARNING: Failed to find elevation raster for Z histogram {}".format(out_raster_path))
+
+    histogram = ZHistogram.mergeHistograms(histograms)
+    TileStats.addZHistogram(stat_store_path, f_name, ELEVATION, RasterConfig.Z_HIST_BIN_WIDTH, histogram)
+    doTime(a, "\tCreated Z histogram with {} bins for {}".format(len(histogram), f_name))
+
 def processFile(f_path, target_path, spatial_reference, isClassified, createQARasters=False, createMissingRasters=False, overrideBorderPath=None):
     if not isinstance(createQARasters, bool):
         createQARasters = (str(createQARasters) in ['True', 'true', '1', 't', 'y', 'yes', 'yeah', 'yup', 'certainly', 'uh-huh'])
@@ -1302,12 +1340,17 @@ def processFile(f_path, target_path, spatial_reference, isClassified, createQARa
         arcpy.AddMessage("\tLAS file {} has {} points. SKIPPING FILE!".format(f_name, point_count))
     else:
         try:
-            # Export LAS Stats file from lasx
+            # Export LAS Stats from lasx into the project statistics store
+            stat_store_path = TileStats.getStatStorePath(target_path)
             stat_file_path = os.path.join(stat_out_folder, "S_{}.txt".format(f_name))
-            if os.path.exists(stat_file_path):
-                arcpy.AddMessage("\tStat file exists: {}".format(stat_file_path))
+            if f_name in TileStats.getLasStatNames(stat_store_path):
+                arcpy.AddMessage("\tStats exist: {}".format(stat_store_path))
             else:
-                createLasDatasetStats(out_lasd_path, f_path, spatial_reference, stat_file_path)
+                # Older projects may still have the stat file, load it instead of recalculating
+                if not os.path.exists(stat_file_path):
+                    createLasDatasetStats(out_lasd_path, f_path, spatial_reference, stat_file_path)
+                TileStats.addLasStatFile(stat_store_path, f_name, stat_file_path)
+                deleteFileIfExists(stat_file_path)
 
             # Export Point File Information
             point_file_path = os.path.join(stat_out_folder, "I_{}.shp".format(f_name))
@@ -1320,6 +1363,12 @@ def processFile(f_path, target_path, spatial_reference, isClassified, createQARa
             lasd_all = None
 
             lasd_last, lasd_first = exportElevation(target_path, isClassified, f_name, out_lasd_path, createMissingRasters)
+
+            # Cache the Z histogram of the elevation rasters with the stats
+            if f_name in TileStats.getZHistogramNames(stat_store_path, ELEVATION):
+                arcpy.AddMessage("\tZ histogram exists: {}".format(stat_store_path))
+            else:
+                createElevationHistogram(target_path, isClassified, f_name, stat_store_path)
             if createMissingRasters:
                 lasd_first = exportIntensity(target_path, isClassified, f_name, out_lasd_path, createMissingRasters)
 
@@ -1416,7 +1465,7 @@ def processFile(f_path, target_path, spatial_reference, isClassified, createQARa
                         while not success and tries < MAX_TRIES:
                             tries = tries + 1
                             try:
-                                createVectorBoundaryC(out_raster_path, vector_bound_C_path, isClassified, stat_props)
+                                createVectorBoundaryC(out_raster_path, vector_bound_C_path, isClassified, stat_props, stat_store_path)
                                 success = True
                             except:
                                 if tries >= MAX_TRIES:
@@ -1428,7 +1477,7 @@ def processFile(f_path, target_path, spatial_reference, isClassified, createQARa
                                     pass
                     else:
                         try:
-                            createVectorBoundaryC(out_raster_path, vector_bound_C_path, isClassified, stat_props)
+                            createVectorBoundaryC(out_raster_path, vector_bound_C_path, isClassified, stat_props, stat_store_path)
                         except:
                             deleteFileIfExists(vector_bound_C_path, False, True)
                             arcpy.AddWarning("Failed to build boundary C, but it has {} rows {} cols and {} points. Ignoring error for {}.".format(num_rows, num_cols, point_count, f_name))
@@ -1517,8 +1566,8 @@ def processFile(f_path, target_path, spatial_reference, isClassified, createQARa
                                                                                 pyramid_level="-1",
                                                                                 SKIP_FIRST="NONE",
                                                                                 resample_technique="NEAREST",
-                                                                                compression_type="LZ77",
-                                                                                compression_quality="75",
+                                                                                compression_type=RasterConfig.RASTER_PYRAMID_COMPRESSION,
+                                                                                compression_quality=RasterConfig.RASTER_COMPRESSION_QUALITY,
                                                                                 skip_existing="SKIP_EXISTING")
 
                                     doTime(a, "\tCreated {}x{} RASTER {}".format(cell_size, cell_size, out_raster))
@@ -1559,7 +1608,7 @@ def processFile(f_path, target_path, spatial_reference, isClassified, createQARa
 Operates on a single .las file to calcluate the following:
 
 1. Verify if the .lasx file exists, if not it creates it by creating a .lasd
-2. Export the statistics .txt file
+2. Export the statistics into the project statistics store
 3. [removed] Export the point file information shape file
 4. Calculates the boundary of the .las file using a mosaic dataset
 5. [optional] Exports a number of statistical QA rasters (point count, predominate class, etc.)
@@ -1572,7 +1621,7 @@ Inputs:
     createQARasters = True or False: True creates the QA statistical rasters. Default is False
 
 Outputs:
-    DERIVED/STATS/S_<f_name>.txt = The statistics text file for the .las file
+    DERIVED/STATS/TileStats.sqlite = The statistics for the .las file are added to the project statistics store
     [removed] DERIVED/STATS/I_<f_name>.shp = The point file information shape file for the .las file
     DERIVED/STATS/B_<f_name>.shp = The boundary shape file for the .las file
     n DERIVED/<Statistic>/[ALL|FIRST|LAST]/<f_name>.tif = The QA statistic file for the given Statistic. Classified data is further separated into folders for All, First, and Last returns.
@@ -1626,6 +1675,10 @@ if __name__ == '__main__':
 
     f_paths = str(f_paths).split(",")
 
+    # Write the stats to local scratch, A04_A merges them into the project store
+    stat_store_path = TileStats.getStatStorePath(target_path)
+    TileStats.openWorkerStore(stat_store_path)
+
     for f_path in f_paths:
         if not isProcessFile(f_path, target_path, createQARasters, isClassified, createMissingRasters):
             arcpy.AddMessage("\tAll las file artifacts exist. Ignoring: {}".format(f_path))
@@ -1643,6 +1696,8 @@ if __name__ == '__main__':
                 arcpy.AddMessage('Error While Executing processFile')
                 arcpy.AddMessage(e)
 
+    TileStats.closeWorkerStore(stat_store_path)
+
     if checkedOut:
         arcpy.CheckInExtension("3D")
         arcpy.CheckInExtension("Spatial")
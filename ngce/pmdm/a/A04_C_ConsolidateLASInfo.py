@@ -36,8 +36,8 @@ import glob
 from ngce import Utility
 from ngce.Utility import deleteFileIfExists, doTime, deleteFields
 from ngce.cmdr import CMDRConfig
-from ngce.folders.FoldersConfig import STATS_METHODS, DATASET_NAMES
-from ngce.raster import RasterConfig, Raster
+from ngce.folders.FoldersConfig import STATS_METHODS, DATASET_NAMES, point_count_dir
+from ngce.raster import RasterConfig, Raster, TileStats, HeightModels
 from ngce.raster.RasterConfig import FIELD_INFO, PATH, NAME, IS_CLASSIFIED, V_NAME, \
     V_UNIT, H_NAME, H_UNIT, H_WKID, AREA, MAX, MEAN, MIN, RANGE, STAND_DEV, XMIN, \
     YMIN, XMAX, YMAX, FIRST_RETURNS, SECOND_RETURNS, THIRD_RETURNS, \
@@ -52,6 +52,9 @@ def getLasdBoundaryPath(fgdb_path):
 def getLasFootprintPath(fgdb_path):
     return os.path.join(fgdb_path, "FootprintLASFile")
 
+def getLasTileStatsPath(fgdb_path):
+    return os.path.join(fgdb_path, "TileStatsLASFile")
+
 
 
 ##def deleteField(in_table, drop_field):
@@ -488,6 +491,44 @@ def addProjectInfo(raster_footprint, raster_boundary, project_ID, project_path,
             arcpy.AddField_management(in_table=table, field_name=field[0], field_alias=field[0], field_type=field[1], field_length=field[2], field_is_nullable="NULLABLE", field_is_required="NON_REQUIRED")
             arcpy.CalculateField_management(in_table=table, field=field[0], expression='"{}"'.format(field[3]), expression_type="PYTHON_9.3")
 
+'''
+---------------------------------------------
+Copies the statistics for all of the las files from the
+project statistics store into a table with one query
+(instead of opening each S_<name>.txt file)
+---------------------------------------------
+'''
+def createLasTileStatsTable(fgdb_path, target_path):
+    a = datetime.datetime.now()
+
+    las_stats_table = getLasTileStatsPath(fgdb_path)
+    if arcpy.Exists(las_stats_table):
+        arcpy.AddMessage("LAS tile statistics exist: {}".format(las_stats_table))
+    else:
+        las_stats = TileStats.getLasStats(TileStats.getStatStorePath(target_path))
+
+        out_path, out_name = os.path.split(las_stats_table)
+        arcpy.CreateTable_management(out_path=out_path, out_name=out_name)
+        for field_name, field_type, field_length in [["name", "TEXT", "100"],
+                                                     ["item", "TEXT", "50"],
+                                                     ["category", "TEXT", "50"],
+                                                     ["pt_cnt", "DOUBLE", ""],
+                                                     ["percent", "DOUBLE", ""],
+                                                     ["z_min", "DOUBLE", ""],
+                                                     ["z_max", "DOUBLE", ""]]:
+            arcpy.AddField_management(in_table=las_stats_table, field_name=field_name, field_alias=field_name, field_type=field_type, field_length=field_length, field_is_nullable="NULLABLE", field_is_required="NON_REQUIRED")
+
+        row_count = 0
+        with arcpy.da.InsertCursor(las_stats_table, TileStats.LAS_STATS_COLUMNS) as cursor:  # @UndefinedVariable
+            for f_name, stat_rows in las_stats.iteritems():
+                for stat_row in stat_rows:
+                    cursor.insertRow([f_name] + stat_row)
+                    row_count = row_count + 1
+
+        a = doTime(a, "Copied {} statistics rows for {} las files to {}".format(row_count, len(las_stats), las_stats_table))
+
+    return las_stats_table
+
 '''
 ---------------------------------------------
 Generate the las dataset boundary and the footprints
@@ -703,6 +744,8 @@ def createRasterBoundaryAndFootprints(fgdb_path, target_path, project_ID, projec
     except:
         pass
 
+    createLasTileStatsTable(fgdb_path, target_path)
+
     return lasd_boundary, las_footprint
 
 def createReferenceddMosaicDataset(in_md_path, out_md_path, spatial_ref, raster_v_unit):
@@ -782,11 +825,22 @@ def createQARasterMosaics(isClassified, gdb_path, spatial_reference, target_fold
 
     md_name = CANOPY_DENSITY
     dhm_md_path = os.path.join(gdb_path, md_name)
-    mosaics.append([dhm_md_path, md_name])
 
     if arcpy.Exists(dhm_md_path):
         arcpy.AddMessage("{} already exists.".format(md_name))
+        mosaics.append([dhm_md_path, md_name])
+    elif RasterConfig.HEIGHT_MATERIALIZE and isClassified:
+        try:
+            # Canopy density tiles from the ALL and LAST point count tiles
+            density_folder = os.path.join(target_folder, CANOPY_DENSITY)
+            HeightModels.createCanopyDensityRasters(os.path.join(target_folder, point_count_dir), density_folder)
+            qa_md = createQARasterMosaicDataset(md_name, gdb_path, spatial_reference, density_folder, mxd, simple_footprint_path, simple_lasd_boundary_path)
+            if qa_md is not None:
+                mosaics.append(qa_md)
+        except:
+            arcpy.AddMessage("Failed to create {}".format(dhm_md_path))
     else:
+        mosaics.append([dhm_md_path, md_name])
         try:
             vert_cs_name, vert_unit_name = Utility.getVertCSInfo(spatial_reference)  # @UnusedVariable
             # No need to update boundary and footprints since it will inherit from the original
@@ -45,16 +45,17 @@ from ngce import Utility
 from ngce.Utility import isSrValueValid, grouper, doTime, SDE_CMDR_FILE_PATH
 from ngce.cmdr.JobUtil import getProjectFromWMXJobID
 from ngce.folders import ProjectFolders
-from ngce.folders.FoldersConfig import DTM, DSM, DLM, INT
+from ngce.folders.FoldersConfig import DTM, DSM, DLM, INT, ELEVATION
 from ngce.folders.ProjectFolders import createAnalysisFolders, \
     createPublishFolders
 from ngce.las import LAS
 from ngce.pmdm import RunUtil
 from ngce.pmdm.a import A05_B_RevalueRaster, A04_A_GenerateQALasDataset, \
     A04_C_ConsolidateLASInfo, A05_C_ConsolidateRasterInfo, A05_D_UpdateCMDRMetadata
+from ngce.raster import TileStats, ZHistogram
 from ngce.raster.Raster import createRasterDatasetStats
 from ngce.raster.RasterConfig import FIELD_INFO, MIN, MAX, V_NAME, V_UNIT, \
-    H_NAME, H_UNIT, H_WKID, ELEV_TYPE, IS_CLASSIFIED
+    H_NAME, H_UNIT, H_WKID, ELEV_TYPE, IS_CLASSIFIED, STAT_FOLDER_ORG
 
 
 PROCESS_DELAY = 10
@@ -223,6 +224,36 @@ def bufferZValues(z_min, z_max, add_buffer=True):
 
     return z_min, z_max
 
+'''
+--------------------------------------------------------------------------------
+Finds the valid Z range from the las file elevation histograms cached in the
+project statistics store (percentiles and outlier gaps, see ZHistogram.getZLimits)
+Returns the default z_min, z_max (LAS boundary statistics) unless every las file
+with statistics has a histogram. A partial set of histograms could leave out the
+tiles with the highest or lowest ground.
+--------------------------------------------------------------------------------
+'''
+def getHistogramZLimits(target_path, z_min, z_max):
+    a = datetime.now()
+    stat_store_path = TileStats.getStatStorePath(target_path)
+    tile_histograms = TileStats.getZHistograms(stat_store_path, ELEVATION)
+    missing_names = TileStats.getLasStatNames(stat_store_path) - set(tile_histograms.keys())
+    if len(tile_histograms) <= 0:
+        arcpy.AddMessage("\tNo Z histograms found, using the LAS boundary Z range {} to {}".format(z_min, z_max))
+    elif len(missing_names) > 0:
+        arcpy.AddMessage("\tZ histograms missing for {} of {} las files, using the LAS boundary Z range {} to {}".format(len(missing_names), len(missing_names) + len(tile_histograms), z_min, z_max))
+    else:
+        bin_width, histogram = ZHistogram.mergeTileHistograms(tile_histograms)
+        hist_z_min, hist_z_max = ZHistogram.getZLimits(histogram, bin_width)
+        if hist_z_min is None or hist_z_max is None:
+            arcpy.AddMessage("\tZ histograms are empty, using the LAS boundary Z range {} to {}".format(z_min, z_max))
+        else:
+            arcpy.AddMessage("\tZ histograms from {} las files give a Z range of {} to {} (LAS boundary Z range {} to {})".format(len(tile_histograms), hist_z_min, hist_z_max, z_min, z_max))
+            z_min, z_max = bufferZValues(hist_z_min, hist_z_max, add_buffer=False)
+    doTime(a, "\tCalculated Z range")
+
+    return z_min, z_max
+
 def getRasterBoundData(bound_path, elev_type, add_buffer=True):
 
     try:
@@ -413,6 +444,10 @@ def processRastersInFolder(fileList, target_path, publish_path, elev_type, bound
                     # arcpy.AddMessage("processRastersInFolder: Waiting for process list to clear {} jobs".format(len(processList)))
                     time.sleep(PROCESS_DELAY)
 
+        # The workers leave their stats in parts, merge them with a single writer
+        merged = TileStats.mergeWorkerStores(TileStats.getStatStorePath(target_path))
+        arcpy.AddMessage("       processRastersInFolder: Merged {} stat store parts".format(merged))
+
         if runAgain and len(fileList_repeat) > 0:
             # try to clean up any errors along the way
             processRastersInFolder(fileList, target_path, publish_path, elev_type, bound_path, z_min, z_max, v_name, v_unit, h_name, h_unit, h_wkid, spatial_ref, runAgain=False)
@@ -439,6 +474,8 @@ def getFileProcessList(start_dir, elev_type, target_path, publish_path, return_f
     try:
         fileList = []
         index = 0
+        # Read the processed raster names from the statistics store once instead of once per raster
+        stat_names = TileStats.getRasterStatNames(TileStats.getStatStorePath(target_path), elev_type, STAT_FOLDER_ORG)
         for root, dirs, files in os.walk(start_dir):  # @UnusedVariable
             arcpy.env.workspace = root
             rasters = arcpy.ListRasters("*", "ALL")
@@ -449,7 +486,7 @@ def getFileProcessList(start_dir, elev_type, target_path, publish_path, return_f
                     f_path = os.path.join(root, f_name)
                     if return_first:
                         return f_path
-                    if A05_B_RevalueRaster.isProcessFile(f_path, elev_type, target_path, publish_path):
+                    if A05_B_RevalueRaster.isProcessFile(f_path, elev_type, target_path, publish_path, stat_names):
                         index = index + 1
                         fileList.append(f_path)
 
@@ -529,6 +566,7 @@ def processJob(ProjectJob, project, ProjectUID):
 
     spatialRef_error = {}
     z_min, z_max, v_name, v_unit, h_name, h_unit, h_wkid, is_classified = getLasdBoundData(lasd_boundary)  # @UnusedVariable
+    z_min, z_max = getHistogramZLimits(target_path, z_min, z_max)
     arcpy.AddMessage('TRACKING')
     arcpy.AddMessage(v_name)
 
@@ -12,7 +12,7 @@ import time
 from ngce import Utility
 from ngce.Utility import isMatchingStringValue, deleteFileIfExists, doTime
 from ngce.folders.FoldersConfig import INT
-from ngce.raster import RasterConfig
+from ngce.raster import RasterConfig, TileStats, COG, ZHistogram
 from ngce.raster.Raster import createRasterDatasetStats
 from ngce.raster.RasterConfig import STAT_FOLDER_ORG, STAT_RASTER_FOLDER, FIELD_INFO, \
     PATH, NAME, AREA, ELEV_TYPE, RANGE, KEY_LIST, MAX, MIN, BAND_COUNT, \
@@ -32,7 +32,7 @@ Utility.setArcpyEnv(True)
 Determines if a file needs to be processed or not by looking at all the derivatives
 --------------------------------------------------------------------------------
 '''
-def isProcessFile(f_path, elev_type, target_path, publish_path):
+def isProcessFile(f_path, elev_type, target_path, publish_path, stat_names=None):
     process_file = False
 
     if f_path is not None and target_path is not None and publish_path is not None:
@@ -46,7 +46,7 @@ def isProcessFile(f_path, elev_type, target_path, publish_path):
         else:
             deleteFields(vector_bound_path)
 
-        if not os.path.exists(stat_file_path):
+        if not isRasterStatsExist(f_name, elev_type, target_path, STAT_FOLDER_ORG, stat_names):
             process_file = True
 
         if not os.path.exists(target_f_path):
@@ -57,6 +57,61 @@ def isProcessFile(f_path, elev_type, target_path, publish_path):
 
     return process_file
 
+'''
+--------------------------------------------------------------------------------
+Checks the project statistics store for the raster version's statistics
+stat_names = (optional) set of names already read from the store for this version
+--------------------------------------------------------------------------------
+'''
+def isRasterStatsExist(f_name, elev_type, target_path, raster_version, stat_names=None):
+    if stat_names is not None:
+        return f_name in stat_names
+    return TileStats.hasRasterStats(TileStats.getStatStorePath(target_path), f_name, elev_type, raster_version)
+
+'''
+--------------------------------------------------------------------------------
+Moves the S_<name>.txt stats file left by earlier runs into the project
+statistics store. Returns True if the stats were loaded
+--------------------------------------------------------------------------------
+'''
+def loadRasterStatFile(stat_file_path, f_name, elev_type, target_path, raster_version):
+    loaded = False
+    if os.path.exists(stat_file_path):
+        if TileStats.addRasterStatFile(TileStats.getStatStorePath(target_path), f_name, elev_type, raster_version, stat_file_path) is not None:
+            arcpy.AddMessage("\tLoaded stat file: {}".format(stat_file_path))
+            loaded = True
+        deleteFileIfExists(stat_file_path)
+    return loaded
+
+'''
+--------------------------------------------------------------------------------
+Calculates the raster statistics and saves them in the project statistics store
+--------------------------------------------------------------------------------
+'''
+def createRasterStats(raster_path, f_name, elev_type, target_path, raster_version):
+    raster_props = createRasterDatasetStats(raster_path)
+    TileStats.addRasterStats(TileStats.getStatStorePath(target_path), f_name, elev_type, raster_version, raster_props)
+    arcpy.AddMessage("\tSaved {} {} stats for {}".format(elev_type, raster_version, f_name))
+    return raster_props
+
+'''
+--------------------------------------------------------------------------------
+Saves the histogram of the raster in the project statistics store.
+The valid pixel count and histogram are needed to merge the tile statistics
+into the mosaic dataset statistics without re-reading the pixels.
+--------------------------------------------------------------------------------
+'''
+def createRasterHistogram(raster_path, f_name, elev_type, target_path, raster_version):
+    stat_store_path = TileStats.getStatStorePath(target_path)
+    source = TileStats.getRasterHistogramSource(elev_type, raster_version)
+    if f_name in TileStats.getZHistogramNames(stat_store_path, source):
+        arcpy.AddMessage("\tHistogram exists: {} {}".format(source, f_name))
+    else:
+        a = datetime.now()
+        histogram = ZHistogram.createRasterHistogram(raster_path)
+        TileStats.addZHistogram(stat_store_path, f_name, source, RasterConfig.Z_HIST_BIN_WIDTH, histogram)
+        doTime(a, "\tSaved {} histogram for {}".format(source, f_name))
+
 '''
 ----------------------------------------
 Calculate all the paths related to the outputs of this script
@@ -368,11 +423,16 @@ def RevalueRaster(f_path, elev_type, raster_props, target_path, publish_path, mi
                     deleteFileIfExists(target_f_path, True)
                     arcpy.AddMessage("\tSaving derived raster to {}".format(target_f_path))
 
-                    # Compression isn't being applied properly so results are uncompressed
-                    rasterObject = arcpy.Raster(f_path)
-                    outSetNull = arcpy.sa.Con(((rasterObject >= (float(minZ))) & (rasterObject <= (float(maxZ)))), f_path)  # @UndefinedVariable
-                    outSetNull.save(target_f_path)
-                    del outSetNull, rasterObject
+                    # setArcpyEnv leaves the compression off, compress the derived raster
+                    compression = arcpy.env.compression
+                    try:
+                        arcpy.env.compression = RasterConfig.RASTER_COMPRESSION_ENV
+                        rasterObject = arcpy.Raster(f_path)
+                        outSetNull = arcpy.sa.Con(((rasterObject >= (float(minZ))) & (rasterObject <= (float(maxZ)))), f_path)  # @UndefinedVariable
+                        outSetNull.save(target_f_path)
+                        del outSetNull, rasterObject
+                    finally:
+                        arcpy.env.compression = compression
 
                     if spatial_ref is not None:
                         arcpy.AddMessage("Applying projection to raster '{}' {}".format(target_f_path, spatial_ref))
@@ -390,6 +450,9 @@ def RevalueRaster(f_path, elev_type, raster_props, target_path, publish_path, mi
 
                         arcpy.DefineProjection_management(in_dataset=target_f_path, coor_system=spatial_ref)
 
+                    if RasterConfig.COG_OUTPUT:
+                        COG.convertToCOG(target_f_path)
+
                     # Set the no data default value on the input raster
                     arcpy.SetRasterProperties_management(in_raster=target_f_path, data_type="ELEVATION", nodata="1 {}".format(nodata))
                     arcpy.CalculateStatistics_management(in_raster_dataset=target_f_path, x_skip_factor="1", y_skip_factor="1", ignore_values="", skip_existing="OVERWRITE", area_of_interest="Feature Set")
@@ -420,14 +483,23 @@ def RevalueRaster(f_path, elev_type, raster_props, target_path, publish_path, mi
 
                     deleteFileIfExists(publish1_f_path, True)
                     deleteFileIfExists(publish_f_path, True)
-                    # arcpy.RasterToOtherFormat_conversion(target_f_path, publish_f_path, Raster_Format="TIFF")
-                    arcpy.CopyRaster_management(in_raster=target_f_path, out_rasterdataset=publish1_f_path, config_keyword="", background_value="", nodata_value=nodata, onebit_to_eightbit="NONE", colormap_to_RGB="NONE", pixel_type="32_BIT_FLOAT", scale_pixel_value="NONE", RGB_to_Colormap="NONE", format="TIFF", transform="NONE")
-
-                    arcpy.AddMessage("\tCliping temp raster {} to {}".format(publish1_f_path, publish_f_path))
-                    arcpy.Clip_management(in_raster=publish1_f_path, out_raster=publish_f_path, in_template_dataset=bound_path, nodata_value=nodata, clipping_geometry="ClippingGeometry", maintain_clipping_extent="NO_MAINTAIN_EXTENT")
+                    # setArcpyEnv leaves the compression off, compress the published raster
+                    compression = arcpy.env.compression
+                    try:
+                        arcpy.env.compression = RasterConfig.RASTER_COMPRESSION_ENV
+                        # arcpy.RasterToOtherFormat_conversion(target_f_path, publish_f_path, Raster_Format="TIFF")
+                        arcpy.CopyRaster_management(in_raster=target_f_path, out_rasterdataset=publish1_f_path, config_keyword="", background_value="", nodata_value=nodata, onebit_to_eightbit="NONE", colormap_to_RGB="NONE", pixel_type="32_BIT_FLOAT", scale_pixel_value="NONE", RGB_to_Colormap="NONE", format="TIFF", transform="NONE")
+
+                        arcpy.AddMessage("\tCliping temp raster {} to {}".format(publish1_f_path, publish_f_path))
+                        arcpy.Clip_management(in_raster=publish1_f_path, out_raster=publish_f_path, in_template_dataset=bound_path, nodata_value=nodata, clipping_geometry="ClippingGeometry", maintain_clipping_extent="NO_MAINTAIN_EXTENT")
+                    finally:
+                        arcpy.env.compression = compression
 
                     deleteFileIfExists(publish1_f_path, True)
 
+                    if RasterConfig.COG_OUTPUT:
+                        COG.convertToCOG(publish_f_path)
+
                     arcpy.SetRasterProperties_management(in_raster=publish_f_path, data_type="ELEVATION", nodata="1 {}".format(nodata))
                     arcpy.CalculateStatistics_management(in_raster_dataset=publish_f_path, x_skip_factor="1", y_skip_factor="1", ignore_values="", skip_existing="OVERWRITE", area_of_interest="Feature Set")
 #                     arcpy.BuildPyramidsandStatistics_management(in_workspace=publish_f_path,
@@ -505,35 +577,36 @@ def processFile(bound_path, f_path, elev_type, target_path, publish_path, z_min,
 
     f_name, target_f_path, publish_f_path, stat_out_folder, stat_file_path, bound_out_folder, vector_bound_path = getFilePaths(f_path, elev_type, target_path, publish_path)  # @UnusedVariable
 
-    # Export Stats file
+    # Save the stats to the project statistics store
     raster_props = None
-    if os.path.exists(stat_file_path):
-        arcpy.AddMessage("\tStat file exists: {}".format(stat_file_path))
+    if isRasterStatsExist(f_name, elev_type, target_path, STAT_FOLDER_ORG) or loadRasterStatFile(stat_file_path, f_name, elev_type, target_path, STAT_FOLDER_ORG):
+        arcpy.AddMessage("\tStats exist: {} {} {}".format(elev_type, STAT_FOLDER_ORG, f_name))
     else:
-        raster_props = createRasterDatasetStats(f_path, stat_file_path)
+        raster_props = createRasterStats(f_path, f_name, elev_type, target_path, STAT_FOLDER_ORG)
         spatial_ref = CheckRasterSpatialReference(v_name, v_unit, h_name, h_unit, h_wkid, raster_props, spatial_ref)
 
     if os.path.exists(target_f_path) and os.path.exists(publish_f_path):
         arcpy.AddMessage("\tRasters exist: '{}' and '{}'".format(target_f_path, publish_f_path))
     else:
         if raster_props is None:
-            # Stat.txt and boundary file already exists, so just read them in here
+            # Stats and boundary file already exist, so just read them in here
             raster_props = createRasterDatasetStats(f_path)
         RevalueRaster(f_path, elev_type, raster_props, target_path, publish_path, z_min, z_max, bound_path, spatial_ref)
         CheckRasterSpatialReference(v_name, v_unit, h_name, h_unit, h_wkid, raster_props)
 
     f_name, target_f_path, publish_f_path, stat_out_folder, stat_file_path, bound_out_folder, vector_bound_path = getFilePaths(f_path, elev_type, target_path, publish_path, STAT_FOLDER_DER)  # @UnusedVariable
-    if os.path.exists(stat_file_path):
-        arcpy.AddMessage("\tStat file exists: {}".format(stat_file_path))
+    if isRasterStatsExist(f_name, elev_type, target_path, STAT_FOLDER_DER) or loadRasterStatFile(stat_file_path, f_name, elev_type, target_path, STAT_FOLDER_DER):
+        arcpy.AddMessage("\tStats exist: {} {} {}".format(elev_type, STAT_FOLDER_DER, f_name))
     else:
-        raster_props = createRasterDatasetStats(target_f_path, stat_file_path)
+        raster_props = createRasterStats(target_f_path, f_name, elev_type, target_path, STAT_FOLDER_DER)
         CheckRasterSpatialReference(v_name, v_unit, h_name, h_unit, h_wkid, raster_props)
 
     f_name, target_f_path, publish_f_path, stat_out_folder, stat_file_path, bound_out_folder, vector_bound_path = getFilePaths(f_path, elev_type, target_path, publish_path, STAT_FOLDER_PUB)  # @UnusedVariable
-    if os.path.exists(stat_file_path):
-        arcpy.AddMessage("\tStat file exists: {}".format(stat_file_path))
+    if isRasterStatsExist(f_name, elev_type, target_path, STAT_FOLDER_PUB) or loadRasterStatFile(stat_file_path, f_name, elev_type, target_path, STAT_FOLDER_PUB):
+        arcpy.AddMessage("\tStats exist: {} {} {}".format(elev_type, STAT_FOLDER_PUB, f_name))
     else:
-        raster_props = createRasterDatasetStats(publish_f_path, stat_file_path)
+        raster_props = createRasterStats(publish_f_path, f_name, elev_type, target_path, STAT_FOLDER_PUB)
+    createRasterHistogram(publish_f_path, f_name, elev_type, target_path, STAT_FOLDER_PUB)
 
     if os.path.exists(vector_bound_path):
         arcpy.AddMessage("\tBound file exists: {}".format(vector_bound_path))
@@ -562,7 +635,7 @@ def processFile(bound_path, f_path, elev_type, target_path, publish_path, z_min,
 Operates on a single .las file to calcluate the following:
 
 1. Verify if the .lasx file exists, if not it creates it by creating a .lasd
-2. Export the statistics .txt file
+2. Save the statistics into the project statistics store
 3. [removed] Export the point file information shape file
 4. Calculates the boundary of the .las file using a mosaic dataset
 5. [optional] Exports a number of statistical QA rasters (point count, predominate class, etc.)
@@ -644,17 +717,25 @@ if __name__ == '__main__':
 
     f_paths = str(f_paths).split(",")
 
-    for f_path in f_paths:
-        if not isProcessFile(f_path, elev_type, target_path, publish_path):
-            arcpy.AddMessage("\tAll raster file artifacts exist. Ignoring: {}".format(f_path))
-        else:
-            if not checkedOut:
-                checkedOut = True
-                arcpy.AddMessage("\tChecking out licenses")
-                arcpy.CheckOutExtension("3D")
-                arcpy.CheckOutExtension("Spatial")
+    # Write the stats to local scratch, A05_A merges them into the project store
+    stat_store_path = TileStats.getStatStorePath(target_path)
+    TileStats.openWorkerStore(stat_store_path)
 
-            processFile(bound_path, f_path, elev_type, target_path, publish_path, z_min, z_max, v_name, v_unit, h_name, h_unit, h_wkid, spatial_ref)
+    try:
+        for f_path in f_paths:
+            if not isProcessFile(f_path, elev_type, target_path, publish_path):
+                arcpy.AddMessage("\tAll raster file artifacts exist. Ignoring: {}".format(f_path))
+            else:
+                if not checkedOut:
+                    checkedOut = True
+                    arcpy.AddMessage("\tChecking out licenses")
+                    arcpy.CheckOutExtension("3D")
+                    arcpy.CheckOutExtension("Spatial")
+
+                processFile(bound_path, f_path, elev_type, target_path, publish_path, z_min, z_max, v_name, v_unit, h_name, h_unit, h_wkid, spatial_ref)
+    finally:
+        # Keep the stats of the files done so far if a file fails
+        TileStats.closeWorkerStore(stat_store_path)
 
     if checkedOut:
         arcpy.CheckInExtension("3D")
@@ -26,11 +26,12 @@ import os
 
 from ngce.Utility import deleteFileIfExists, doTime, alterFields, deleteFields
 from ngce.cmdr import CMDRConfig
+from ngce.raster import TileStats
 from ngce.raster.RasterConfig import FIELD_INFO, ELEV_TYPE, PATH, NAME, V_NAME, \
     V_UNIT, H_NAME, H_UNIT, H_WKID, NODATA_VALUE, AREA, MAX, MEAN, MIN, RANGE, \
     STAND_DEV, XMIN, YMIN, XMAX, YMAX, WIDTH, HEIGHT, MEAN_CELL_WIDTH, \
     MEAN_CELL_HEIGHT, BAND_COUNT, FORMAT, HAS_RAT, IS_INT, IS_TEMP, PIXEL_TYPE, \
-    UNCOMP_SIZE, STAT_RASTER_FOLDER
+    UNCOMP_SIZE, STAT_RASTER_FOLDER, KEY_LIST
 
 
 def getRasterBoundaryPath(fgdb_path, elev_type=None):
@@ -45,6 +46,43 @@ def getRasterFootprintPath(fgdb_path, elev_type=None):
         result = "{}_{}".format(result, elev_type)
     return result
 
+def getRasterTileStatsPath(fgdb_path, elev_type=None):
+    result = os.path.join(fgdb_path, "TileStatsRaster")
+    if elev_type is not None:
+        result = "{}_{}".format(result, elev_type)
+    return result
+
+'''
+---------------------------------------------
+Copies the statistics for all of the raster files (all versions)
+from the project statistics store into a table with one query
+(instead of opening each S_<name>.txt file)
+---------------------------------------------
+'''
+def createRasterTileStatsTable(fgdb_path, target_path, elev_type):
+    a = datetime.datetime.now()
+
+    raster_stats_table = getRasterTileStatsPath(fgdb_path, elev_type)
+    if arcpy.Exists(raster_stats_table):
+        arcpy.AddMessage("Raster tile statistics exist: {}".format(raster_stats_table))
+    else:
+        raster_stats = TileStats.getRasterStats(TileStats.getStatStorePath(target_path), elev_type)
+
+        out_path, out_name = os.path.split(raster_stats_table)
+        arcpy.CreateTable_management(out_path=out_path, out_name=out_name)
+        fields = [[column, column, "TEXT", "20"] for column in TileStats.RASTER_STATS_KEY_COLUMNS]
+        fields = fields + [FIELD_INFO[key] for key in KEY_LIST]
+        for field_name, field_alias, field_type, field_length in fields:
+            arcpy.AddField_management(in_table=raster_stats_table, field_name=field_name, field_alias=field_alias, field_type=field_type, field_length=field_length, field_is_nullable="NULLABLE", field_is_required="NON_REQUIRED")
+
+        with arcpy.da.InsertCursor(raster_stats_table, TileStats.RASTER_STATS_COLUMNS) as cursor:  # @UndefinedVariable
+            for raster_stat in raster_stats:
+                cursor.insertRow([raster_stat[column] for column in TileStats.RASTER_STATS_COLUMNS])
+
+        a = doTime(a, "Copied {} raster statistics rows to {}".format(len(raster_stats), raster_stats_table))
+
+    return raster_stats_table
+
 '''
 ---------------------------------------------
 Takes a set of footprints and merges them into a boundary
@@ -308,6 +346,8 @@ def createRasterBoundaryAndFootprints(fgdb_path, target_path, project_ID, projec
         #arcpy.Clip_analysis(one_meter_buffer, raster_boundary, raster_footprint)
         #arcpy.Delete_management(one_meter_buffer)
         #deleteFields(raster_footprint)
+
+        createRasterTileStatsTable(fgdb_path, target_path, elev_type)
             
     return raster_footprint, raster_boundary
             
@@ -56,7 +56,7 @@ from ngce.las import LAS
 from ngce.pmdm.a import A04_C_ConsolidateLASInfo, A05_A_RemoveDEMErrantValues, A05_C_ConsolidateRasterInfo, \
     A04_A_GenerateQALasDataset
 from ngce.pmdm.a.A04_B_CreateLASStats import doTime
-from ngce.raster import Raster, RasterConfig
+from ngce.raster import Raster, RasterConfig, MosaicStats, Overviews, HeightModels
 from ngce.raster.RasterConfig import PROJECT_SOURCE_LAS, MOSAIC_Z_TOLERANCE
 
 PARTITION_COUNT = 500
@@ -246,25 +246,37 @@ def generateOverviews(target_path, md_name, md_path, count_rasters, spatial_ref,
     A05_C_ConsolidateRasterInfo.deleteFileIfExists(mosaic_dataset_overview_path, True)
     arcpy.AddMessage("Mosaic Dataset Overview Folder: {0}".format(mosaic_dataset_overview_path))
 
-    # Define how Overviews will be created and sets
-    # the location of Mosaic Dataset overview TIFF files
-    #     pixel size of the first level overview is cellsizeOVR
-    #     overview_factor="2"
-    #     force_overview_tiles="FORCE_OVERVIEW_TILES"
-    #     compression_method="LZW"
-    #     20180507 EI: Added the template dataset using the las dataset boundary to constrain overview generation to fix issues with .las file invalid projections
-    arcpy.DefineOverviews_management(md_path, mosaic_dataset_overview_path, in_template_dataset=boundary_fc_path, extent="#", pixel_size=cellsizeOVR,
-                                     number_of_levels="#", tile_rows="5120", tile_cols="5120", overview_factor="2", force_overview_tiles="FORCE_OVERVIEW_TILES",
-                                     resampling_method="BILINEAR", compression_method="LZ77", compression_quality="100")
-    Utility.addToolMessages()
+    overview_where_clause = "TypeID = 2"
+    is_built = False
+    if RasterConfig.OVERVIEW_PARALLEL:
+        try:
+            Overviews.buildOverviews(md_path, mosaic_dataset_overview_path, cellsizeOVR, spatial_ref, boundary_fc_path, RasterConfig.RASTER_COMPRESSION_ENV)
+            overview_where_clause = Overviews.OVERVIEW_WHERE_CLAUSE
+            is_built = True
+        except:
+            arcpy.AddWarning("Failed to build overviews in parallel, using DefineOverviews/BuildOverviews: {}".format(md_path))
+            Overviews.removeOverviews(md_path)
+
+    if not is_built:
+        # Define how Overviews will be created and sets
+        # the location of Mosaic Dataset overview TIFF files
+        #     pixel size of the first level overview is cellsizeOVR
+        #     overview_factor="2"
+        #     force_overview_tiles="FORCE_OVERVIEW_TILES"
+        #     compression_method="LZW"
+        #     20180507 EI: Added the template dataset using the las dataset boundary to constrain overview generation to fix issues with .las file invalid projections
+        arcpy.DefineOverviews_management(md_path, mosaic_dataset_overview_path, in_template_dataset=boundary_fc_path, extent="#", pixel_size=cellsizeOVR,
+                                         number_of_levels="#", tile_rows="5120", tile_cols="5120", overview_factor="2", force_overview_tiles="FORCE_OVERVIEW_TILES",
+                                         resampling_method="BILINEAR", compression_method=RasterConfig.RASTER_COMPRESSION, compression_quality="100")
+        Utility.addToolMessages()
 
 
 
-    # Build Overviews as defined in the previous step
-    #    define_missing_tiles="NO_DEFINE_MISSING_TILES"
-    arcpy.BuildOverviews_management(md_path, where_clause="#", define_missing_tiles="NO_DEFINE_MISSING_TILES", generate_overviews="GENERATE_OVERVIEWS", generate_missing_images="GENERATE_MISSING_IMAGES",
-                                    regenerate_stale_images="REGENERATE_STALE_IMAGES")
-    Utility.addToolMessages()
+        # Build Overviews as defined in the previous step
+        #    define_missing_tiles="NO_DEFINE_MISSING_TILES"
+        arcpy.BuildOverviews_management(md_path, where_clause="#", define_missing_tiles="NO_DEFINE_MISSING_TILES", generate_overviews="GENERATE_OVERVIEWS", generate_missing_images="GENERATE_MISSING_IMAGES",
+                                        regenerate_stale_images="REGENERATE_STALE_IMAGES")
+        Utility.addToolMessages()
 
 
 #     workspace = arcpy.env.workspace  # @UndefinedVariable
@@ -283,7 +295,7 @@ def generateOverviews(target_path, md_name, md_path, count_rasters, spatial_ref,
 #     Utility.addToolMessages()
 
     arcpy.AddMessage("Building statistics on overviews: {0}".format(md_path))
-    overview_layer = arcpy.MakeMosaicLayer_management(in_mosaic_dataset=md_path, out_mosaic_layer="{}_MosaicLayer".format(md_name), where_clause="TypeID = 2")
+    overview_layer = arcpy.MakeMosaicLayer_management(in_mosaic_dataset=md_path, out_mosaic_layer="{}_MosaicLayer".format(md_name), where_clause=overview_where_clause)
     arcpy.BuildPyramidsandStatistics_management(overview_layer, include_subdirectories="INCLUDE_SUBDIRECTORIES", build_pyramids="NONE", calculate_statistics="CALCULATE_STATISTICS", BUILD_ON_SOURCE="NONE",
                                                 block_field="#", estimate_statistics="NONE",
                                                 x_skip_factor=SKIP_FACTOR_LRG, y_skip_factor=SKIP_FACTOR_LRG, ignore_values="#", pyramid_level="-1", SKIP_FIRST="NONE", resample_technique="BILINEAR",
@@ -568,17 +580,20 @@ def importMosaicDatasetGeometries(md_path, footprint_path, boundary_path):
         Utility.addToolMessages()
 
 
-def calculateMosaicDatasetStatistics(raster_z_min, raster_z_max, md_path, raster_v_unit = None, area_of_interest = None):
+def calculateMosaicDatasetStatistics(raster_z_min, raster_z_max, md_path, raster_v_unit = None, area_of_interest = None, target_path = None, elev_type = None):
+    z_factor = 1.0
     if raster_v_unit is not None:
         raster_v_unit = str(raster_v_unit).upper()
         #arcpy.AddMessage("Raster vertical unit is {}. Checking to see if it needs to be converted...".format(raster_v_unit))
         if ("FEET" in raster_v_unit) or ("FOOT" in raster_v_unit) or ("FT" in raster_v_unit):
             if ("US" in raster_v_unit) or ("SURVEY" in raster_v_unit):
                 arcpy.AddMessage("Raster vertical unit is {}, adding conversion function for US Feet.".format(raster_v_unit))
+                z_factor = 1200.0 / 3937.0
                 raster_z_min = raster_z_min * 1200 / 3937
                 raster_z_max = raster_z_max * 1200 / 3937
             else:
                 arcpy.AddMessage("Raster vertical unit is {}, adding conversion function for International Feet.".format(raster_v_unit))
+                z_factor = 0.3048
                 raster_z_min = raster_z_min * 0.3048
                 raster_z_max = raster_z_max * 0.3048
         else:
@@ -586,6 +601,18 @@ def calculateMosaicDatasetStatistics(raster_z_min, raster_z_max, md_path, raster
     else:
         arcpy.AddMessage("Raster vertical unit is not provided, no need for conversion.")
 
+    # Merge the tile statistics from A05 instead of reading the pixels again
+    if target_path is not None and elev_type is not None:
+        a = datetime.now()
+        mosaic_stats = MosaicStats.getMosaicStats(target_path, elev_type)
+        if mosaic_stats is None:
+            arcpy.AddMessage("Tile statistics are not complete for {}, statistics will be calculated from the pixels if needed".format(elev_type))
+        else:
+            statistics = MosaicStats.getStatisticsString(mosaic_stats, z_factor)
+            arcpy.SetRasterProperties_management(md_path, statistics=statistics)
+            Utility.addToolMessages()
+            doTime(a, "Set statistics '{}' merged from {} valid pixels in the {} tiles".format(statistics, mosaic_stats[MosaicStats.COUNT], elev_type))
+
     full_calc = False
     minResult = arcpy.GetRasterProperties_management(md_path, property_type="MINIMUM", band_index="Band_1")
     Utility.addToolMessages()
@@ -711,6 +738,16 @@ def createHeightRefMD(imageDir, publish_folder, md_paths, SpatRefMD, raster_v_un
 
     if arcpy.Exists(dhm_md_path):
         arcpy.AddMessage("Height Model already exists. {}".format(dhm_md_path))
+    elif RasterConfig.HEIGHT_MATERIALIZE:
+        # DHM is DSM - DTM, DCM is DSM - DLM
+        lower_type = DTM if imageDir == DHM else DLM
+        height_folder = os.path.join(publish_folder.path, imageDir)
+        height_tiles = HeightModels.createHeightRasters(os.path.join(publish_folder.path, DSM), os.path.join(publish_folder.path, lower_type), height_folder)
+        if len(height_tiles) <= 0:
+            arcpy.AddWarning("No {} tiles created, using the height raster function instead.".format(imageDir))
+            createReferenceddMosaicDataset(md_paths[DSM], dhm_md_path, SpatRefMD, raster_v_unit, area_of_interest=area_of_interest)
+        else:
+            createMosaicDatasetAndAddRasters(raster_v_unit, publish_folder.path, filegdb_name, height_folder, md_name, dhm_md_path, SpatRefMD, None, area_of_interest=area_of_interest)
     else:
         createReferenceddMosaicDataset(md_paths[DSM], dhm_md_path, SpatRefMD, raster_v_unit, area_of_interest=area_of_interest)
 
@@ -857,9 +894,9 @@ def processJob(project_job, project, ProjectUID, dateDeliver, dateStart, dateEnd
                         Utility.addToolMessages()
 
                     if fix is None:
-                        calculateMosaicDatasetStatistics(raster_z_min, raster_z_max, md_path, raster_v_unit, area_of_interest=lasd_boundary_path)
+                        calculateMosaicDatasetStatistics(raster_z_min, raster_z_max, md_path, raster_v_unit, area_of_interest=lasd_boundary_path, target_path=ProjectFolder.derived.path, elev_type=el_type)
                     else:
-                        calculateMosaicDatasetStatistics(raster_z_min, raster_z_max, md_path, area_of_interest=lasd_boundary_path)
+                        calculateMosaicDatasetStatistics(raster_z_min, raster_z_max, md_path, area_of_interest=lasd_boundary_path, target_path=ProjectFolder.derived.path, elev_type=el_type)
 
                     # Import the boundary here for stats calcs
                     importMosaicDatasetGeometries(md_path, None, raster_boundary)
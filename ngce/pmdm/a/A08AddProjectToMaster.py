@@ -34,12 +34,27 @@ from ngce.Utility import doTime
 from ngce.cmdr import CMDRConfig
 from ngce.cmdr.JobUtil import getProjectFromWMXJobID
 from ngce.folders import ProjectFolders, FoldersConfig
+from ngce.raster import RasterConfig, Overviews
 
 
 # arcpy.env.parallelProcessingFactor = "0"
 def DefineBuildOverviews (cellsizeOVR, MasterMD, MasterMD_overview_path, AreaToBuildOVR):
     arcpy.AddMessage("\nCell size of First level Overview:  {0}".format(cellsizeOVR))
     
+    if RasterConfig.OVERVIEW_PARALLEL:
+        # Only re-render the overview tiles under the project whose source changed (and their ancestors),
+        # the tile grid and the tile manifest are shared with the other projects
+        spatial_ref = arcpy.Describe(MasterMD).spatialReference
+        area_to_build = AreaToBuildOVR
+        if area_to_build is not None and arcpy.Describe(area_to_build).dataType == "MosaicDataset":
+            area_to_build = "in_memory/OverviewBoundary"
+            Utility.deleteFileIfExists(area_to_build, True)
+            arcpy.ExportMosaicDatasetGeometry_management(AreaToBuildOVR, area_to_build, where_clause="#", geometry_type="BOUNDARY")
+        Overviews.buildOverviews(MasterMD, MasterMD_overview_path, cellsizeOVR, spatial_ref, area_to_build, compression=RasterConfig.RASTER_COMPRESSION_ENV, use_manifest=True)
+        result = arcpy.GetCount_management(MasterMD)
+        arcpy.AddMessage("After Building Overviews Master Mosaic Dataset: {0} has {1} row(s).".format(MasterMD, int(result.getOutput(0))))
+        return
+
     # Define overviews
     # pixel size of the first level overview is cellsizeOVR
     # in_template_dataset=AreaToBuildOVR (this can be just the extent of the project, but
@@ -273,6 +288,12 @@ def processJob(ProjectJob, project, ProjectUID, masterParentDir, masterService):
                             #see what happens without overviews...
                             #DefineBuildOverviews(cellsizeOVR, master_md_path, MasterMD_overview_path, projectMD_path)
                         ## 20180505 EIronside: Removed overview generation because they were taking a long time and things seem to work ok without them.
+
+                            if RasterConfig.OVERVIEW_PARALLEL:
+                                # Incremental refresh, only the overview tiles under this project are rebuilt
+                                MasterMD_overview_path = "{}.Overviews".format(master_md_path[:master_md_path.rfind(".gdb")])
+                                arcpy.AddMessage("Mosaic Dataset Overview Location: {0}".format(MasterMD_overview_path))
+                                DefineBuildOverviews(RasterConfig.MASTER_OVERVIEW_CELLSIZE, master_md_path, MasterMD_overview_path, projectMD_path)
                             
                             arcpy.Compact_management(in_workspace=os.path.dirname(master_md_path))
 
@@ -1,9 +1,10 @@
 import arcpy
 from arcpy.sa import Functions
-from datetime import datetime
+from datetime import datetime, timedelta
 from functools import partial
 from multiprocessing import Pool, cpu_count
 import os
+import shutil
 import sys
 import time
 
@@ -12,9 +13,12 @@ from ngce import Utility
 from ngce.cmdr.CMDR import ProjectJob
 from ngce.cmdr.CMDRConfig import OCS
 from ngce.cmdr.JobUtil import getProjectFromWMXJobID
+from ngce.contour import ContourEngine, SpotHeights, TileManifest
 from ngce.contour.ContourConfig import CONTOUR_GDB_NAME, WEB_AUX_SPHERE, \
     CONTOUR_INTERVAL, CONTOUR_UNIT, CONTOUR_SMOOTH_UNIT, \
-    DISTANCE_TO_CLIP_MOSAIC_DATASET, DISTANCE_TO_CLIP_CONTOURS, SKIP_FACTOR, CONTOUR_NAME_OCS, CONTOUR_NAME_WM
+    DISTANCE_TO_CLIP_MOSAIC_DATASET, DISTANCE_TO_CLIP_CONTOURS, SKIP_FACTOR, CONTOUR_NAME_OCS, CONTOUR_NAME_WM, \
+    CONTOUR_NUMPY_ENGINE, CONTOUR_STITCH, CONTOUR_SIMPLIFY_UNIT, CONTOUR_STITCH_HALO, CONTOUR_SPOT_HEIGHTS, \
+    CONTOUR_SPOT_HALO, CONTOUR_SPOT_MIN_CELLS, CONTOUR_VERIFY_CHECKSUM
 from ngce.folders import ProjectFolders
 from ngce.folders.FoldersConfig import DTM
 from ngce.pmdm.a import A05_C_ConsolidateRasterInfo
@@ -24,24 +28,123 @@ from ngce.raster import Raster
 
 CPU_HANDICAP = 1
 TRIES_ALLOWED = 10
-
-def generateHighLow(workspace, name, clip_contours, ref_md):
-    cont_poly1 = os.path.join(workspace, 'O12_poly_' + name + '.shp')
-    cont_poly2 = os.path.join(workspace, 'O13_poly_' + name + '.shp')
-    arcpy.FeatureToPolygon_management(in_features=clip_contours, out_feature_class=cont_poly1, cluster_tolerance="", attributes="ATTRIBUTES", label_features="")
-    arcpy.MultipartToSinglepart_management(in_features=cont_poly1, out_feature_class=cont_poly2)
-    select_set = []
-    with arcpy.da.UpdateCursor(cont_poly2, ["FID", "SHAPE@"]) as cursor:  # @UndefinedVariable
-        for row in cursor:
-            parts = row[1].partCount
-            boundaries = row[1].boundary().partCount
-            if boundaries > parts:
-                select_set.append(row[0])
-    
-    cont_poly3 = 'O13_poly_' + name + '_layer'
-    arcpy.MakeFeatureLayer_management(in_features=cont_poly2, out_layer=cont_poly3, where_clause='"FID" IN(' + ','.join(select_set) + ')', workspace="", field_info="")
-    arcpy.DeleteFeatures_management(cont_poly3)
-    arcpy.AddSurfaceInformation_3d(in_feature_class=cont_poly2, in_surface=ref_md, out_property="Z_MEAN", method="BILINEAR")
+STITCH = CONTOUR_NUMPY_ENGINE and CONTOUR_STITCH
+
+'''
+--------------------------------------------------------------------------------
+Hash of the parameters the tile contours are made with, tiles in the
+TileManifest with a different hash are re-created
+--------------------------------------------------------------------------------
+'''
+def getParameterHash(cont_int=CONTOUR_INTERVAL, smooth_tol=CONTOUR_SMOOTH_UNIT):
+    return TileManifest.getParameterHash([cont_int, CONTOUR_UNIT, smooth_tol, CONTOUR_SIMPLIFY_UNIT, CONTOUR_NUMPY_ENGINE,
+                                          STITCH, CONTOUR_STITCH_HALO, DISTANCE_TO_CLIP_MOSAIC_DATASET, DISTANCE_TO_CLIP_CONTOURS,
+                                          CONTOUR_SPOT_HEIGHTS, CONTOUR_SPOT_HALO, CONTOUR_SPOT_MIN_CELLS])
+
+
+def getTileContourPath(scratch_dir, f_name, projected=False):
+    if projected:
+        return os.path.join(scratch_dir, 'O11_ClipCont_' + f_name + '_WM.shp')
+    return os.path.join(scratch_dir, 'O11_ClipCont_' + f_name + '.shp')
+
+
+def getWebMercator():
+    spatial_ref = arcpy.SpatialReference()
+    spatial_ref.loadFromString(WEB_AUX_SPHERE)
+    return spatial_ref
+
+
+'''
+--------------------------------------------------------------------------------
+Returns the output files of a tile, the files of its TileManifest record
+--------------------------------------------------------------------------------
+'''
+def getTileOutputPaths(scratch_dir, name):
+    clip_contours = getTileContourPath(scratch_dir, name)
+    out_paths = [clip_contours, os.path.splitext(clip_contours)[0] + '.dbf', getTileContourPath(scratch_dir, name, True)]
+    if STITCH:
+        out_paths = [ContourEngine.getTileLinesPath(scratch_dir, name)] + out_paths
+    return out_paths
+
+
+'''
+--------------------------------------------------------------------------------
+Returns {name: feature_count} of the tiles finished with the current parameters.
+With verify, only the tiles whose outputs exist and match their file stats
+(their checksum with CONTOUR_VERIFY_CHECKSUM).
+--------------------------------------------------------------------------------
+'''
+def getCompletedTiles(scratch_dir, parameter_hash=None, verify=False):
+    if parameter_hash is None:
+        parameter_hash = getParameterHash()
+    manifest_path = TileManifest.getManifestPath(scratch_dir)
+    if verify:
+        return TileManifest.getVerified(manifest_path, TileManifest.CONTOUR, parameter_hash, partial(getTileOutputPaths, scratch_dir), CONTOUR_VERIFY_CHECKSUM)
+    return TileManifest.getCompleted(manifest_path, TileManifest.CONTOUR, parameter_hash)
+
+
+'''
+--------------------------------------------------------------------------------
+Records a finished tile in the TileManifest
+--------------------------------------------------------------------------------
+'''
+def setTileCompleted(scratch_dir, name, feature_count, parameter_hash):
+    TileManifest.setFilesCompleted(TileManifest.getManifestPath(scratch_dir), TileManifest.CONTOUR, name, feature_count,
+                                   getTileOutputPaths(scratch_dir, name), parameter_hash)
+
+
+def removeTileOutputs(scratch_dir, name):
+    for out_path in getTileOutputPaths(scratch_dir, name):
+        deleteFileIfExists(out_path, True)
+
+
+'''
+--------------------------------------------------------------------------------
+Deletes the outputs and workspace of the tiles made with other parameters
+--------------------------------------------------------------------------------
+'''
+def removeStaleTiles(scratch_dir, parameter_hash):
+    records = TileManifest.getRecords(TileManifest.getManifestPath(scratch_dir), TileManifest.CONTOUR)
+    for name, record in records.iteritems():
+        if record[1] <> parameter_hash:
+            arcpy.AddMessage("PROCESS (Parameters changed): " + name)
+            removeTileOutputs(scratch_dir, name)
+            deleteFileIfExists(SpotHeights.getSpotHeightsPath(scratch_dir, name), True)
+            shutil.rmtree(os.path.join(scratch_dir, name), True)
+
+
+'''
+--------------------------------------------------------------------------------
+Deletes the outputs of the tiles whose outputs are missing or don't match the
+TileManifest record, so they're re-created instead of skipped.
+Returns {name: feature_count} of the verified tiles
+--------------------------------------------------------------------------------
+'''
+def removeUnverifiedTiles(scratch_dir, parameter_hash=None):
+    completed = getCompletedTiles(scratch_dir, parameter_hash)
+    verified = getCompletedTiles(scratch_dir, parameter_hash, True)
+    for name in sorted(completed.keys()):
+        if name not in verified:
+            arcpy.AddMessage("PROCESS (Outputs changed): " + name)
+            removeTileOutputs(scratch_dir, name)
+    return verified
+
+'''
+--------------------------------------------------------------------------------
+Writes the HIGH/LOW spot heights (with Z_MEAN) of the tile to
+O12_Spots_<name>.shp, found on the DTM block of the tile (see SpotHeights)
+--------------------------------------------------------------------------------
+'''
+def generateHighLow(workspace, name, md, buff_poly, clip_poly, cont_int):
+    spots_path = SpotHeights.getSpotHeightsPath(workspace, name)
+    if CONTOUR_SPOT_HEIGHTS and not os.path.exists(spots_path):
+        try:
+            SpotHeights.createSpotHeights(md, buff_poly.extent, clip_poly, cont_int, spots_path, name)
+        except:
+            # Don't leave a partial output, it would be skipped on the next try
+            deleteFileIfExists(spots_path, True)
+            raise
+    return spots_path
 
 def generate_con_workspace(con_folder):
 
@@ -103,10 +206,15 @@ def create_iterable(scratch_folder, prints, distance_to_clip_md, distance_to_cli
     arcpy.AddMessage('Create Multiprocessing Iterable')
 
     ext_dict = {}
+    costs = {}
+    completed = removeUnverifiedTiles(scratch_folder)
     # Go up one directory so we don't have to delete if things go wrong down in scratch
     tmp_scratch_folder = os.path.split(scratch_folder)[0]
     tmp_buff_name = os.path.join(tmp_scratch_folder, "footprints_clip_md.shp")
-    if not os.path.exists(tmp_buff_name):
+    if distance_to_clip_md <= 0:
+        # Stitching, process the footprints as is
+        tmp_buff_name = prints
+    elif not os.path.exists(tmp_buff_name):
         arcpy.Buffer_analysis(
             prints,
             tmp_buff_name,
@@ -127,14 +235,18 @@ def create_iterable(scratch_folder, prints, distance_to_clip_md, distance_to_cli
             rowname = row[0]
             geom = row[1]
             zran = row[2]
-            if zran > 0 and isProcessFile(rowname, scratch_folder):
+            if zran > 0 and isProcessFile(rowname, scratch_folder, completed):
                 box = geom.extent.polygon
     
                 row_info.append(box)
                 ext_dict[rowname] = row_info
+                # Estimated cost, the contour length grows with the area and the elevation range
+                costs[rowname] = geom.area * zran
         
     tmp_buff_name2 = os.path.join(tmp_scratch_folder, "footprints_clip_cont.shp")
-    if not os.path.exists(tmp_buff_name2):
+    if distance_to_clip_contours <= 0:
+        tmp_buff_name2 = prints
+    elif not os.path.exists(tmp_buff_name2):
         arcpy.Buffer_analysis(
             prints,
             tmp_buff_name2,
@@ -152,14 +264,16 @@ def create_iterable(scratch_folder, prints, distance_to_clip_md, distance_to_cli
             rowname = row[0]
             geom = row[1]
             zran = row[2]
-            if zran > 0 and isProcessFile(rowname, scratch_folder):
+            if zran > 0 and isProcessFile(rowname, scratch_folder, completed):
                 row_info = ext_dict[rowname]
                 row_info.append(geom)
                 ext_dict[rowname] = row_info
     
-    for index, item in enumerate(ext_dict.items()):
-        row = item[1]
+    # Index the tiles from the most expensive, row is [box, clip_poly, index, cost]
+    for index, rowname in enumerate(sorted(ext_dict.keys(), key=lambda rowname: costs[rowname], reverse=True)):
+        row = ext_dict[rowname]
         row.append(index)
+        row.append(costs[rowname])
         
     
     arcpy.AddMessage('Multiprocessing Tasks: ' + str(len(ext_dict)))
@@ -327,95 +441,100 @@ def generate_contour(md, cont_int, contUnits, rasterUnits, smooth_tol, scratch_p
             
             
             arcpy.AddMessage("\t{}: Referenced Mosaic found '{}'".format(name, focal2_path))
-            base_name = 'O08_BaseCont_' + name + '.shp'
-            base_contours = os.path.join(workspace, base_name)
-            if not os.path.exists(base_contours):
-                arcpy.MakeRasterLayer_management(in_raster=focal2_path, out_rasterlayer=base_name)
-                Functions.Contour(
-                    base_name,
-                    base_contours,
-                    int(cont_int)
-                )
-                a = doTime(a, '\t' + name + ' ' + index + ': Contoured to ' + base_contours)
-        
-            simple_contours = os.path.join(workspace, 'O09_SimpleCont_' + name + '.shp')
-            if not os.path.exists(simple_contours):
-                ca.SimplifyLine(
-                    base_contours,
-                    simple_contours,
-                    "POINT_REMOVE",
-                    "0.000001 DecimalDegrees",
-                    "FLAG_ERRORS",
-                    "NO_KEEP",
-                    "NO_CHECK"
-                )
-                a = doTime(a, '\t' + name + ' ' + index + ': Simplified to ' + simple_contours)
-            
-            smooth_contours = os.path.join(workspace, 'O10_SmoothCont_' + name + '.shp')
-            if not os.path.exists(smooth_contours):
-                ca.SmoothLine(
-                    simple_contours,
-                    smooth_contours,
-                    "PAEK",
-                    "{} DecimalDegrees".format(smooth_tol),
-                    "",
-                    "NO_CHECK"
-                )
-                a = doTime(a, '\t' + name + ' ' + index + ': Smoothed to ' + smooth_contours)
-            
             # put this up one level to avoid re-processing all of above if something goes wrong below
             clip_workspace = os.path.split(workspace)[0]
-            clip_contours = os.path.join(clip_workspace, 'O11_ClipCont_' + name + '.shp')
-            if not os.path.exists(clip_contours):
-                arcpy.Clip_analysis(
-                    in_features=smooth_contours,
-                    clip_features=clip_poly,
-                    out_feature_class=clip_contours
-                )
-                a = doTime(a, '\t' + name + ' ' + index + ': Clipped to ' + clip_contours)
+            parameter_hash = getParameterHash(cont_int, smooth_tol)
+            if STITCH:
+                # Lines inside the footprint are written to the tile contours, only the lines cut on the
+                # seams are saved raw to be stitched in handle_results
+                lines_path = ContourEngine.getTileLinesPath(clip_workspace, name)
+                clip_contours = getTileContourPath(clip_workspace, name)
+                wm_contours = getTileContourPath(clip_workspace, name, True)
+                if os.path.exists(lines_path) and arcpy.Exists(clip_contours) and arcpy.Exists(wm_contours):
+                    count = int(arcpy.GetCount_management(clip_contours).getOutput(0)) + len(ContourEngine.loadTileLines(lines_path))
+                else:
+                    # Don't mix a partial output with a new one
+                    removeTileOutputs(clip_workspace, name)
+                    count = ContourEngine.createTileLines(md, clip_poly, cont_int, lines_path, clip_contours, name, CONTOUR_UNIT, smooth_tol,
+                                                          projected_path=wm_contours, projected_ref=getWebMercator())
+                generateHighLow(clip_workspace, name, md, buff_poly, clip_poly, cont_int)
+                setTileCompleted(clip_workspace, name, count, parameter_hash)
+                doTime(aa, 'FINISHED ' + name + ' ' + index)
+                created = True
+                continue
             
-            arcpy.RepairGeometry_management(in_features=clip_contours,
-                                            delete_null="DELETE_NULL")
+            clip_contours = getTileContourPath(clip_workspace, name)
+            # Projected as the tile is written, so the merge only has to append
+            wm_contours = getTileContourPath(clip_workspace, name, True)
+            count = None
+            if CONTOUR_NUMPY_ENGINE and not os.path.exists(clip_contours):
+                try:
+                    count = ContourEngine.createContours(md, buff_poly.extent, clip_poly, cont_int, clip_contours, name, CONTOUR_UNIT, smooth_tol,
+                                                         projected_path=wm_contours, projected_ref=getWebMercator())
+                    a = doTime(a, '\t' + name + ' ' + index + ': Contoured to ' + clip_contours)
+                except Exception as e:
+                    arcpy.AddWarning('\t{}: Contour engine failed, using the contour tools: {}'.format(name, e))
+                    deleteFileIfExists(clip_contours, True)
+                    deleteFileIfExists(wm_contours, True)
+
+            if not os.path.exists(clip_contours):
+                base_name = 'O08_BaseCont_' + name + '.shp'
+                base_contours = os.path.join(workspace, base_name)
+                if not os.path.exists(base_contours):
+                    arcpy.MakeRasterLayer_management(in_raster=focal2_path, out_rasterlayer=base_name)
+                    Functions.Contour(
+                        base_name,
+                        base_contours,
+                        int(cont_int)
+                    )
+                    a = doTime(a, '\t' + name + ' ' + index + ': Contoured to ' + base_contours)
+        
+                simple_contours = os.path.join(workspace, 'O09_SimpleCont_' + name + '.shp')
+                if not os.path.exists(simple_contours):
+                    ca.SimplifyLine(
+                        base_contours,
+                        simple_contours,
+                        "POINT_REMOVE",
+                        "0.000001 DecimalDegrees",
+                        "FLAG_ERRORS",
+                        "NO_KEEP",
+                        "NO_CHECK"
+                    )
+                    a = doTime(a, '\t' + name + ' ' + index + ': Simplified to ' + simple_contours)
             
-            Utility.addAndCalcFieldLong(dataset_path=clip_contours,
-                                        field_name="CTYPE",
-                                        field_value="getType( !CONTOUR! )",
-                                        code_block="def getType(contour):\n\n   type = 2\n\n   if contour%10 == 0:\n\n      type = 10\n\n   if contour%20 == 0:\n\n      type = 20\n\n   if contour%50 == 0:\n      type = 50\n   if contour%100 == 0:\n      type = 100\n   if contour%500 == 0:\n      type = 500\n   if contour%1000 == 0:\n      type = 1000\n   if contour%5000 == 0:\n      type = 5000\n   return type",
-                                        add_index=False)
+                smooth_contours = os.path.join(workspace, 'O10_SmoothCont_' + name + '.shp')
+                if not os.path.exists(smooth_contours):
+                    ca.SmoothLine(
+                        simple_contours,
+                        smooth_contours,
+                        "PAEK",
+                        "{} DecimalDegrees".format(smooth_tol),
+                        "",
+                        "NO_CHECK"
+                    )
+                    a = doTime(a, '\t' + name + ' ' + index + ': Smoothed to ' + smooth_contours)
             
-            Utility.addAndCalcFieldLong(dataset_path=clip_contours,
-                                        field_name="INDEX",
-                                        field_value="getType( !CONTOUR! )",
-                                        code_block="def getType(contour):\n\n   type = 0\n\n   if contour%" + str(int(cont_int * 5)) + " == 0:\n\n      type = 1\n   return type",
-                                        add_index=False)
-    #             Utility.addAndCalcFieldText(dataset_path=clip_contours, 
-    #                                         field_name="LastMergedFC",
-    #                                         field_length=100,
-    #                                         field_value=name,
-    #                                         add_index=False)
-    #             Utility.addAndCalcFieldText(dataset_path=clip_contours, 
-    #                                         field_name="ValidationCheck",
-    #                                         field_length=100,
-    #                                         field_value='"'+name+'"',
-    #                                         add_index=False)
-            Utility.addAndCalcFieldText(dataset_path=clip_contours,
-                                        field_name="UNITS",
-                                        field_length=20,
-                                        field_value='"' + CONTOUR_UNIT + '"',
-                                        add_index=False)
-            Utility.addAndCalcFieldText(dataset_path=clip_contours,
-                                        field_name="name",
-                                        field_length=79,
-                                        field_value='"' + name + '"',
-                                        add_index=False)
-            a = doTime(a, '\t' + name + ' ' + index + ': Added fields to ' + clip_contours)
+                tool_contours = os.path.join(workspace, 'O11_ClipCont_' + name + '.shp')
+                if not os.path.exists(tool_contours):
+                    arcpy.Clip_analysis(
+                        in_features=smooth_contours,
+                        clip_features=clip_poly,
+                        out_feature_class=tool_contours
+                    )
+                    a = doTime(a, '\t' + name + ' ' + index + ': Clipped to ' + tool_contours)
+                    arcpy.RepairGeometry_management(in_features=tool_contours,
+                                                    delete_null="DELETE_NULL")
                 
-            try:
-                arcpy.DeleteField_management(in_table=clip_contours, drop_field="ID;InLine_FID;SimLnFlag;MaxSimpTol;MinSimpTol")
-                a = doTime(a, '\t' + name + ' ' + index + ': Deleted fields from ' + clip_contours)
-            except:
-                pass
+                deleteFileIfExists(wm_contours, True)
+                count = ContourEngine.copyContours(tool_contours, clip_contours, name, cont_int, CONTOUR_UNIT, wm_contours, getWebMercator())
+                a = doTime(a, '\t' + name + ' ' + index + ': Copied with contour fields to ' + clip_contours)
             
+            if count is None:
+                count = int(arcpy.GetCount_management(clip_contours).getOutput(0))
+            if not os.path.exists(wm_contours):
+                arcpy.Project_management(clip_contours, wm_contours, WEB_AUX_SPHERE)
+            generateHighLow(clip_workspace, name, md, buff_poly, clip_poly, cont_int)
+            setTileCompleted(clip_workspace, name, count, parameter_hash)
             doTime(aa, 'FINISHED ' + name + ' ' + index)
             created = True
 
@@ -430,95 +549,151 @@ def generate_contour(md, cont_int, contUnits, rasterUnits, smooth_tol, scratch_p
         arcpy.CheckInExtension("Spatial")
     except:
         pass
+    
+    return name, created
 
 
-def handle_results(scratch_dir, contour_dir):
+def isMerged(scratch_dir, parameter_hash, merge_name, project_name):
+    completed = TileManifest.getCompleted(TileManifest.getManifestPath(scratch_dir), TileManifest.MERGE, parameter_hash)
+    return CONTOUR_NAME_OCS in completed and arcpy.Exists(merge_name) and arcpy.Exists(project_name)
 
-    output_folders = os.listdir(scratch_dir)
 
-    merge_list = []
+def appendTile(appenders, scratch_dir, name):
+    appenders[0].append(getTileContourPath(scratch_dir, name))
+    appenders[1].append(getTileContourPath(scratch_dir, name, True))
 
-    for folder in output_folders:
-        cont = os.path.join(scratch_dir, 'O11_ClipCont_' + folder + '.shp')
-        if arcpy.Exists(cont):
-            merge_list.append(cont)
 
-    a = datetime.now()
+'''
+--------------------------------------------------------------------------------
+Starts the streaming merge of the tile contours into the OCS and WM outputs
+(when stitching, the tile contours without the seam lines). The tiles finished in an earlier run are appended
+right away, the rest as the workers finish them (see createTiledContours).
+Returns the [OCS, WM] appenders or None if the outputs are already merged
+--------------------------------------------------------------------------------
+'''
+def createMergeAppenders(scratch_dir, contour_dir, ref_md, parameter_hash):
     merge_name = os.path.join(contour_dir, CONTOUR_NAME_OCS)
     project_name = os.path.join(contour_dir, CONTOUR_NAME_WM)
-    if arcpy.Exists(merge_name):
-        arcpy.AddMessage("Merged OCS Contours exist: " + merge_name)
-    else:
-        # Delete the projected since they might have changed with the merge
-        deleteFileIfExists(project_name, True)
-        arcpy.Merge_management(merge_list, merge_name)
-        try:
-            arcpy.DeleteField_management(in_table=merge_name, drop_field="ID;InLine_FID;SimLnFlag;MaxSimpTol;MinSimpTol")
-        except:
-            pass
-        doTime(a, 'Merged ' + str(len(merge_list)) + ' Multiprocessing Results into ' + merge_name)
-    
-    
-    if arcpy.Exists(project_name):
-        arcpy.AddMessage("Projected Contours exist: " + project_name)
-    else:
-        arcpy.Project_management(
-            merge_name,
-            project_name,
-            WEB_AUX_SPHERE
-        )
-        try:
-            arcpy.DeleteField_management(in_table=merge_name, drop_field="ID;InLine_FID;SimLnFlag;MaxSimpTol;MinSimpTol")
-        except:
-            pass
-        doTime(a, 'Projected Multiprocessing Results to ' + project_name)
+    if isMerged(scratch_dir, parameter_hash, merge_name, project_name):
+        return None
 
-def isProcessFile(f_name, scratch_dir):
+    # A merge that didn't finish can't be trusted, start over
+    deleteFileIfExists(merge_name, True)
+    deleteFileIfExists(project_name, True)
+    appenders = [ContourEngine.ContourAppender(merge_name, arcpy.Describe(ref_md).spatialReference),
+                 ContourEngine.ContourAppender(project_name, getWebMercator())]
+    for name in sorted(getCompletedTiles(scratch_dir, parameter_hash).keys()):
+        appendTile(appenders, scratch_dir, name)
+    return appenders
+
+
+def handle_results(scratch_dir, contour_dir, ref_md=None, cont_int=CONTOUR_INTERVAL, cont_unit=CONTOUR_UNIT, smooth_unit=CONTOUR_SMOOTH_UNIT, appenders=None):
+    a = datetime.now()
+    parameter_hash = getParameterHash(cont_int, smooth_unit)
+    merge_name = os.path.join(contour_dir, CONTOUR_NAME_OCS)
+    project_name = os.path.join(contour_dir, CONTOUR_NAME_WM)
+    if isMerged(scratch_dir, parameter_hash, merge_name, project_name):
+        arcpy.AddMessage("Merged OCS and WM Contours exist: {}, {}".format(merge_name, project_name))
+        return
+
+    # The tile contours were appended as the tiles finished
+    if appenders is None:
+        appenders = createMergeAppenders(scratch_dir, contour_dir, ref_md, parameter_hash)
+    if STITCH:
+        # Finished tiles from the manifest instead of probing the scratch folders, only the seam lines are held in memory
+        names = sorted(getCompletedTiles(scratch_dir, parameter_hash).keys())
+        ContourEngine.stitchContours([ContourEngine.getTileLinesPath(scratch_dir, name) for name in names], appenders,
+                                     arcpy.Describe(ref_md).spatialReference, cont_int, cont_unit, smooth_unit, projected_ref=getWebMercator())
+    for appender in appenders:
+        appender.flush()
+    doTime(a, 'Merged {} Multiprocessing Results into {} and {}'.format(len(appenders[0].appended), merge_name, project_name))
+
+    TileManifest.setCompleted(TileManifest.getManifestPath(scratch_dir), TileManifest.MERGE, CONTOUR_NAME_OCS,
+                              int(arcpy.GetCount_management(merge_name).getOutput(0)), None, parameter_hash)
+
+'''
+--------------------------------------------------------------------------------
+Returns True if the tile isn't in the TileManifest (finished with the current
+parameters). completed is the result of getCompletedTiles, it's read (verified) if None.
+--------------------------------------------------------------------------------
+'''
+def isProcessFile(f_name, scratch_dir, completed=None):
     process_file = False
     if f_name is not None:
-        cont = os.path.join(scratch_dir, 'O11_ClipCont_' + f_name + '.shp')
-        if not os.path.exists(cont):
-            arcpy.AddMessage("PROCESS (Missing): " + cont)
+        if completed is None:
+            completed = getCompletedTiles(scratch_dir, verify=True)
+        if f_name not in completed:
+            arcpy.AddMessage("PROCESS (Missing): " + getTileContourPath(scratch_dir, f_name))
             process_file = True
-        else:
-            try:
-                rows = [row for row in arcpy.da.SearchCursor(cont, "OID@")]  # @UndefinedVariable
-                rows = len(rows)
-                if rows <= 0:
-                    arcpy.AddMessage("PROCESS (0 Rows): " + cont)
-                    arcpy.Delete_management(cont)
-                    process_file = True
-            except:
-                arcpy.AddMessage("\tFailed to isProcess contour file: " + cont)
-                process_file = True
 
     return process_file
 
 
 
-def createTiledContours(ref_md, cont_int, cont_unit, raster_vertical_unit, smooth_unit, scratch_path, run_dict, run_again=True):
+def getTileCost(item):
+    return item[1][3]
+
+
+def logProgress(start, done_count, total_count, done_cost, total_cost):
+    elapsed = (datetime.now() - start).total_seconds()
+    eta = 0
+    if done_cost > 0:
+        eta = elapsed * (total_cost - done_cost) / done_cost
+    arcpy.AddMessage("Contoured {} of {} tiles ({:.1f}% of the estimated work), elapsed {}, ETA {}".format(
+        done_count, total_count, 100.0 * done_cost / max(total_cost, 1), timedelta(seconds=int(elapsed)), timedelta(seconds=int(eta))))
+
+
+'''
+--------------------------------------------------------------------------------
+Contours the tiles in run_dict across a process pool, most expensive first
+(footprint area x zran) so a big tile doesn't start last and hold up the run.
+Tiles are handed out one at a time from a single queue. Results are taken as
+they finish, appended to the merge (appenders) and logged with an ETA. Tiles without a completion record are run once more.
+--------------------------------------------------------------------------------
+'''
+def createTiledContours(ref_md, cont_int, cont_unit, raster_vertical_unit, smooth_unit, scratch_path, run_dict, run_again=True, appenders=None):
     arcpy.AddMessage("---- Creating Contours on {} -----".format(len(run_dict.items())))
+    start = datetime.now()
+    items = sorted(run_dict.items(), key=getTileCost, reverse=True)
+    costs = dict([[item[0], getTileCost(item)] for item in items])
+    total_cost = sum(costs.values())
+
     # Map Generate Contour Function to Footprints
-    pool = Pool(processes=cpu_count() - CPU_HANDICAP)
-    pool.map(
-        partial(
-            generate_contour,
-            ref_md,
-            cont_int,
-            cont_unit,
-            raster_vertical_unit,
-            smooth_unit,
-            scratch_path
-        ),
-        run_dict.items()
+    processes = max(1, cpu_count() - CPU_HANDICAP)
+    task = partial(
+        generate_contour,
+        ref_md,
+        cont_int,
+        cont_unit,
+        raster_vertical_unit,
+        smooth_unit,
+        scratch_path
     )
+    pool = Pool(processes=processes)
+    # One queue, largest first, one tile at a time so no result waits behind another queue
+    results = pool.imap_unordered(task, items, 1)
+    
+    # Merge the tiles as they finish, while the rest are still being contoured
+    done_count = 0
+    done_cost = 0
+    for name, created in results:
+        done_count = done_count + 1
+        done_cost = done_cost + costs[name]
+        if created and appenders is not None:
+            appendTile(appenders, scratch_path, name)
+        logProgress(start, done_count, len(items), done_cost, total_cost)
     pool.close()
     pool.join()
 
-    if run_again:
-        # run again to re-create missing tiles if one or more dropped
-        # @TODO: Figure out why we have to do this!!
-        createTiledContours(ref_md, cont_int, cont_unit, raster_vertical_unit, smooth_unit, scratch_path, run_dict, False)
+    # Only re-run the tiles that didn't record their completion
+    completed = getCompletedTiles(scratch_path, getParameterHash(cont_int, smooth_unit))
+    missing_dict = dict([item for item in items if item[0] not in completed])
+    if len(missing_dict) > 0:
+        if run_again:
+            arcpy.AddWarning("WARNING: Running {} dropped tiles again".format(len(missing_dict)))
+            createTiledContours(ref_md, cont_int, cont_unit, raster_vertical_unit, smooth_unit, scratch_path, missing_dict, False, appenders)
+        else:
+            arcpy.AddWarning("WARNING: Failed to create contours for {} tiles: {}".format(len(missing_dict), ", ".join(sorted(missing_dict.keys()))))
 
 def processJob(ProjectJob, project, ProjectUID):
     start = time.time()
@@ -529,6 +704,10 @@ def processJob(ProjectJob, project, ProjectUID):
     smooth_unit = CONTOUR_SMOOTH_UNIT
     distance_to_clip_md = DISTANCE_TO_CLIP_MOSAIC_DATASET
     distance_to_clip_contours = DISTANCE_TO_CLIP_CONTOURS
+    if STITCH:
+        # Tiles are stitched on the seams, no overlap needed
+        distance_to_clip_md = 0
+        distance_to_clip_contours = 0
     
     ProjectFolder = ProjectFolders.getProjectFolderFromDBRow(ProjectJob, project)
     derived_folder = ProjectFolder.derived.path
@@ -580,6 +759,7 @@ def processJob(ProjectJob, project, ProjectUID):
         # Generate Script Workspaces
         contour_gdb, scratch_path = generate_con_workspace(contour_folder)
         a = doTime(a, "Created Contour Workspace\n\t{}\n\t{}".format(contour_gdb, scratch_path))
+        removeStaleTiles(scratch_path, getParameterHash(cont_int, smooth_unit))
         
         # Create referenced DTM mosaic with the pixel pre-setup for contour output
         createRefDTMMosaic(md, ref_md, raster_vertical_unit)
@@ -594,10 +774,11 @@ def processJob(ProjectJob, project, ProjectUID):
 
     
     try:
-        createTiledContours(ref_md, cont_int, cont_unit, raster_vertical_unit, smooth_unit, scratch_path, run_dict)
+        appenders = createMergeAppenders(scratch_path, contour_gdb, ref_md, getParameterHash(cont_int, smooth_unit))
+        createTiledContours(ref_md, cont_int, cont_unit, raster_vertical_unit, smooth_unit, scratch_path, run_dict, appenders=appenders)
  
-        # Merge Contours
-        handle_results(scratch_path, contour_gdb)
+        # Finish the merge (or stitch) of the contours
+        handle_results(scratch_path, contour_gdb, ref_md, cont_int, cont_unit, smooth_unit, appenders)
 
     except Exception as e:
         arcpy.AddMessage('Exception Raised During Multiprocessing')
@@ -14,7 +14,7 @@ from ngce.Utility import doTime
 from ngce.cmdr.CMDR import ProjectJob
 from ngce.cmdr.CMDRConfig import DTM
 from ngce.cmdr.JobUtil import getProjectFromWMXJobID
-from ngce.contour import ContourConfig
+from ngce.contour import ContourConfig, TileManifest, TilingScheme
 from ngce.contour.ContourConfig import CONTOUR_GDB_NAME, CONTOUR_NAME_WM
 from ngce.folders import ProjectFolders
 from ngce.pmdm import RunUtil
@@ -37,39 +37,10 @@ def gen_base_tiling_scheme(base_fc, scratch):
         arcpy.AddMessage("Tiling Scheme Exists: {}".format(base_tiling_scheme))
     else:
         a = datetime.datetime.now()
-        # Copy Template MXD
-        base_mxd = arcpy.mapping.MapDocument(ContourConfig.MXD_TEMPLATE)
-        section_mxd_name = os.path.join(scratch, 'Tiling_Scheme.mxd')
-        if not os.path.exists(section_mxd_name):
-            base_mxd.saveACopy(section_mxd_name)
-    
-        # Set MXD For Processing
-        first_mxd = arcpy.mapping.MapDocument(section_mxd_name)
-    
-        # Set Layers to Reference Input FC
-        broken = arcpy.mapping.ListBrokenDataSources(first_mxd)
-        for item in broken:
-            if item.name.startswith(r'Contour'):
-                item.replaceDataSource(db, "FILEGDB_WORKSPACE", fc)
-        first_mxd.save()
-    
-        # Generate Tiling Scheme for Input MXD
-        
-        arcpy.MapServerCacheTilingSchemeToPolygons_cartography(
-            map_document=first_mxd.filePath,
-            data_frame='Layers',
-            tiling_scheme=ContourConfig.TILING_SCHEME,
-            output_feature_class=base_tiling_scheme,
-            use_map_extent='USE_MAP_EXTENT',
-            clip_to_horizon='CLIP_TO_HORIZON',
-            antialiasing='ANTIALIASING',
-            levels="9027.977411;4513.988705;2256.994353;1128.497176"
-        )
+        # Tiles of the contour scales over the contours, calculated from the tiling scheme
+        TilingScheme.writeTilePolygons(base_tiling_scheme, TilingScheme.getSchemeExtent(base_fc), ContourConfig.CONTOUR_SCALES_LIST)
         Utility.doTime(a, "Generated base tiling scheme {}".format(base_tiling_scheme))
 
-        # JWS - 3/29
-        del base_mxd
-
     return base_tiling_scheme
 
 
@@ -123,87 +94,56 @@ def clearScratchFiles(section_mxd_name, anno_paths, mask_paths, annoLyr_paths):
     
     arcpy.AddMessage("\t\tCleared scratch directory {}".format(directory))
 
-def isProcessFile(scratch, name):
-    filter_folder_name = "T{}".format(name)
-    filter_folder = os.path.join(scratch, filter_folder_name)
-    
-    section_mxd_name = os.path.join(filter_folder, '{}.mxd'.format(filter_folder_name))
-    scratch_db = os.path.join(filter_folder, '{}.gdb'.format(filter_folder_name))
-    target_scheme_polys = os.path.join(filter_folder, '{}SP.shp'.format(filter_folder_name))
-    
-    anno1128 = os.path.join(filter_folder, r"Contours_1128Anno1128.shp")
-    anno2257 = os.path.join(filter_folder, r"Contours_2257Anno2256.shp")
-    anno4514 = os.path.join(filter_folder, r"Contours_4514Anno4513.shp")
-    anno9028 = os.path.join(filter_folder, r"Contours_9028Anno9027.shp")
-    anno_paths = [anno1128, anno2257, anno4514, anno9028]
-    
-    mask1128 = os.path.join(filter_folder, r"Mask1128.shp")
-    mask2257 = os.path.join(filter_folder, r"Mask2256.shp")
-    mask4514 = os.path.join(filter_folder, r"Mask4513.shp")
-    mask9028 = os.path.join(filter_folder, r"Mask9027.shp")
-    mask_paths = [mask1128, mask2257, mask4514, mask9028]
-    
-    annoLyr1128 = os.path.join(filter_folder, r"Contours_1128Anno1128.lyr")
-    annoLyr2257 = os.path.join(filter_folder, r"Contours_2257Anno2256.lyr")
-    annoLyr4514 = os.path.join(filter_folder, r"Contours_4514Anno4513.lyr")
-    annoLyr9028 = os.path.join(filter_folder, r"Contours_9028Anno9027.lyr")
-    annoLyr_paths = [annoLyr1128, annoLyr2257, annoLyr4514, annoLyr9028]
-    
-    isOk = True
-    
-    isFolder = True
-    isMxd = True
-    isLyrFile = True
-    isMask = True
-    isAnno = True
-    isTargetPoly = True
-    isScratchDB = True
-    
-    if not os.path.exists(filter_folder):
-        isFolder = False
-    
-    isOk = isOk and isFolder
-    
-    if not os.path.exists(section_mxd_name):
-        isMxd = False
-    
-    isOk = isOk and isMxd 
-    
-    if isOk and not os.path.exists(scratch_db): 
-        isScratchDB = False
-    
-    isOk = isOk and isScratchDB
-        
-    if isOk and not os.path.exists(target_scheme_polys):
-        isTargetPoly = False 
-            
-    isOk = isOk and isTargetPoly
-    
-    if isOk:
-        for anno_path in anno_paths:
-            if isOk and not os.path.exists(anno_path):
-                isAnno = False
-            isOk = isOk and isAnno
-    
-    if isOk:
-        for mask_path in mask_paths:
-            if isOk and not os.path.exists(mask_path):
-                isMask = False
-            isOk = isOk and isMask
-    if isOk:
-        for annoLyr_path in annoLyr_paths:
-            if isOk and not os.path.exists(annoLyr_path):
-                isLyrFile = False
-            isOk = isOk and isLyrFile
-    
-#     isOk = not (isMxd and isLyrFile and isMask and isAnno and isTargetPoly and isScratchDB)
-    
-    return not isOk
+'''
+--------------------------------------------------------------------------------
+Hash of the parameters the annotation tiles are made with
+--------------------------------------------------------------------------------
+'''
+def getParameterHash():
+    return TileManifest.getParameterHash([ContourConfig.MXD_ANNO_TEMPLATE, ContourConfig.CONTOUR_SCALES_STRING])
+
+
+'''
+--------------------------------------------------------------------------------
+Returns the annotation shapefiles and masks of a tile, the files of its
+TileManifest record
+--------------------------------------------------------------------------------
+'''
+def getTileOutputPaths(scratch, name):
+    filter_folder = os.path.join(scratch, 'T{}'.format(name))
+    shp_names = ["Contours_1128Anno1128.shp", "Contours_2257Anno2256.shp", "Contours_4514Anno4513.shp", "Contours_9028Anno9027.shp",
+                 "Mask1128.shp", "Mask2256.shp", "Mask4513.shp", "Mask9027.shp"]
+    return [os.path.join(filter_folder, shp_name) for shp_name in shp_names]
+
+
+'''
+--------------------------------------------------------------------------------
+Returns {name: feature_count} of the annotation tiles finished with the current
+parameters whose outputs exist and match their file stats (their checksum with
+CONTOUR_VERIFY_CHECKSUM)
+--------------------------------------------------------------------------------
+'''
+def getCompletedTiles(scratch):
+    return TileManifest.getVerified(TileManifest.getManifestPath(scratch), TileManifest.ANNOTATION, getParameterHash(), partial(getTileOutputPaths, scratch),
+                                    ContourConfig.CONTOUR_VERIFY_CHECKSUM)
+
+
+'''
+--------------------------------------------------------------------------------
+Returns True if the annotation tile isn't in the TileManifest or its outputs
+changed. completed is the result of getCompletedTiles, it's read if None.
+--------------------------------------------------------------------------------
+'''
+def isProcessFile(scratch, name, completed=None):
+    if completed is None:
+        completed = getCompletedTiles(scratch)
+    return name not in completed
                 
 def getContourPrepList(scratch, name_list):
     process_list = []
+    completed = getCompletedTiles(scratch)
     for name in name_list:
-        if isProcessFile(scratch, name):
+        if isProcessFile(scratch, name, completed):
             process_list.append(name)
     
     return process_list
@@ -240,7 +180,7 @@ def contour_prep(in_fc, scheme_poly, scratch, footprint_path, name):
     annoShp2257 = os.path.join(filter_folder, r"Contours_2257Anno2256.shp")
     annoShp4514 = os.path.join(filter_folder, r"Contours_4514Anno4513.shp")
     annoShp9028 = os.path.join(filter_folder, r"Contours_9028Anno9027.shp")
-    annoShp_paths = [annoShp1128, annoShp2257, annoShp4514, annoShp9028]  # @UnusedVariable
+    annoShp_paths = [annoShp1128, annoShp2257, annoShp4514, annoShp9028]
     
     mask1128 = os.path.join(filter_folder, r"Mask1128.shp")
     mask2257 = os.path.join(filter_folder, r"Mask2256.shp")
@@ -460,10 +400,21 @@ def contour_prep(in_fc, scheme_poly, scratch, footprint_path, name):
                         pass
                 mxd.save()
                 a = Utility.doTime(a, "\t{}: Created masking polygons".format(name))
+                del mxd
+                
+                # Only complete with every artifact, otherwise it's re-created on the next pass
+                missing = [path for path in annoShp_paths + mask_paths + annoLyr_paths if not os.path.exists(path)]
+                if len(missing) > 0:
+                    arcpy.AddWarning("{}: WARNING: Missing artifacts {}".format(name, missing))
+                else:
+                    feature_count = 0
+                    for anno_path in anno_paths:
+                        feature_count = feature_count + int(arcpy.GetCount_management(anno_path).getOutput(0))
+                    TileManifest.setFilesCompleted(TileManifest.getManifestPath(scratch), TileManifest.ANNOTATION, name, feature_count,
+                                                   getTileOutputPaths(scratch, name), getParameterHash())
                 
                 Utility.doTime(aa, 'Finished: {}'.format(name))
                 created1 = True
-                del mxd
                 
             except Exception as e:
                 arcpy.AddError('Exception: {}'.format(e))
@@ -9,7 +9,7 @@ import time
 
 from ngce import Utility
 from ngce.cmdr import CMDR
-from ngce.contour import ContourConfig
+from ngce.contour import CachePlan, ContourConfig, TilingScheme, VectorTiles
 from ngce.folders import ProjectFolders
 from ngce.folders.FoldersConfig import DTM
 from ngce.pmdm import RunUtil
@@ -239,6 +239,23 @@ def processJob(ProjectJob, project, ProjectUID, serverConnectionFile):
     except arcpy.ExecuteError:
         arcpy.AddWarning(arcpy.GetMessages(2))
 
+    contours_wm = os.path.join(contour_folder, ContourConfig.CONTOUR_GDB_NAME, ContourConfig.CONTOUR_NAME_WM)
+    if ContourConfig.CONTOUR_VECTOR_TILES:
+        # Vector tiles made locally, so the server only has to host the finished tile store
+        mbtiles_path = os.path.join(cache_path, "{}_{}.mbtiles".format(folder, serviceName))
+        VectorTiles.createVectorTiles(contours_wm, mbtiles_path, serviceName)
+
+    # Tiles the cache job will draw, from the tiling scheme
+    for scale, tile_count in TilingScheme.getTileCounts(updateExtents, ContourConfig.CONTOUR_SCALES_LIST, tilingScheme):
+        arcpy.AddMessage("Cache tiles at scale {}: {}".format(scale, tile_count))
+
+    cachePlan = None
+    if ContourConfig.CONTOUR_CACHE_PLAN:
+        # Only the tiles with contours in them are drawn, the empty ones are left to the cache's blank tile
+        cachePlan = os.path.join(temp, "CachePlan.shp")
+        for scale, tile_count in CachePlan.writeCachePlan(contours_wm, cachePlan, ContourConfig.CONTOUR_SCALES_LIST, tilingScheme):
+            arcpy.AddMessage("Planned cache tiles at scale {}: {}".format(scale, tile_count))
+
     # Create the cache tiles for the local project service
     ts = time.time()
     st = datetime.datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
@@ -259,15 +276,33 @@ def processJob(ProjectJob, project, ProjectUID, serverConnectionFile):
         updateExtents,
         waitForJobCompletion],
         'arcpy.ManageMapServerCasheTiles_server') #Added 16 April 2016 BJN
-    arcpy.ManageMapServerCacheTiles_server(
-        inputService,
-        scales,
-        updateMode,
-        cachingInstances,
-        areaOfInterest,
-        updateExtents,
-        waitForJobCompletion
-    )
+    if cachePlan is None:
+        arcpy.ManageMapServerCacheTiles_server(
+            inputService,
+            scales,
+            updateMode,
+            cachingInstances,
+            areaOfInterest,
+            updateExtents,
+            waitForJobCompletion
+        )
+    else:
+        # One job per scale over that level's planned tiles
+        scheme = TilingScheme.TilingScheme(tilingScheme)
+        for scale in scales.split(";"):
+            level = scheme.getLevel(scale)
+            planLayer = arcpy.MakeFeatureLayer_management(cachePlan, "CachePlan_L{}".format(level), "Tile_Level = {}".format(level)).getOutput(0)
+            if int(arcpy.GetCount_management(planLayer).getOutput(0)) > 0:
+                arcpy.ManageMapServerCacheTiles_server(
+                    inputService,
+                    scale,
+                    updateMode,
+                    cachingInstances,
+                    planLayer,
+                    "",
+                    waitForJobCompletion
+                )
+            arcpy.Delete_management(planLayer)
     ts = time.time()
     st = datetime.datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
     arcpy.AddMessage("Cache creation completed at: {0}".format(st))
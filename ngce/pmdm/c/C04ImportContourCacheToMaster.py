@@ -8,13 +8,39 @@ import sys
 from ngce import Utility
 from ngce.Utility import doTime
 from ngce.cmdr import CMDR
-from ngce.contour import ContourConfig
+from ngce.contour import CompactCache, ContourConfig, TilingScheme
 
 from ngce.folders import ProjectFolders
 from ngce.folders.FoldersConfig import DTM
 from ngce.pmdm.a import A05_C_ConsolidateRasterInfo
 
 
+'''
+--------------------------------------------------------------------------------
+Merges the project cache bundles into the master cache bundles on disk (see
+CompactCache), limited to the tiles over the area of interest.
+Returns False if either cache isn't a compact V2 cache
+--------------------------------------------------------------------------------
+'''
+def mergeCacheToMaster(projectCache, masterCache, areaOfInterest):
+    a = datetime.datetime.now()
+    project_conf = os.path.join(projectCache, "conf.xml")
+    master_conf = os.path.join(masterCache, "conf.xml")
+    if not os.path.exists(project_conf) or not os.path.exists(master_conf) or \
+            not CompactCache.isCompactV2(project_conf) or not CompactCache.isCompactV2(master_conf):
+        arcpy.AddMessage("Not a compact V2 cache, can't merge bundles of '{}' into '{}'".format(projectCache, masterCache))
+        return False
+
+    scheme = TilingScheme.TilingScheme(project_conf)
+    extent = TilingScheme.getSchemeExtent(areaOfInterest, project_conf)
+    tile_ranges = {}
+    for level in scheme.levels:
+        tile_ranges[CompactCache.getLevelFolderName(int(level))] = scheme.getTileRange(level, extent.XMin, extent.YMin, extent.XMax, extent.YMax)
+    changed, total = CompactCache.mergeCache(os.path.join(projectCache, "_alllayers"), os.path.join(masterCache, "_alllayers"), tile_ranges)
+    doTime(a, "Merged {} changed of {} tiles of '{}' into '{}'".format(changed, total, projectCache, masterCache))
+    return True
+
+
 def ImportContourCacheToMaster(jobID, serverConnectionFilePath, masterServiceName, update=False, runCount=0):
     a = datetime.datetime.now()
     aa = a
@@ -105,17 +131,21 @@ def ImportContourCacheToMaster(jobID, serverConnectionFilePath, masterServiceNam
 #         st = datetime.datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
 #         arcpy.AddMessage("Import started at: {0}".format(st))
         a = doTime(a, "Ready to start import of '{}' into '{}'".format(projectCache, masterService))
-        arcpy.ImportMapServerCache_server(
-            input_service=masterService,
-            source_cache_type="CACHE_DATASET",
-            source_cache_dataset=projectCache,
-            source_tile_package="",
-            upload_data_to_server="DO_NOT_UPLOAD",
-            scales=ContourConfig.CONTOUR_SCALES_STRING,
-            num_of_caching_service_instances=ContourConfig.CACHE_INSTANCES,
-            area_of_interest=areaOfInterest,
-            overwrite="OVERWRITE"  # @TODO: Verify this is right
-        )
+        masterCache = os.path.join(ContourConfig.CACHE_FOLDER, "{}_{}".format(masterServiceName.replace("\\", "_").replace("/", "_"), ContourConfig.CONTOUR_2FT_SERVICE_NAME), "Layers")
+        if ContourConfig.CONTOUR_CACHE_MERGE and mergeCacheToMaster(projectCache, masterCache, areaOfInterest):
+            a = doTime(a, "Merged bundles of '{}' into '{}'".format(projectCache, masterCache))
+        else:
+            arcpy.ImportMapServerCache_server(
+                input_service=masterService,
+                source_cache_type="CACHE_DATASET",
+                source_cache_dataset=projectCache,
+                source_tile_package="",
+                upload_data_to_server="DO_NOT_UPLOAD",
+                scales=ContourConfig.CONTOUR_SCALES_STRING,
+                num_of_caching_service_instances=ContourConfig.CACHE_INSTANCES,
+                area_of_interest=areaOfInterest,
+                overwrite="OVERWRITE"  # @TODO: Verify this is right
+            )
 
 #         arcpy.ImportMapServerCache_server(input_service="//aiotxftw6na01data/SMB03/elevation/WorkflowManager/arcgis on aiotxftw3gi013.usda.net/Master/Elevation_1M_CONT_2FT.MapServer",
 #                                           source_cache_type="CACHE_DATASET",
@@ -4,12 +4,18 @@
 # and a "data domain" feature class (D01_DATA_DOMAIN). Script will segment input LAS file, use the fishnet extents
 # for multiprocessing, merge the output, and append the "data domain" as a surface constraint to the LAS file.
 #
+# With D01_OCCUPANCY_GRID The Fishnet Tasks Are Replaced By One Project Wide Ground/Model Key Point Count Grid.
+# Voids Are Labeled As Connected Regions Of Empty Cells In The Convex Hull Of The Data & Both Outputs Are Traced
+# From The Grid Once (D_Grid).
+#
 # Author: jeff8977
 
 from multiprocessing import Pool, cpu_count
 from ngce.pmdm.d.D_Config import *
+from ngce.pmdm.d import D_Grid, D_Tiles
 from functools import partial
 import tempfile
+import numpy
 import arcpy
 import time
 import sys
@@ -258,6 +264,79 @@ def handle_results(base_dir, task_dir, target_lasd):
     arcpy.AddFilesToLasDataset_management(target_lasd, "", "", constraint_param)
 
 
+def build_occupancy_grid(target_lasd, base_dir):
+
+    print('Building Occupancy Grid')
+
+    grid_dir = os.path.join(base_dir, 'GRID')
+    os.mkdir(grid_dir)
+
+    # Point Count Of Ground & Model Key Points For The Whole Project
+    filter_name = 'lasd_lyr_grid'
+    filter_lasd = arcpy.MakeLasDatasetLayer_management(target_lasd, filter_name, '2;8')
+    count_name = os.path.join(grid_dir, 'count.tif')
+    arcpy.LasPointStatsAsRaster_management(filter_lasd, count_name, 'POINT_COUNT', 'CELLSIZE', str(D01_CELL_SIZE))
+    arcpy.Delete_management(filter_name)
+
+    count = arcpy.Raster(count_name)
+    occupied = arcpy.RasterToNumPyArray(count, nodata_to_value=0) > 0
+    print('Grid: ', occupied.shape[0], ' x ', occupied.shape[1])
+
+    return occupied, count.extent.XMin, count.extent.YMax, count.meanCellWidth, count.spatialReference
+
+
+def write_regions(out_path, labels, count, region_ids, x_min, y_max, cell_size, spatial_ref, acres=None):
+
+    # Trace Each Region Inside Its Bounds & Write One Polygon Per Region
+    out_folder, out_name = os.path.split(out_path)
+    arcpy.CreateFeatureclass_management(out_folder, out_name, 'POLYGON', spatial_reference=spatial_ref)
+    fields = ['SHAPE@']
+    if acres is not None:
+        arcpy.AddField_management(out_path, 'ACRES', 'DOUBLE')
+        fields.append('ACRES')
+
+    first_rows, last_rows, first_cols, last_cols = D_Grid.region_bounds(labels, count)
+    with arcpy.da.InsertCursor(out_path, fields) as cursor:
+        for region_id in region_ids:
+            r0, r1, c0, c1 = first_rows[region_id], last_rows[region_id] + 1, first_cols[region_id], last_cols[region_id] + 1
+            rings = D_Grid.trace_rings(labels[r0:r1, c0:c1] == region_id)
+            polygon = D_Grid.rings_to_polygon(rings, x_min, y_max, cell_size, spatial_ref, r0, c0)
+            if acres is not None:
+                cursor.insertRow([polygon, float(acres[region_id])])
+            else:
+                cursor.insertRow([polygon])
+
+
+def handle_grid(base_dir, target_lasd, occupied, x_min, y_max, cell_size, spatial_ref):
+
+    print('Handling Occupancy Grid')
+
+    results = os.path.join(base_dir, 'RESULTS')
+    os.mkdir(results)
+
+    # Acres Of A Cell
+    cell_acres = (cell_size * spatial_ref.metersPerUnit) ** 2 / D_Grid.ACRE
+
+    # Voids: Empty Cells Inside The Convex Hull Of The Data, Regions Over The Minimum Acres (Drivers)
+    voids = ~occupied & D_Grid.convex_hull_mask(occupied)
+    void_labels, void_count = D_Grid.label_regions(voids)
+    void_acres = numpy.bincount(void_labels.ravel(), minlength=void_count + 1) * cell_acres
+    drivers = [i for i in range(1, void_count + 1) if void_acres[i] > D01_MIN_VOID_ACRES]
+    print('Voids: ', void_count, ' Drivers: ', len(drivers))
+    write_regions(os.path.join(results, D01_DRIVERS), void_labels, void_count, drivers, x_min, y_max, cell_size, spatial_ref, void_acres)
+    del void_labels
+
+    # Data Domain: Regions Of Cells With Points, Holes Filled So Only The Outer Rings Are Traced
+    data_labels, data_count = D_Grid.label_regions(D_Grid.fill_holes(occupied))
+    print('Data Regions: ', data_count)
+    data_domain = os.path.join(results, D01_DATA_DOMAIN)
+    write_regions(data_domain, data_labels, data_count, range(1, data_count + 1), x_min, y_max, cell_size, spatial_ref)
+
+    # Apply Data Domain As Soft Clip to LASD
+    constraint_param = [[data_domain, "<None>", "Soft_Clip"]]
+    arcpy.AddFilesToLasDataset_management(target_lasd, "", "", constraint_param)
+
+
 if __name__ == '__main__':
 
     # Get Script Start Time
@@ -280,15 +359,21 @@ if __name__ == '__main__':
         # Handle Surface Constraints
         check_surface_constraints(target_lasd)
 
-        # Determine Grid Dimensions For Fishnet
-        row, col = grid_calc()
-
         # Create Directory For Script Results
         base_dir = os.path.join(derived_dir, D01)
         os.mkdir(base_dir)
 
-        # Collect Processing Extent Dictionary
-        extent_dict = collect_extents(target_lasd, base_dir, row, col)
+        if not D01_OCCUPANCY_GRID and D_ADAPTIVE_TILING:
+            # Collect Processing Extent Dictionary From LAS Header Point Counts
+            las_dir = os.path.join(project_dir, DELIVERED, LAS_CLASSIFIED)
+            extent_dict = D_Tiles.collect_task_extents(target_lasd, las_dir, cpu_count() - 2, 5)
+
+        elif not D01_OCCUPANCY_GRID:
+            # Determine Grid Dimensions For Fishnet
+            row, col = grid_calc()
+
+            # Collect Processing Extent Dictionary
+            extent_dict = collect_extents(target_lasd, base_dir, row, col)
 
     except Exception as e:
         print('Script Encountered Issues While Initializing')
@@ -296,18 +381,24 @@ if __name__ == '__main__':
 
     else:
         try:
-            # Create Directory For TASK Results
-            task_dir = os.path.join(base_dir, 'TASKS')
-            os.mkdir(task_dir)
-
-            # Create Pool & Map Processing Dictionary To Task Function
-            pool = Pool(processes=cpu_count() - 2)
-            result = pool.map_async(partial(task, target_lasd, task_dir), extent_dict.items())
-            pool.close()
-            pool.join()
-
-            # Create Results From Task Output
-            handle_results(base_dir, task_dir, target_lasd)
+            if D01_OCCUPANCY_GRID:
+                # Drivers & Data Domain From One Point Count Grid
+                grid = build_occupancy_grid(target_lasd, base_dir)
+                handle_grid(base_dir, target_lasd, *grid)
+
+            else:
+                # Create Directory For TASK Results
+                task_dir = os.path.join(base_dir, 'TASKS')
+                os.mkdir(task_dir)
+
+                # Create Pool & Map Processing Dictionary To Task Function
+                pool = Pool(processes=cpu_count() - 2)
+                result = pool.map_async(partial(task, target_lasd, task_dir), extent_dict.items())
+                pool.close()
+                pool.join()
+
+                # Create Results From Task Output
+                handle_results(base_dir, task_dir, target_lasd)
 
         except Exception as e:
             print('Script Encountered Issues While Processing')
@@ -6,10 +6,19 @@
 # faster processing with basic list comprehension. These commented lines would be used if the results of D02
 # were stored in a File Geodatabase.
 #
+# With D03_RASTER_MERGE Every D02 Tile (Shapefile Or Void Mask Raster) Becomes A Void Mask On A Shared Grid And Is
+# Labeled On Its Own. Regions Crossing Tile Edges Are Joined With A Union-Find Over The Tile Border Labels (8
+# Neighborhood, So Windows A Cell Apart Still Join), The Area Filter Runs On Pixel Counts & Only The Regions Kept Are
+# Traced To Polygons. Only The Label Counts, Bounds & The Strips Along The Neighbor Tiles Are Kept In Memory, The Tiles
+# With Kept Regions Are Read Again To Trace Them.
+#
 # Author: jeff8977
 
 from ngce.pmdm.d.D_Config import *
+from ngce.pmdm.d import D_Grid
+import numpy
 import arcpy
+import math
 import time
 import sys
 import os
@@ -78,6 +87,197 @@ def handle_d02_output(d02_output, out_workspace):
     arcpy.Delete_management("lyr")
 
 
+def read_tile_windows(d02_output, cell_size):
+
+    print('Reading D02 Tile Extents')
+
+    # Tile Extents & Shared Grid Origin
+    tile_paths = [os.path.join(d02_output, f) for f in os.listdir(d02_output) if f.endswith('.shp') or f.endswith('.tif')]
+    extents = [arcpy.Describe(tile_path).extent for tile_path in tile_paths]
+    spatial_ref = arcpy.Describe(tile_paths[0]).spatialReference
+    x_origin = math.floor(min(ext.XMin for ext in extents) / cell_size) * cell_size
+    y_origin = math.ceil(max(ext.YMax for ext in extents) / cell_size) * cell_size
+
+    # Returns The Window [First Row, First Col, End Row, End Col] Of Every Tile On The Shared Grid
+    windows = []
+    for tile_path, ext in zip(tile_paths, extents):
+        if tile_path.endswith('.tif'):
+            # Void Mask Raster, Aligned To The Shared Grid By Its Top Left Corner
+            raster = arcpy.Raster(tile_path)
+            row0 = int(round((y_origin - ext.YMax) / cell_size))
+            col0 = int(round((ext.XMin - x_origin) / cell_size))
+            windows.append([row0, col0, row0 + raster.height, col0 + raster.width])
+        else:
+            row0 = int(math.floor((y_origin - ext.YMax) / cell_size))
+            col0 = int(math.floor((ext.XMin - x_origin) / cell_size))
+            windows.append([row0, col0, int(math.ceil((y_origin - ext.YMin) / cell_size)), int(math.ceil((ext.XMax - x_origin) / cell_size))])
+
+    print('Tiles: ', len(tile_paths))
+
+    return tile_paths, numpy.array(windows, dtype=numpy.int64).reshape(-1, 4), x_origin, y_origin, spatial_ref
+
+
+def read_tile_mask(tile_path, window, x_origin, y_origin, cell_size, spatial_ref):
+
+    # Void Mask Of One Tile Over Its Window
+    row0, col0, row1, col1 = window
+    if tile_path.endswith('.tif'):
+        return arcpy.RasterToNumPyArray(arcpy.Raster(tile_path), nodata_to_value=0) > 0
+    mask = numpy.zeros((row1 - row0, col1 - col0), dtype=bool)
+    for rings, value in D_Grid.read_rings(tile_path, None, spatial_ref):
+        mask |= D_Grid.polygon_mask(rings, x_origin + col0 * cell_size, y_origin - row0 * cell_size, cell_size, row1 - row0, col1 - col0)
+    return mask
+
+
+def get_strip(labels, window, other_window):
+
+    # Labels Of The Tile Within One Cell Of The Other Tile's Window, As [Labels, First Row, First Col]
+    r0, c0 = max(window[0], other_window[0] - 1), max(window[1], other_window[1] - 1)
+    r1, c1 = min(window[2], other_window[2] + 1), min(window[3], other_window[3] + 1)
+    return [labels[r0 - window[0]:r1 - window[0], c0 - window[1]:c1 - window[1]].copy(), r0, c0]
+
+
+def border_pairs(window_a, strip_a, strip_b):
+
+    # Labels Of A's Border Cells Paired With B's Labels In The 8 Neighborhood Of The Cell (The Cell Itself Included),
+    # So Regions Join Across Overlapping Tiles & Across Tiles Whose Windows Are A Cell Off
+    labels_a, row_a, col_a = strip_a
+    labels_b, row_b, col_b = strip_b
+    ra0, ca0, ra1, ca1 = window_a
+    side_rows = numpy.arange(ra0, ra1)
+    side_cols = numpy.arange(ca0, ca1)
+    cell_rows = numpy.concatenate([numpy.full(len(side_cols), ra0), numpy.full(len(side_cols), ra1 - 1), side_rows, side_rows])
+    cell_cols = numpy.concatenate([side_cols, side_cols, numpy.full(len(side_rows), ca0), numpy.full(len(side_rows), ca1 - 1)])
+
+    # Only The Border Cells In A's Strip
+    in_a = (cell_rows >= row_a) & (cell_rows < row_a + labels_a.shape[0]) & (cell_cols >= col_a) & (cell_cols < col_a + labels_a.shape[1])
+    cell_rows, cell_cols = cell_rows[in_a], cell_cols[in_a]
+    a = labels_a[cell_rows - row_a, cell_cols - col_a]
+    cell_rows, cell_cols, a = cell_rows[a > 0], cell_cols[a > 0], a[a > 0]
+
+    from_labels, to_labels = [], []
+    for dr in [-1, 0, 1]:
+        for dc in [-1, 0, 1]:
+            other_rows, other_cols = cell_rows + dr, cell_cols + dc
+            inside = (other_rows >= row_b) & (other_rows < row_b + labels_b.shape[0]) & (other_cols >= col_b) & (other_cols < col_b + labels_b.shape[1])
+            b = labels_b[other_rows[inside] - row_b, other_cols[inside] - col_b]
+            from_labels.append(a[inside][b > 0])
+            to_labels.append(b[b > 0])
+    return numpy.concatenate(from_labels), numpy.concatenate(to_labels)
+
+
+def handle_d02_masks(d02_output, out_workspace):
+
+    print('Handling D02 Output As Void Masks')
+
+    cell_size = float(D03_CELL_SIZE)
+    tile_paths, windows, x_origin, y_origin, spatial_ref = read_tile_windows(d02_output, cell_size)
+
+    # Tiles Whose Windows Overlap Or Are Within A Cell Of Each Other
+    neighbors = [numpy.flatnonzero((windows[:, 0] <= w[2]) & (windows[:, 2] >= w[0]) & (windows[:, 1] <= w[3]) & (windows[:, 3] >= w[1]))
+                 for w in windows]
+
+    # Label Every Tile On Its Own, Global Ids Are The Tile Offset + Label - 1
+    # Only The Owned Cell Count & Bounds Of Every Label & The Strips Along The Later Neighbors Are Kept
+    offsets = []
+    offset = 0
+    region_counts, region_first_rows, region_last_rows, region_first_cols, region_last_cols = [], [], [], [], []
+    strips = {}
+    from_ids, to_ids = [], []
+    for i, tile_path in enumerate(tile_paths):
+        window = windows[i]
+        labels, count = D_Grid.label_regions(read_tile_mask(tile_path, window, x_origin, y_origin, cell_size, spatial_ref))
+        offsets.append(offset)
+
+        # A Cell Under Overlapping Tiles Counts For The First Tile Whose Region Covers It
+        owned = labels > 0
+        for j in neighbors[i]:
+            if j < i and (j, i) in strips:
+                labels_j, r0, c0 = strips.pop((j, i))
+                wr0, wr1 = max(r0, window[0]), min(r0 + labels_j.shape[0], window[2])
+                wc0, wc1 = max(c0, window[1]), min(c0 + labels_j.shape[1], window[3])
+                if wr0 < wr1 and wc0 < wc1:
+                    owned[wr0 - window[0]:wr1 - window[0], wc0 - window[1]:wc1 - window[1]] &= labels_j[wr0 - r0:wr1 - r0, wc0 - c0:wc1 - c0] == 0
+
+                # Join The Regions On The Borders Of Both Tiles
+                strip_j = [labels_j, r0, c0]
+                strip_i = get_strip(labels, window, windows[j])
+                for window_a, strip_a, offset_a, strip_b, offset_b in [[window, strip_i, offset, strip_j, offsets[j]],
+                                                                       [windows[j], strip_j, offsets[j], strip_i, offset]]:
+                    a, b = border_pairs(window_a, strip_a, strip_b)
+                    from_ids.append(a + offset_a - 1)
+                    to_ids.append(b + offset_b - 1)
+            elif j > i and count > 0:
+                # Tiles Without Regions Have Nothing To Own Or Join
+                strips[(i, j)] = get_strip(labels, window, windows[j])
+
+        region_counts.append(numpy.bincount(labels[owned], minlength=count + 1)[1:])
+        first_rows, last_rows, first_cols, last_cols = D_Grid.region_bounds(labels, count)
+        region_first_rows.append(first_rows[1:] + window[0])
+        region_last_rows.append(last_rows[1:] + window[0])
+        region_first_cols.append(first_cols[1:] + window[1])
+        region_last_cols.append(last_cols[1:] + window[1])
+        offset += count
+    offsets.append(offset)
+    print('Tile Regions: ', offset)
+
+    if from_ids:
+        roots = D_Grid.union_find(offset, numpy.concatenate(from_ids), numpy.concatenate(to_ids))
+    else:
+        roots = numpy.arange(offset)
+
+    # Area Filter On Pixel Counts & Grid Bounds Of Every Region
+    counts = numpy.bincount(roots, weights=numpy.concatenate(region_counts), minlength=offset) if offset > 0 else numpy.zeros(0)
+    first_rows = numpy.full(offset, numpy.iinfo(numpy.int64).max, dtype=numpy.int64)
+    first_cols = numpy.full(offset, numpy.iinfo(numpy.int64).max, dtype=numpy.int64)
+    last_rows = numpy.full(offset, -1, dtype=numpy.int64)
+    last_cols = numpy.full(offset, -1, dtype=numpy.int64)
+    if offset > 0:
+        numpy.minimum.at(first_rows, roots, numpy.concatenate(region_first_rows))
+        numpy.minimum.at(first_cols, roots, numpy.concatenate(region_first_cols))
+        numpy.maximum.at(last_rows, roots, numpy.concatenate(region_last_rows))
+        numpy.maximum.at(last_cols, roots, numpy.concatenate(region_last_cols))
+    del region_counts, region_first_rows, region_last_rows, region_first_cols, region_last_cols
+
+    cell_acres = (cell_size * spatial_ref.metersPerUnit) ** 2 / D_Grid.ACRE
+    is_kept = counts * cell_acres > D03_MIN_ACRES
+    print('Void Regions: ', int((counts > 0).sum()), ' Over ', D03_MIN_ACRES, ' Acres: ', int(is_kept.sum()))
+
+    # Tiles Holding Every Kept Region
+    tile_roots = []
+    remaining = numpy.zeros(offset, dtype=numpy.int64)
+    for i in range(len(tile_paths)):
+        kept_roots = numpy.unique(roots[offsets[i]:offsets[i + 1]])
+        kept_roots = kept_roots[is_kept[kept_roots]]
+        tile_roots.append(kept_roots)
+        remaining[kept_roots] += 1
+
+    # Re-Read Only The Tiles With Kept Regions, A Region Is Traced Once Its Last Tile Is Read
+    final = os.path.join(out_workspace, D03_FINAL)
+    arcpy.CreateFeatureclass_management(out_workspace, D03_FINAL, 'POLYGON', spatial_reference=spatial_ref)
+    arcpy.AddField_management(final, 'ACRES', 'DOUBLE', 12)
+    masks = {}
+    with arcpy.da.InsertCursor(final, ['SHAPE@', 'ACRES']) as cursor:
+        for i, tile_path in enumerate(tile_paths):
+            if len(tile_roots[i]) == 0:
+                continue
+            window = windows[i]
+            labels, count = D_Grid.label_regions(read_tile_mask(tile_path, window, x_origin, y_origin, cell_size, spatial_ref))
+            label_roots = numpy.concatenate([[-1], roots[offsets[i]:offsets[i + 1]]])
+            for root in tile_roots[i].tolist():
+                r0, r1, c0, c1 = first_rows[root], last_rows[root] + 1, first_cols[root], last_cols[root] + 1
+                if root not in masks:
+                    masks[root] = numpy.zeros((r1 - r0, c1 - c0), dtype=bool)
+                wr0, wr1 = max(r0, window[0]), min(r1, window[2])
+                wc0, wc1 = max(c0, window[1]), min(c1, window[3])
+                if wr0 < wr1 and wc0 < wc1:
+                    masks[root][wr0 - r0:wr1 - r0, wc0 - c0:wc1 - c0] |= label_roots[labels[wr0 - window[0]:wr1 - window[0], wc0 - window[1]:wc1 - window[1]]] == root
+                remaining[root] -= 1
+                if remaining[root] == 0:
+                    polygon = D_Grid.rings_to_polygon(D_Grid.trace_rings(masks.pop(root)), x_origin, y_origin, cell_size, spatial_ref, r0, c0)
+                    cursor.insertRow([polygon, float(counts[root] * cell_acres)])
+
+
 if __name__ == "__main__":
 
     # Get Script Start Time
@@ -97,7 +297,10 @@ if __name__ == "__main__":
 
         # Resolve D02 Tiles into D03 Final Output
         d02_output = os.path.join(project_dir, DERIVED, D02, 'RESULTS')
-        handle_d02_output(d02_output, out_workspace)
+        if D03_RASTER_MERGE:
+            handle_d02_masks(d02_output, out_workspace)
+        else:
+            handle_d02_output(d02_output, out_workspace)
 
     except Exception as e:
         print('Exception: ', e)
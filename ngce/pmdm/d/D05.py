@@ -1,11 +1,15 @@
 # Name: D05.py
 #
 # Purpose: Uses the fishnet generated in D04 to create multiprocessing extents for creation of raster files.
+# With D_ADAPTIVE_TILING The Extents Come From The LAS Header Point Counts (D_Tiles) Instead Of The D04 Fishnet.
+# With D05_IN_PROCESS The Cells Are Rasterized From The LAS Points By D_Rasterize & Indexed In A Tile Index. The LAS
+# Files Are Read Once Into y Sorted Point Files (POINTS) So A Cell Doesn't Rescan Them.
 #
 # Author: jeff8977
 
 from multiprocessing import Pool, cpu_count
 from ngce.pmdm.d.D_Config import *
+from ngce.pmdm.d import D_Rasterize, D_Tiles
 from functools import partial
 import arcpy
 import time
@@ -111,6 +115,15 @@ if __name__ == '__main__':
         # Reference Data Domain For Filtering Fishnet
         data_domain = os.path.join(derived_dir, D01, 'RESULTS', D01_DATA_DOMAIN)
 
+        if D_ADAPTIVE_TILING:
+            # Replace The D04 Fishnet With Task Cells Holding Roughly Equal Point Counts
+            tiles_path = os.path.join(base_dir, 'TILES')
+            os.mkdir(tiles_path)
+            las_dir = os.path.join(project_dir, DELIVERED, LAS_CLASSIFIED)
+            max_points = D05_MAX_TASK_POINTS if D05_IN_PROCESS else None
+            task_extents = D_Tiles.collect_task_extents(target_lasd, las_dir, cpu_count() - 2, 2, clip_to_extent=True, max_points=max_points)
+            d04_output = D_Tiles.write_task_polygons(task_extents, os.path.join(tiles_path, 'tiles.shp'), arcpy.Describe(target_lasd).spatialReference)
+
         # Create Filtered Fishnet & Return Extent For Processing
         extent_dict = filter_fishnet(data_domain, base_dir, d04_output)
 
@@ -118,11 +131,34 @@ if __name__ == '__main__':
         raster_path = os.path.join(base_dir, 'RASTER')
         os.mkdir(raster_path)
 
-        # Use Multiprocessing Pool for Raster  Generation
-        pool = Pool(processes=cpu_count() - 2)
-        result = pool.map_async(partial(generate_raster, target_lasd, raster_path), extent_dict.items())
-        pool.close()
-        pool.join()
+        if D05_IN_PROCESS:
+            # Rasterize The Cells From The LAS Points In The Worker Processes
+            spatial_ref = arcpy.Describe(target_lasd).spatialReference
+            las_files = D_Tiles.collect_las_files(os.path.join(project_dir, DELIVERED, LAS_CLASSIFIED))
+
+            # Read Every LAS File Once Into y Sorted Ground & Model Key Points
+            index_path = os.path.join(base_dir, 'POINTS')
+            os.mkdir(index_path)
+            indexed_files = D_Rasterize.index_las_files(las_files, index_path, [2, 8], cpu_count() - 2)
+            replace_polygons = os.path.join(derived_dir, D03, 'RESULTS', D03_FINAL)
+            if not arcpy.Exists(replace_polygons) or 'Z_MIN' not in [f.name for f in arcpy.ListFields(replace_polygons)]:
+                replace_polygons = None
+            task = partial(D_Rasterize.rasterize_task, target_lasd, indexed_files, data_domain, replace_polygons, raster_path, spatial_ref.exportToString())
+
+            pool = Pool(processes=cpu_count() - 2)
+            rasters = pool.map(task, extent_dict.items())
+            pool.close()
+            pool.join()
+
+            # Tile Index For Mosaicking
+            D_Rasterize.write_tile_index([r for r in rasters if r is not None], os.path.join(base_dir, D05_TILE_INDEX), spatial_ref)
+
+        else:
+            # Use Multiprocessing Pool for Raster  Generation
+            pool = Pool(processes=cpu_count() - 2)
+            result = pool.map_async(partial(generate_raster, target_lasd, raster_path), extent_dict.items())
+            pool.close()
+            pool.join()
 
     except Exception as e:
         print('Exception', e)
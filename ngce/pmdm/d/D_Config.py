@@ -4,6 +4,15 @@ JOB_SOURCE = r'C:\Users\jeff8977\Desktop\NGCE_GitHub\CMDR.gdb\ProjectJob'
 # For Setting Base Directory
 DERIVED = 'DERIVED'
 
+# For Reading LAS Headers (Adaptive Task Extents)
+DELIVERED = 'DELIVERED'
+LAS_CLASSIFIED = 'LAS_CLASSIFIED'
+
+# Adaptive Task Extents (D01, D05)
+D_ADAPTIVE_TILING = True  # Quadtree Over The LAS File Point Counts Instead Of A Fixed Fishnet
+D_TASKS_PER_PROCESS = 4  # Roughly Equal Point Count Tasks Per Worker Process
+D_TILE_MAX_DEPTH = 8  # Deepest Quadtree Split (256 x 256 Cells)
+
 # Base ArcGIS Pro Project For Mapping Scripts
 BASE_APRX = r'C:\Users\jeff8977\Desktop\NGCE_GitHub\ngce\pmdm\d\APRX\D_Base.aprx'
 
@@ -11,6 +20,9 @@ BASE_APRX = r'C:\Users\jeff8977\Desktop\NGCE_GitHub\ngce\pmdm\d\APRX\D_Base.aprx
 D01 = 'D01'
 D01_DATA_DOMAIN = 'd_d.shp'
 D01_DRIVERS = 'drivers.shp'
+D01_OCCUPANCY_GRID = True  # One Project Wide Point Count Grid Instead Of The Fishnet Tasks
+D01_CELL_SIZE = 10
+D01_MIN_VOID_ACRES = 1.5
 
 # D02
 D02 = 'D02'
@@ -18,6 +30,9 @@ D02 = 'D02'
 # D03
 D03 = 'D03'
 D03_FINAL = 'd03_final.shp'
+D03_RASTER_MERGE = True  # Merge The D02 Tiles As Void Masks On A Shared Grid Instead Of Merge & Dissolve
+D03_CELL_SIZE = 1.0
+D03_MIN_ACRES = 2
 
 # D04
 D04 = 'D04'
@@ -25,3 +40,10 @@ D04_FINAL = 'd04_final.shp'
 
 # D05
 D05 = 'D05'
+D05_IN_PROCESS = False  # Rasterize The Task Cells With D_Rasterize Instead Of LasDatasetToRaster
+D05_CELL_SIZE = 1.0
+D05_HALO = 20  # Map Units Of Points Read Around A Cell For The Triangulation
+D05_MAX_TASK_POINTS = 20000000  # Largest Task Cell (LAS Header Point Count) To Triangulate In Memory
+D05_TIFF_TILE_SIZE = 256
+D05_TIFF_COMPRESSION = 'LZW'
+D05_TILE_INDEX = 'tile_index.shp'
@@ -0,0 +1,255 @@
+# Name: D_Grid.py
+#
+# Purpose: NumPy helpers for the D scripts that work on a grid of cells instead of polygons: connected regions
+# (4 or 8 connected, union-find), filling holes, the convex hull of the cells, polygons to cell masks and tracing the
+# outline of cells back to polygon rings the same as RasterToPolygon without simplify.
+#
+# Author: jeff8977
+
+import numpy
+import arcpy
+
+
+ACRE = 4046.8564224  # Square Meters
+
+# Directions Along The Cell Edges As Row, Col Steps: East, South, West, North (Index + 1 Turns Right)
+STEP_ROWS = [0, 1, 0, -1]
+STEP_COLS = [1, 0, -1, 0]
+
+
+def union_find(size, from_ids, to_ids):
+
+    # Hook The Larger Root Onto The Smaller & Compress Until Every Pair Shares A Root
+    # Returns The Root (Lowest Id Of The Set) Of Every Id
+    parent = numpy.arange(size, dtype=numpy.int32 if size < 2 ** 31 else numpy.int64)
+    while True:
+        from_roots = parent[from_ids]
+        to_roots = parent[to_ids]
+        differs = from_roots != to_roots
+        if not differs.any():
+            break
+        numpy.minimum.at(parent, numpy.maximum(from_roots, to_roots)[differs], numpy.minimum(from_roots, to_roots)[differs])
+        while True:
+            grand_parents = parent[parent]
+            if numpy.array_equal(grand_parents, parent):
+                break
+            parent = grand_parents
+    return parent
+
+
+def label_regions(mask, diagonal=False):
+
+    # Label The 4 Connected (8 With diagonal) Regions Of True Cells
+    # Returns Region Ids (0 Outside The Mask, 1..N Inside) & Region Count
+    rows, cols = mask.shape
+    size = rows * cols
+    id_type = numpy.int32 if size < 2 ** 31 else numpy.int64
+    ids = numpy.arange(size, dtype=id_type).reshape(rows, cols)
+    flat = mask.ravel()
+    from_ids = [ids[:, :-1].ravel(), ids[:-1, :].ravel()]
+    to_ids = [ids[:, 1:].ravel(), ids[1:, :].ravel()]
+    if diagonal:
+        from_ids += [ids[:-1, :-1].ravel(), ids[:-1, 1:].ravel()]
+        to_ids += [ids[1:, 1:].ravel(), ids[1:, :-1].ravel()]
+    from_ids = numpy.concatenate(from_ids)
+    to_ids = numpy.concatenate(to_ids)
+    joined = flat[from_ids] & flat[to_ids]
+    parent = union_find(size, from_ids[joined], to_ids[joined])
+
+    # Number The Roots 1..N
+    is_root = (parent == numpy.arange(size)) & flat
+    numbers = numpy.cumsum(is_root)
+    labels = numpy.where(flat, numbers[parent], 0).reshape(rows, cols)
+    return labels, int(numbers[-1]) if size > 0 else 0
+
+
+def fill_holes(mask):
+
+    # The Mask With Its Holes Filled: False Regions That Don't Touch The Grid Border
+    # The False Cells Are 8 Connected, Since trace_rings Splits True Cells That Only Touch At A Corner
+    labels, count = label_regions(~mask, True)
+    outside = numpy.zeros(count + 1, dtype=bool)
+    for border in [labels[0, :], labels[-1, :], labels[:, 0], labels[:, -1]]:
+        outside[border] = True
+    outside[0] = False
+    return mask | ((labels > 0) & ~outside[labels])
+
+
+def region_bounds(labels, count):
+
+    # First & Last Row/Col Of Every Region (Index 0 Is Outside)
+    rows, cols = numpy.nonzero(labels)
+    ids = labels[rows, cols]
+    first_rows = numpy.full(count + 1, labels.shape[0], dtype=numpy.int64)
+    first_cols = numpy.full(count + 1, labels.shape[1], dtype=numpy.int64)
+    last_rows = numpy.full(count + 1, -1, dtype=numpy.int64)
+    last_cols = numpy.full(count + 1, -1, dtype=numpy.int64)
+    numpy.minimum.at(first_rows, ids, rows)
+    numpy.minimum.at(first_cols, ids, cols)
+    numpy.maximum.at(last_rows, ids, rows)
+    numpy.maximum.at(last_cols, ids, cols)
+    return first_rows, last_rows, first_cols, last_cols
+
+
+def convex_hull_mask(mask):
+
+    # Cells Whose Centers Are Inside The Convex Hull Of The True Cells' Corners
+    rows, cols = numpy.nonzero(mask)
+    hull_mask = numpy.zeros(mask.shape, dtype=bool)
+    if len(rows) == 0:
+        return hull_mask
+
+    # Only The Corners Of The First & Last Cell Of Each Row Can Be On The Hull
+    first_cols = numpy.full(mask.shape[0], mask.shape[1], dtype=numpy.int64)
+    last_cols = numpy.full(mask.shape[0], -1, dtype=numpy.int64)
+    numpy.minimum.at(first_cols, rows, cols)
+    numpy.maximum.at(last_cols, rows, cols)
+    corners = set()
+    for r in numpy.flatnonzero(last_cols >= 0).tolist():
+        for dr in [0, 1]:
+            corners.add((r + dr, int(first_cols[r])))
+            corners.add((r + dr, int(last_cols[r]) + 1))
+    points = sorted(corners)
+
+    # Monotone Chain
+    def cross(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    lower = []
+    for p in points:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], p) <= 0:
+            lower.pop()
+        lower.append(p)
+    upper = []
+    for p in reversed(points):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], p) <= 0:
+            upper.pop()
+        upper.append(p)
+    hull = lower[:-1] + upper[:-1]
+
+    # A Center Is Inside If It's On The Same Side Of Every Hull Edge
+    first_row, last_row = rows.min(), rows.max()
+    first_col, last_col = cols.min(), cols.max()
+    center_rows, center_cols = numpy.mgrid[first_row:last_row + 1, first_col:last_col + 1] + 0.5
+    inside = numpy.ones(center_rows.shape, dtype=bool)
+    for i in range(len(hull)):
+        a = hull[i]
+        b = hull[(i + 1) % len(hull)]
+        inside &= (b[0] - a[0]) * (center_cols - a[1]) - (b[1] - a[1]) * (center_rows - a[0]) >= 0
+    hull_mask[first_row:last_row + 1, first_col:last_col + 1] = inside
+    return hull_mask
+
+
+def trace_rings(mask):
+
+    # Trace The Outlines Of The True Cells As Rings Of Cell Corners (Row, Col)
+    # The Cells Are On The Right Of Every Ring, So Outer Rings Run Clockwise & Holes Counterclockwise
+    # At A Corner Shared By Two Diagonal Cells The Ring Turns Right, Keeping The Regions 4 Connected
+    padded = numpy.pad(mask.astype(bool), 1, 'constant')
+    inner = padded[1:-1, 1:-1]
+    width = mask.shape[1] + 1
+
+    outgoing = {}
+    edges = [
+        [inner & ~padded[:-2, 1:-1], 0, 0, 0],  # Top Edge, East From The Top Left Corner
+        [inner & ~padded[1:-1, 2:], 0, 1, 1],  # Right Edge, South From The Top Right Corner
+        [inner & ~padded[2:, 1:-1], 1, 1, 2],  # Bottom Edge, West From The Bottom Right Corner
+        [inner & ~padded[1:-1, :-2], 1, 0, 3]  # Left Edge, North From The Bottom Left Corner
+    ]
+    for edge_mask, dr, dc, direction in edges:
+        rows, cols = numpy.nonzero(edge_mask)
+        for vertex in ((rows + dr) * width + cols + dc).tolist():
+            outgoing.setdefault(vertex, []).append(direction)
+
+    rings = []
+    while outgoing:
+        start = next(iter(outgoing))
+        first_direction = outgoing[start][0]
+        direction = first_direction
+        vertex = start
+        ring = []
+        while True:
+            directions = outgoing[vertex]
+            directions.remove(direction)
+            if not directions:
+                del outgoing[vertex]
+            vertex += STEP_ROWS[direction] * width + STEP_COLS[direction]
+
+            # Prefer Right, Then Straight, Then Left
+            choices = list(outgoing.get(vertex, []))
+            if vertex == start:
+                choices.append(first_direction)
+            next_direction = None
+            for turn in [1, 0, 3]:
+                if (direction + turn) % 4 in choices:
+                    next_direction = (direction + turn) % 4
+                    break
+            if next_direction != direction:
+                ring.append(divmod(vertex, width))
+            if vertex == start and next_direction == first_direction:
+                break
+            direction = next_direction
+
+        ring.append(ring[0])
+        rings.append(ring)
+    return rings
+
+
+def read_rings(feature_class, box, spatial_ref, field=None):
+
+    # Polygon Rings (Clipped To The Box) & The Field Value Of Every Feature Overlapping The Box (All If box Is None)
+    extent = arcpy.Extent(box[0], box[1], box[2], box[3]) if box is not None else None
+    features = []
+    fields = ['SHAPE@'] + ([field] if field else [])
+    with arcpy.da.SearchCursor(feature_class, fields, spatial_reference=spatial_ref) as cursor:
+        for r in cursor:
+            if r[0] is None or (extent is not None and r[0].extent.disjoint(extent)):
+                continue
+            geom = r[0].clip(extent) if extent is not None else r[0]
+            rings = []
+            for part in geom:
+                ring = []
+                for pnt in part:
+                    if pnt is None:
+                        # Interior Ring Follows
+                        if len(ring) > 2:
+                            rings.append(numpy.array(ring))
+                        ring = []
+                    else:
+                        ring.append([pnt.X, pnt.Y])
+                if len(ring) > 2:
+                    rings.append(numpy.array(ring))
+            if rings:
+                features.append([rings, r[1] if field else None])
+    return features
+
+
+def polygon_mask(rings, x_min, y_max, cell_size, rows, cols):
+
+    # Cells Whose Centers Are Inside The Rings (Even-Odd), One Scanline Per Row
+    mask = numpy.zeros((rows, cols), dtype=bool)
+    x1 = numpy.concatenate([ring[:, 0] for ring in rings])
+    y1 = numpy.concatenate([ring[:, 1] for ring in rings])
+    x2 = numpy.concatenate([numpy.roll(ring[:, 0], -1) for ring in rings])
+    y2 = numpy.concatenate([numpy.roll(ring[:, 1], -1) for ring in rings])
+
+    for r in range(rows):
+        y = y_max - (r + 0.5) * cell_size
+        crosses = (y1 <= y) != (y2 <= y)
+        if not crosses.any():
+            continue
+        xs = numpy.sort(x1[crosses] + (y - y1[crosses]) * (x2[crosses] - x1[crosses]) / (y2[crosses] - y1[crosses]))
+        firsts = numpy.ceil((xs[0::2] - x_min) / cell_size - 0.5).astype(numpy.int64)
+        lasts = numpy.ceil((xs[1::2] - x_min) / cell_size - 0.5).astype(numpy.int64)
+        for first, last in zip(numpy.clip(firsts, 0, cols), numpy.clip(lasts, 0, cols)):
+            mask[r, first:last] = True
+    return mask
+
+
+def rings_to_polygon(rings, x_min, y_max, cell_size, spatial_ref, row_offset=0, col_offset=0):
+
+    # Build A Polygon From Rings Of Cell Corners, With The Grid's Top Left Corner At x_min, y_max
+    parts = arcpy.Array()
+    for ring in rings:
+        parts.add(arcpy.Array([arcpy.Point(x_min + (c + col_offset) * cell_size, y_max - (r + row_offset) * cell_size) for r, c in ring]))
+    return arcpy.Polygon(parts, spatial_ref)
@@ -0,0 +1,249 @@
+# Name: D_Rasterize.py
+#
+# Purpose: In process TIN linear rasterizer for the D05 task cells. LasDatasetToRaster re-reads the LAS dataset and its
+# surface constraints for every cell; this reads the ground/model key points of the cell plus a halo, triangulates them
+# (scipy Delaunay), interpolates linearly onto the cell grid, applies the D03 soft replace polygons (Z_MIN) and masks
+# the grid by the D01 data domain. The tiles are written as tiled GeoTIFFs with a tile index for mosaicking.
+#
+# Every LAS file is read once up front (index_las_points): its ground/model key points that aren't withheld are saved
+# as x, y, z rows sorted by y, so a cell only reads the rows of its y range instead of scanning the whole file.
+#
+# Cells fall back to LasDatasetToRaster when scipy isn't available or the cell has compressed (LAZ) files.
+#
+# Author: jeff8977
+
+from multiprocessing import Pool
+from ngce.pmdm.d.D_Config import *
+from ngce.pmdm.d import D_Grid
+from functools import partial
+import struct
+import numpy
+import arcpy
+import os
+
+try:
+    from scipy.spatial import Delaunay
+    from scipy.interpolate import LinearNDInterpolator
+except ImportError:
+    Delaunay = None
+
+
+NODATA = -3.40282346639e+38
+CHUNK_POINTS = 2000000  # Point Records Read At Once
+
+
+def read_las_points(las_path, point_count, classes, box=None):
+
+    # Points Of The Classes Inside The Box (XMin, YMin, XMax, YMax, All If None), Withheld Points Dropped
+    # Returns x, y, z Arrays Or None If The File Is Compressed
+    with open(las_path, 'rb') as las:
+        header = las.read(227)
+    point_offset = struct.unpack('<I', header[96:100])[0]
+    point_format = struct.unpack('<B', header[104:105])[0]
+    record_length = struct.unpack('<H', header[105:107])[0]
+    scale = struct.unpack('<ddd', header[131:155])
+    offset = struct.unpack('<ddd', header[155:179])
+
+    # LAZ Sets Bit 7 (Or 6) Of The Point Format
+    if point_format & 0xC0:
+        return None
+
+    # Classification Is The Low 5 Bits Of Byte 15 Before Point Format 6, All Of Byte 16 After
+    # Withheld Is Bit 7 Of Byte 15 Before Point Format 6, Bit 2 Of The Classification Flags (Byte 15) After
+    if point_format < 6:
+        class_offset, class_mask, withheld_mask = 15, 0x1F, 0x80
+    else:
+        class_offset, class_mask, withheld_mask = 16, 0xFF, 0x04
+    record = numpy.dtype({'names': ['x', 'y', 'z', 'c', 'f'], 'formats': ['<i4', '<i4', '<i4', 'u1', 'u1'],
+                          'offsets': [0, 4, 8, class_offset, 15], 'itemsize': record_length})
+    count = int(min(point_count, (os.path.getsize(las_path) - point_offset) // record_length))
+    points = numpy.memmap(las_path, dtype=record, mode='r', offset=point_offset, shape=(count,))
+
+    # Box In Stored Integer Coordinates
+    if box is not None:
+        x_min, y_min = (box[0] - offset[0]) / scale[0], (box[1] - offset[1]) / scale[1]
+        x_max, y_max = (box[2] - offset[0]) / scale[0], (box[3] - offset[1]) / scale[1]
+    class_list = numpy.array(classes, dtype=numpy.uint8)
+
+    xs, ys, zs = [], [], []
+    for start in range(0, count, CHUNK_POINTS):
+        chunk = numpy.array(points[start:start + CHUNK_POINTS])
+        keep = numpy.in1d(chunk['c'] & class_mask, class_list) & ((chunk['f'] & withheld_mask) == 0)
+        if box is not None:
+            keep &= (chunk['x'] >= x_min) & (chunk['x'] <= x_max) & (chunk['y'] >= y_min) & (chunk['y'] <= y_max)
+        chunk = chunk[keep]
+        xs.append(chunk['x'] * scale[0] + offset[0])
+        ys.append(chunk['y'] * scale[1] + offset[1])
+        zs.append(chunk['z'] * scale[2] + offset[2])
+    del points
+
+    if not xs:
+        return numpy.zeros(0), numpy.zeros(0), numpy.zeros(0)
+    return numpy.concatenate(xs), numpy.concatenate(ys), numpy.concatenate(zs)
+
+
+def index_las_points(index_dir, classes, las_file):
+
+    # Save The Points Of The Classes As x, y, z Rows Sorted By y, Reading The LAS File Once
+    # las_file Is [Number, Path, Header], Returns [Index Path Or None If The File Is Compressed, Header]
+    number, las_path, header = las_file
+    try:
+        points = read_las_points(las_path, header[0], classes)
+        if points is None:
+            return [None, header]
+        x, y, z = points
+        order = numpy.argsort(y, kind='mergesort')
+        index_path = os.path.join(index_dir, '{0}.npy'.format(number))
+        numpy.save(index_path, numpy.vstack([x[order], y[order], z[order]]))
+        return [index_path, header]
+
+    except Exception as e:
+        print('LAS File Not Indexed: ', las_path)
+        print('Exception: ', e)
+
+    # Cells Over It Fall Back To LasDatasetToRaster
+    return [None, header]
+
+
+def index_las_files(las_files, index_dir, classes, processes):
+
+    print('Indexing LAS Points')
+
+    # Returns [Index Path, Header] Of Every LAS File
+    pool = Pool(processes=processes)
+    indexed = pool.map(partial(index_las_points, index_dir, classes), [[i, las_path, header] for i, (las_path, header) in enumerate(las_files)])
+    pool.close()
+    pool.join()
+
+    print('Indexed LAS Files: ', len([index_path for index_path, header in indexed if index_path is not None]))
+
+    return indexed
+
+
+def read_index_points(index_path, box):
+
+    # Points Of An Indexed File Inside The Box, Only The Rows Of The Box's y Range Are Read
+    points = numpy.load(index_path, mmap_mode='r')
+    first = numpy.searchsorted(points[1], box[1], side='left')
+    last = numpy.searchsorted(points[1], box[3], side='right')
+    rows = numpy.array(points[:, first:last])
+    del points
+    keep = (rows[0] >= box[0]) & (rows[0] <= box[2])
+    return rows[0][keep], rows[1][keep], rows[2][keep]
+
+
+def fallback_raster(las, out_name, box):
+
+    # Same As generate_raster In D05
+    arcpy.env.extent = arcpy.Extent(box[0], box[1], box[2], box[3])
+    arcpy.LasDatasetToRaster_conversion(
+        las,
+        out_name,
+        'ELEVATION',
+        'TRIANGULATION LINEAR NO_THINNING MINIMUM 0',
+        'FLOAT',
+        'CELLSIZE',
+        D05_CELL_SIZE
+    )
+
+
+def rasterize_task(las, indexed_files, data_domain, replace_polygons, path, spatial_ref_string, proc_dict):
+
+    task_id = str(proc_dict[0])
+    box = proc_dict[1]
+    out_name = os.path.join(path, task_id + '.tif')
+
+    try:
+        spatial_ref = arcpy.SpatialReference()
+        spatial_ref.loadFromString(spatial_ref_string)
+
+        # Grid Snapped To The Cell Size
+        cell_size = float(D05_CELL_SIZE)
+        x_min = numpy.floor(box[0] / cell_size) * cell_size
+        y_min = numpy.floor(box[1] / cell_size) * cell_size
+        cols = int(numpy.ceil((box[2] - x_min) / cell_size))
+        rows = int(numpy.ceil((box[3] - y_min) / cell_size))
+        y_max = y_min + rows * cell_size
+
+        # Ground & Model Key Points Of The Cell Plus The Halo
+        halo = [x_min - D05_HALO, y_min - D05_HALO, x_min + cols * cell_size + D05_HALO, y_max + D05_HALO]
+        if Delaunay is None:
+            fallback_raster(las, out_name, box)
+            return out_name
+        index_paths = [index_path for index_path, header in indexed_files
+                       if header[1] <= halo[2] and header[3] >= halo[0] and header[2] <= halo[3] and header[4] >= halo[1]]
+        if any(index_path is None for index_path in index_paths):
+            fallback_raster(las, out_name, box)
+            return out_name
+        points = [read_index_points(index_path, halo) for index_path in index_paths]
+
+        if not points or sum(len(p[0]) for p in points) < 3:
+            print('Task Has No Ground Points: ', task_id)
+            return None
+        x = numpy.concatenate([p[0] for p in points])
+        y = numpy.concatenate([p[1] for p in points])
+        z = numpy.concatenate([p[2] for p in points])
+
+        # Keep The Minimum Z Of Points Sharing An XY
+        order = numpy.lexsort((z, y, x))
+        x, y, z = x[order], y[order], z[order]
+        first = numpy.ones(len(x), dtype=bool)
+        first[1:] = (x[1:] != x[:-1]) | (y[1:] != y[:-1])
+        x, y, z = x[first], y[first], z[first]
+
+        # Linear Interpolation On The Triangulation At The Cell Centers
+        triangulation = Delaunay(numpy.column_stack([x, y]))
+        center_x = x_min + (numpy.arange(cols) + 0.5) * cell_size
+        center_y = y_max - (numpy.arange(rows) + 0.5) * cell_size
+        grid_x, grid_y = numpy.meshgrid(center_x, center_y)
+        values = LinearNDInterpolator(triangulation, z, fill_value=numpy.nan)(grid_x, grid_y).astype(numpy.float32)
+
+        # D03 Soft Replace Polygons Are Flat At Z_MIN
+        if replace_polygons is not None:
+            for rings, z_min in D_Grid.read_rings(replace_polygons, halo, spatial_ref, 'Z_MIN'):
+                if z_min is not None:
+                    values[D_Grid.polygon_mask(rings, x_min, y_max, cell_size, rows, cols)] = z_min
+
+        # D01 Data Domain As Soft Clip
+        if data_domain is not None:
+            domain = numpy.zeros((rows, cols), dtype=bool)
+            for rings, value in D_Grid.read_rings(data_domain, halo, spatial_ref):
+                domain |= D_Grid.polygon_mask(rings, x_min, y_max, cell_size, rows, cols)
+            values[~domain] = numpy.nan
+
+        if numpy.isnan(values).all():
+            print('Task Outside Data Domain: ', task_id)
+            return None
+
+        # Write Tiled GeoTIFF
+        values[numpy.isnan(values)] = NODATA
+        arcpy.env.tileSize = '{0} {0}'.format(D05_TIFF_TILE_SIZE)
+        arcpy.env.compression = D05_TIFF_COMPRESSION
+        raster = arcpy.NumPyArrayToRaster(values, arcpy.Point(x_min, y_min), cell_size, cell_size, NODATA)
+        raster.save(out_name)
+        arcpy.DefineProjection_management(out_name, spatial_ref)
+
+        return out_name
+
+    except Exception as e:
+        print('Task Dropped: ', task_id)
+        print('Exception: ', e)
+
+    return None
+
+
+def write_tile_index(raster_paths, out_path, spatial_ref):
+
+    print('Writing Tile Index')
+
+    # Footprint & Path Of Every Tile
+    out_folder, out_name = os.path.split(out_path)
+    arcpy.CreateFeatureclass_management(out_folder, out_name, 'POLYGON', spatial_reference=spatial_ref)
+    arcpy.AddField_management(out_path, 'PATH', 'TEXT', field_length=254)
+    with arcpy.da.InsertCursor(out_path, ['SHAPE@', 'PATH']) as cursor:
+        for raster_path in sorted(raster_paths):
+            ext = arcpy.Describe(raster_path).extent
+            corners = [[ext.XMin, ext.YMin], [ext.XMin, ext.YMax], [ext.XMax, ext.YMax], [ext.XMax, ext.YMin], [ext.XMin, ext.YMin]]
+            cursor.insertRow([arcpy.Polygon(arcpy.Array([arcpy.Point(x, y) for x, y in corners]), spatial_ref), raster_path])
+
+    return out_path
@@ -0,0 +1,175 @@
+# Name: D_Tiles.py
+#
+# Purpose: Task extents for the D scripts sized by point count instead of a fixed fishnet. The point count and extent
+# of every LAS file come from its public header (LAS and LAZ keep it uncompressed), the points of a file are taken as
+# spread evenly over its extent, and a quadtree over the project extent splits the cells until each one holds about
+# the same number of points. A cell is interior when the cells around it cover its whole neighborhood (replaces
+# the fishnet's COUNT_src_ == 8 polygon neighbor count).
+#
+# Author: jeff8977
+
+from ngce.pmdm.d.D_Config import *
+import struct
+import numpy
+import arcpy
+import os
+
+
+LAS_EXTENSIONS = ['.las', '.laz']
+HEADER_SIZE = 375  # LAS 1.4 Public Header
+
+
+def read_las_header(las_path):
+
+    # Point Count & Extent From The LAS Public Header
+    # Returns [Point Count, XMin, YMin, XMax, YMax] Or None If It Isn't A LAS File
+    with open(las_path, 'rb') as las:
+        header = las.read(HEADER_SIZE)
+
+    if len(header) < 227 or header[:4] != b'LASF':
+        return None
+
+    version_minor = struct.unpack('<B', header[25:26])[0]
+    point_count = struct.unpack('<I', header[107:111])[0]
+    if version_minor >= 4 and len(header) >= 255:
+        # 64 Bit Count, The Legacy Count Is 0 Over 2^32 Points Or For Point Formats 6-10
+        point_count = max(point_count, struct.unpack('<Q', header[247:255])[0])
+
+    x_max, x_min, y_max, y_min = struct.unpack('<dddd', header[179:211])
+    return [point_count, x_min, y_min, x_max, y_max]
+
+
+def collect_las_files(las_dir):
+
+    print('Reading LAS Headers')
+
+    # Returns [Path, Header] Of Every LAS File With Points
+    las_files = []
+    for root, dirs, files in os.walk(las_dir):
+        for f in files:
+            if os.path.splitext(f)[1].lower() in LAS_EXTENSIONS:
+                las_path = os.path.join(root, f)
+                header = read_las_header(las_path)
+                if header is not None and header[0] > 0:
+                    las_files.append([las_path, header])
+
+    print('LAS Files: ', len(las_files))
+
+    return las_files
+
+
+def collect_las_headers(las_dir):
+
+    headers = [header for las_path, header in collect_las_files(las_dir)]
+    return numpy.array(headers, dtype=numpy.float64).reshape(-1, 5)
+
+
+def estimate_points(headers, x_min, y_min, x_max, y_max):
+
+    # Points Of Every File Inside The Box, Spread Evenly Over The File Extent
+    widths = numpy.maximum(headers[:, 3] - headers[:, 1], 1e-9)
+    heights = numpy.maximum(headers[:, 4] - headers[:, 2], 1e-9)
+    overlap_x = numpy.clip(numpy.minimum(headers[:, 3], x_max) - numpy.maximum(headers[:, 1], x_min), 0, None)
+    overlap_y = numpy.clip(numpy.minimum(headers[:, 4], y_max) - numpy.maximum(headers[:, 2], y_min), 0, None)
+    return float((headers[:, 0] * numpy.minimum(overlap_x / widths, 1) * numpy.minimum(overlap_y / heights, 1)).sum())
+
+
+def build_quadtree(headers, task_count, max_depth=D_TILE_MAX_DEPTH, max_points=None):
+
+    # Split The Project Extent Until Each Cell Holds About Total Points / task_count (At Most max_points)
+    # Returns The Extent & The Leaf Cells As [Depth, Row, Col, Points] (Row 0 At The Top)
+    extent = [headers[:, 1].min(), headers[:, 2].min(), headers[:, 3].max(), headers[:, 4].max()]
+    target = headers[:, 0].sum() / max(1, task_count)
+    if max_points is not None:
+        target = min(target, max_points)
+    width = extent[2] - extent[0]
+    height = extent[3] - extent[1]
+
+    leaves = []
+    cells = [[0, 0, 0]]
+    while cells:
+        depth, row, col = cells.pop()
+        cell_width = width / 2 ** depth
+        cell_height = height / 2 ** depth
+        x_min = extent[0] + col * cell_width
+        y_max = extent[3] - row * cell_height
+        points = estimate_points(headers, x_min, y_max - cell_height, x_min + cell_width, y_max)
+        if points <= 0:
+            continue
+        if points > target and depth < max_depth:
+            for dr in [0, 1]:
+                for dc in [0, 1]:
+                    cells.append([depth + 1, row * 2 + dr, col * 2 + dc])
+        else:
+            leaves.append([depth, row, col, points])
+
+    return extent, leaves
+
+
+def tag_interior(leaves, max_depth=D_TILE_MAX_DEPTH):
+
+    # Rasterize The Leaves On The Finest Quadtree Grid, A Leaf Is Interior If Every Grid Cell Around It Is Covered
+    size = 2 ** max_depth
+    covered = numpy.zeros((size + 2, size + 2), dtype=bool)
+    spans = []
+    for depth, row, col, points in leaves:
+        scale = 2 ** (max_depth - depth)
+        r0, c0 = row * scale + 1, col * scale + 1
+        spans.append([r0, r0 + scale, c0, c0 + scale])
+        covered[r0:r0 + scale, c0:c0 + scale] = True
+
+    return [bool(covered[r0 - 1:r1 + 1, c0 - 1:c1 + 1].all()) for r0, r1, c0, c1 in spans]
+
+
+def collect_task_extents(lasd, las_dir, process_count, buffer_meters, clip_to_extent=False, max_points=None):
+
+    print('Collecting Adaptive Task Extents')
+
+    headers = collect_las_headers(las_dir)
+    if len(headers) == 0:
+        raise Exception('No LAS Files Found In: {0}'.format(las_dir))
+
+    extent, leaves = build_quadtree(headers, process_count * D_TASKS_PER_PROCESS, max_points=max_points)
+    interior = tag_interior(leaves)
+
+    # Buffer The Cells To Ensure Task Extents Overlap
+    buffer_units = buffer_meters / arcpy.Describe(lasd).spatialReference.metersPerUnit
+    width = extent[2] - extent[0]
+    height = extent[3] - extent[1]
+
+    # Populate Dictionary With Cell Extents
+    # Append Underscore To Interior Cells
+    ext_dict = {}
+    for i, (depth, row, col, points) in enumerate(leaves):
+        cell_width = width / 2 ** depth
+        cell_height = height / 2 ** depth
+        x_min = extent[0] + col * cell_width
+        y_max = extent[3] - row * cell_height
+        box = [x_min - buffer_units, y_max - cell_height - buffer_units, x_min + cell_width + buffer_units, y_max + buffer_units]
+        if clip_to_extent:
+            # Exclude The Outer Buffers
+            box = [max(box[0], extent[0]), max(box[1], extent[1]), min(box[2], extent[2]), min(box[3], extent[3])]
+        if interior[i]:
+            id = ''.join((str(i), '_'))
+        else:
+            id = str(i)
+        ext_dict[id] = box
+
+    print('Tasks: ', len(ext_dict))
+
+    return ext_dict
+
+
+def write_task_polygons(ext_dict, out_path, spatial_ref):
+
+    # Write The Task Extents As Polygons (Like A Buffered Fishnet)
+    out_folder, out_name = os.path.split(out_path)
+    arcpy.CreateFeatureclass_management(out_folder, out_name, 'POLYGON', spatial_reference=spatial_ref)
+    arcpy.AddField_management(out_path, 'TASK_ID', 'TEXT', field_length=20)
+    with arcpy.da.InsertCursor(out_path, ['SHAPE@', 'TASK_ID']) as cursor:
+        for id, box in sorted(ext_dict.items()):
+            XMin, YMin, XMax, YMax = box
+            corners = [[XMin, YMin], [XMin, YMax], [XMax, YMax], [XMax, YMin], [XMin, YMin]]
+            cursor.insertRow([arcpy.Polygon(arcpy.Array([arcpy.Point(x, y) for x, y in corners]), spatial_ref), id])
+
+    return out_path
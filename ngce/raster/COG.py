@@ -0,0 +1,156 @@
+'''
+Created on Oct 19, 2026
+
+@author: eric5946
+
+Cloud optimized GeoTIFF (COG) writer for the DERIVED and PUBLISHED rasters.
+
+A COG has internal tiles, internal overviews and the image file directory (IFD)
+at the start of the file, so a service or an overview build only reads the
+bytes it needs for a request.
+
+GDAL (osgeo) is used when it is available. GDAL 3.1+ has a COG driver, older
+versions write a tiled GeoTIFF with the overviews copied in (same layout).
+Without GDAL the raster is re-written by arcpy as a tiled GeoTIFF, but the
+overviews are left out since arcpy only writes them to an external .ovr file.
+'''
+import arcpy
+from datetime import datetime
+import os
+
+from ngce.Utility import deleteFileIfExists, doTime
+from ngce.raster import RasterConfig
+
+try:
+    from osgeo import gdal
+except ImportError:
+    gdal = None
+
+
+def isCOGPath(raster_path):
+    return os.path.splitext(raster_path)[1].lower() in [".tif", ".tiff"]
+
+def isGDALAvailable():
+    return gdal is not None
+
+def isCOGDriverAvailable():
+    return gdal is not None and gdal.GetDriverByName("COG") is not None
+
+def isFloatRaster(raster_path):
+    result = True
+    dataset = gdal.Open(raster_path)
+    try:
+        result = dataset.GetRasterBand(1).DataType in [gdal.GDT_Float32, gdal.GDT_Float64]
+    finally:
+        dataset = None
+    return result
+
+'''
+--------------------------------------------------------------------------------
+Returns the compression creation options for the COG or GTiff driver
+--------------------------------------------------------------------------------
+'''
+def getCompressionOptions(is_float, is_cog_driver):
+    compression = RasterConfig.COG_COMPRESSION.upper()
+    options = []
+    if compression.startswith("LERC"):
+        options.append("COMPRESS={}".format(compression))
+        options.append("MAX_Z_ERROR={}".format(RasterConfig.COG_MAX_Z_ERROR))
+    else:
+        options.append("COMPRESS={}".format(compression))
+        # Floating point predictor for elevation, horizontal differencing for integer (intensity)
+        if is_cog_driver:
+            options.append("PREDICTOR=YES")
+        else:
+            options.append("PREDICTOR={}".format(3 if is_float else 2))
+
+    if compression.endswith("DEFLATE"):
+        options.append("{}={}".format("LEVEL" if is_cog_driver else "ZLEVEL", RasterConfig.COG_LEVEL))
+    elif compression.endswith("ZSTD"):
+        options.append("{}={}".format("LEVEL" if is_cog_driver else "ZSTD_LEVEL", RasterConfig.COG_LEVEL))
+
+    return options
+
+def writeGDALCOG(in_raster_path, out_raster_path):
+    gdal.UseExceptions()
+    is_float = isFloatRaster(in_raster_path)
+    if isCOGDriverAvailable():
+        options = ["BLOCKSIZE={}".format(RasterConfig.COG_BLOCK_SIZE),
+                   "RESAMPLING={}".format(RasterConfig.COG_RESAMPLING),
+                   "OVERVIEWS=AUTO",
+                   "NUM_THREADS=ALL_CPUS",
+                   "BIGTIFF=IF_SAFER"] + getCompressionOptions(is_float, True)
+        gdal.Translate(out_raster_path, in_raster_path, format="COG", creationOptions=options)
+    else:
+        # Build the overviews on a tiled copy, then copy it again with the overviews written first
+        temp_raster_path = "{}_ovr{}".format(*os.path.splitext(out_raster_path))
+        tile_options = ["TILED=YES",
+                        "BLOCKXSIZE={}".format(RasterConfig.COG_BLOCK_SIZE),
+                        "BLOCKYSIZE={}".format(RasterConfig.COG_BLOCK_SIZE),
+                        "BIGTIFF=IF_SAFER"] + getCompressionOptions(is_float, False)
+        gdal.Translate(temp_raster_path, in_raster_path, format="GTiff", creationOptions=tile_options)
+
+        dataset = gdal.Open(temp_raster_path, gdal.GA_Update)
+        try:
+            levels = []
+            level = 2
+            while max(dataset.RasterXSize, dataset.RasterYSize) / level >= RasterConfig.COG_BLOCK_SIZE:
+                levels.append(level)
+                level = level * 2
+            gdal.SetConfigOption("COMPRESS_OVERVIEW", RasterConfig.COG_COMPRESSION.upper())
+            if len(levels) > 0:
+                dataset.BuildOverviews(RasterConfig.COG_RESAMPLING.upper(), levels)
+        finally:
+            dataset = None
+
+        gdal.Translate(out_raster_path, temp_raster_path, format="GTiff", creationOptions=tile_options + ["COPY_SRC_OVERVIEWS=YES"])
+        deleteFileIfExists(temp_raster_path, True)
+
+def writeArcpyTiledTIFF(in_raster_path, out_raster_path):
+    tile_size = arcpy.env.tileSize
+    compression = arcpy.env.compression
+    try:
+        arcpy.env.tileSize = RasterConfig.TILE_SIZE_512
+        arcpy.env.compression = RasterConfig.RASTER_COMPRESSION_ENV
+        arcpy.CopyRaster_management(in_raster=in_raster_path, out_rasterdataset=out_raster_path, config_keyword="", background_value="", nodata_value="", onebit_to_eightbit="NONE", colormap_to_RGB="NONE", pixel_type="", scale_pixel_value="NONE", RGB_to_Colormap="NONE", format="TIFF", transform="NONE")
+    finally:
+        arcpy.env.tileSize = tile_size
+        arcpy.env.compression = compression
+
+'''
+--------------------------------------------------------------------------------
+Writes in_raster_path to out_raster_path as a cloud optimized GeoTIFF
+--------------------------------------------------------------------------------
+'''
+def writeCOG(in_raster_path, out_raster_path):
+    a = datetime.now()
+    deleteFileIfExists(out_raster_path, True)
+    if isGDALAvailable():
+        writeGDALCOG(in_raster_path, out_raster_path)
+        doTime(a, "\tWrote COG {}".format(out_raster_path))
+    else:
+        writeArcpyTiledTIFF(in_raster_path, out_raster_path)
+        doTime(a, "\tGDAL not available, wrote tiled TIFF without internal overviews {}".format(out_raster_path))
+
+'''
+--------------------------------------------------------------------------------
+Re-writes a .tif raster in place as a cloud optimized GeoTIFF
+Other formats are left as they are
+--------------------------------------------------------------------------------
+'''
+def convertToCOG(raster_path):
+    if not isCOGPath(raster_path):
+        arcpy.AddMessage("\tNot a TIFF, leaving raster as is: {}".format(raster_path))
+    else:
+        raster_folder, raster_name = os.path.split(raster_path)
+        temp_raster_path = os.path.join(raster_folder, "COG_{}".format(raster_name))
+        deleteFileIfExists(temp_raster_path, True)
+        arcpy.Rename_management(raster_path, temp_raster_path)
+        try:
+            writeCOG(temp_raster_path, raster_path)
+        except:
+            # Put the original back so the raster isn't lost
+            deleteFileIfExists(raster_path, True)
+            arcpy.Rename_management(temp_raster_path, raster_path)
+            raise
+        deleteFileIfExists(temp_raster_path, True)
@@ -0,0 +1,220 @@
+'''
+Created on Oct 19, 2026
+
+@author: eric5946
+
+Compression benchmark for the derived rasters.
+
+Writes each sample tile (DTM, DSM, intensity, ...) with every codec and level
+below and reports:
+    write MB/s  = uncompressed MB / time to write the tile
+    read MB/s   = uncompressed MB / time to read the whole tile back
+    ratio       = uncompressed bytes / file size
+    max error   = largest absolute difference from the source (0 for lossless codecs)
+
+GDAL codecs (deflate/ZSTD with predictor, LERC) are only run if GDAL (osgeo)
+is available. The arcpy codecs are the values that can be used for
+RasterConfig.RASTER_COMPRESSION, the GDAL codecs for RasterConfig.COG_COMPRESSION.
+
+Usage:
+    CodecBenchmark.py <comma separated list of sample tiles> <output folder>
+The results are written to <output folder>/CodecBenchmark.csv
+'''
+import arcpy
+import csv
+from datetime import datetime
+import os
+import sys
+import time
+
+import numpy
+
+from ngce.Utility import deleteFileIfExists, doTime
+from ngce.raster import RasterConfig
+
+try:
+    from osgeo import gdal
+except ImportError:
+    gdal = None
+
+
+REPEAT = 3  # Times each read is repeated, the fastest is reported
+MB = 1024.0 * 1024.0
+
+# [name, GDAL GTiff creation options], {predictor} is 3 for floating point and 2 for integer tiles
+GDAL_CODECS = [
+               ["DEFLATE_1_PRED", ["COMPRESS=DEFLATE", "ZLEVEL=1", "PREDICTOR={predictor}"]],
+               ["DEFLATE_6_PRED", ["COMPRESS=DEFLATE", "ZLEVEL=6", "PREDICTOR={predictor}"]],
+               ["DEFLATE_9_PRED", ["COMPRESS=DEFLATE", "ZLEVEL=9", "PREDICTOR={predictor}"]],
+               ["ZSTD_1_PRED", ["COMPRESS=ZSTD", "ZSTD_LEVEL=1", "PREDICTOR={predictor}"]],
+               ["ZSTD_9_PRED", ["COMPRESS=ZSTD", "ZSTD_LEVEL=9", "PREDICTOR={predictor}"]],
+               ["ZSTD_15_PRED", ["COMPRESS=ZSTD", "ZSTD_LEVEL=15", "PREDICTOR={predictor}"]],
+               ["LERC_0", ["COMPRESS=LERC", "MAX_Z_ERROR=0"]],
+               ["LERC_0.01", ["COMPRESS=LERC", "MAX_Z_ERROR=0.01"]],
+               ["LERC_DEFLATE_0.01", ["COMPRESS=LERC_DEFLATE", "MAX_Z_ERROR=0.01"]],
+               ["LERC_ZSTD_0.01", ["COMPRESS=LERC_ZSTD", "MAX_Z_ERROR=0.01"]]
+               ]
+
+# arcpy.env.compression values
+ARCPY_CODECS = ["NONE", "LZ77", "LZW", "LERC 0", "LERC 0.01"]
+
+RESULT_FIELDS = ["tile", "library", "codec", "pixel_type", "uncomp_mb", "file_mb", "ratio", "write_mb_s", "read_mb_s", "max_error"]
+
+
+def getMaxError(source, result, nodata):
+    mask = numpy.isfinite(source)
+    if nodata is not None:
+        mask = mask & (source != nodata)
+    if not numpy.any(mask):
+        return 0
+    return float(numpy.max(numpy.abs(source[mask].astype(numpy.float64) - result[mask].astype(numpy.float64))))
+
+def getFileSize(raster_path):
+    # TIFF plus any side car files (.aux.xml, .ovr, ...)
+    folder, name = os.path.split(raster_path)
+    return sum([os.path.getsize(os.path.join(folder, f)) for f in os.listdir(folder) if f.startswith(name)])
+
+def getResult(tile_path, library, codec, pixel_type, uncomp_bytes, file_bytes, write_seconds, read_seconds, max_error):
+    return {"tile": os.path.split(tile_path)[1],
+            "library": library,
+            "codec": codec,
+            "pixel_type": pixel_type,
+            "uncomp_mb": round(uncomp_bytes / MB, 3),
+            "file_mb": round(file_bytes / MB, 3),
+            "ratio": round(float(uncomp_bytes) / max(file_bytes, 1), 3),
+            "write_mb_s": round(uncomp_bytes / MB / max(write_seconds, 0.000001), 3),
+            "read_mb_s": round(uncomp_bytes / MB / max(read_seconds, 0.000001), 3),
+            "max_error": max_error}
+
+'''
+--------------------------------------------------------------------------------
+Benchmarks the GDAL codecs on one tile. The tile is loaded into memory first
+so the write time only includes the compression and the disk write.
+--------------------------------------------------------------------------------
+'''
+def benchmarkGDAL(tile_path, out_folder):
+    results = []
+    gdal.UseExceptions()
+    source_dataset = gdal.Translate("", tile_path, format="MEM")
+    source_band = source_dataset.GetRasterBand(1)
+    source = source_band.ReadAsArray()
+    nodata = source_band.GetNoDataValue()
+    is_float = source_band.DataType in [gdal.GDT_Float32, gdal.GDT_Float64]
+    pixel_type = gdal.GetDataTypeName(source_band.DataType)
+
+    for codec, options in GDAL_CODECS:
+        out_path = os.path.join(out_folder, "GDAL_{}_{}".format(codec, os.path.split(tile_path)[1]))
+        deleteFileIfExists(out_path, True)
+        options = [option.format(predictor=(3 if is_float else 2)) for option in options]
+        try:
+            start = time.time()
+            gdal.Translate(out_path, source_dataset, format="GTiff", creationOptions=["TILED=YES", "BLOCKXSIZE={}".format(RasterConfig.COG_BLOCK_SIZE), "BLOCKYSIZE={}".format(RasterConfig.COG_BLOCK_SIZE)] + options)
+            write_seconds = time.time() - start
+
+            read_seconds = None
+            result = None
+            for i in range(0, REPEAT):  # @UnusedVariable
+                start = time.time()
+                dataset = gdal.Open(out_path)
+                result = dataset.GetRasterBand(1).ReadAsArray()
+                dataset = None
+                read_seconds = min(read_seconds, time.time() - start) if read_seconds is not None else time.time() - start
+
+            results.append(getResult(tile_path, "GDAL", codec, pixel_type, source.nbytes, getFileSize(out_path), write_seconds, read_seconds, getMaxError(source, result, nodata)))
+        except Exception as e:
+            arcpy.AddWarning("WARNING: GDAL codec {} failed on {} (may not be in this GDAL build): {}".format(codec, tile_path, e))
+        deleteFileIfExists(out_path, True)
+
+    source_dataset = None
+    return results
+
+def readArcpyRaster(raster_path):
+    raster = arcpy.Raster(raster_path)
+    nodata = raster.noDataValue
+    if nodata is None:
+        values = arcpy.RasterToNumPyArray(raster)
+    else:
+        values = arcpy.RasterToNumPyArray(raster, nodata_to_value=nodata)
+    del raster
+    return values, nodata
+
+'''
+--------------------------------------------------------------------------------
+Benchmarks the arcpy.env.compression codecs on one tile using CopyRaster
+--------------------------------------------------------------------------------
+'''
+def benchmarkArcpy(tile_path, out_folder):
+    results = []
+    source, nodata = readArcpyRaster(tile_path)
+    pixel_type = str(source.dtype)
+
+    compression = arcpy.env.compression
+    tile_size = arcpy.env.tileSize
+    try:
+        arcpy.env.tileSize = RasterConfig.TILE_SIZE_512
+        for codec in ARCPY_CODECS:
+            out_path = os.path.join(out_folder, "ARCPY_{}_{}".format(codec.replace(" ", "_"), os.path.split(tile_path)[1]))
+            deleteFileIfExists(out_path, True)
+            try:
+                arcpy.env.compression = codec
+                start = time.time()
+                arcpy.CopyRaster_management(in_raster=tile_path, out_rasterdataset=out_path, format="TIFF")
+                write_seconds = time.time() - start
+
+                read_seconds = None
+                result = None
+                for i in range(0, REPEAT):  # @UnusedVariable
+                    start = time.time()
+                    result = readArcpyRaster(out_path)[0]
+                    read_seconds = min(read_seconds, time.time() - start) if read_seconds is not None else time.time() - start
+
+                results.append(getResult(tile_path, "ARCPY", codec, pixel_type, source.nbytes, getFileSize(out_path), write_seconds, read_seconds, getMaxError(source, result, nodata)))
+            except Exception as e:
+                arcpy.AddWarning("WARNING: arcpy codec {} failed on {}: {}".format(codec, tile_path, e))
+            deleteFileIfExists(out_path, True)
+    finally:
+        arcpy.env.compression = compression
+        arcpy.env.tileSize = tile_size
+
+    return results
+
+def writeResults(results, out_folder):
+    result_path = os.path.join(out_folder, "CodecBenchmark.csv")
+    result_file = open(result_path, 'wb')
+    try:
+        writer = csv.DictWriter(result_file, RESULT_FIELDS)
+        writer.writeheader()
+        for result in results:
+            writer.writerow(result)
+    finally:
+        result_file.close()
+    return result_path
+
+def runBenchmark(tile_paths, out_folder):
+    a = datetime.now()
+    if not os.path.exists(out_folder):
+        os.makedirs(out_folder)
+
+    results = []
+    for tile_path in tile_paths:
+        aa = datetime.now()
+        if gdal is not None:
+            results = results + benchmarkGDAL(tile_path, out_folder)
+        else:
+            arcpy.AddMessage("GDAL not available, only running the arcpy codecs")
+        results = results + benchmarkArcpy(tile_path, out_folder)
+        doTime(aa, "Benchmarked {}".format(tile_path))
+
+    for result in results:
+        arcpy.AddMessage("{tile} {library} {codec}: ratio {ratio} write {write_mb_s} MB/s read {read_mb_s} MB/s max error {max_error}".format(**result))
+
+    result_path = writeResults(results, out_folder)
+    doTime(a, "Wrote codec benchmark results to {}".format(result_path))
+    return results
+
+
+if __name__ == '__main__':
+    tile_paths = str(sys.argv[1]).split(",")
+    out_folder = sys.argv[2]
+
+    runBenchmark(tile_paths, out_folder)
@@ -0,0 +1,229 @@
+'''
+Created on Oct 19, 2026
+
+@author: eric5946
+
+Materialized height models and canopy density.
+
+The height models and canopy density are normally served through raster
+function chains, so every request re-calculates them from the source mosaics:
+    DHM (height above ground)       DSM - DTM, NoData below HEIGHT_MIN
+    DCM (height above last return)  DSM - DLM, NoData below HEIGHT_MIN
+    canopy density                  100 - (100 * LAST point count / ALL point count),
+                                    NoData outside CANOPY_DENSITY_MIN..CANOPY_DENSITY_MAX
+(same as Digital_Height_Model_1.rft.xml and Canopy_Density.rft.xml)
+
+This module calculates them once per tile with numpy across a process pool and
+writes compressed tiled TIFFs with statistics. The point count tiles are
+matched by name. The lower surface of a height tile is read over the upper
+tile's extent from a VirtualMosaic of the lower tiles, so the tiles don't have
+to share names or edges, but they have to be on the same cell size.
+'''
+import arcpy
+from datetime import datetime
+from functools import partial
+from multiprocessing import Pool, cpu_count
+import os
+
+import numpy
+
+from ngce.Utility import doTime
+from ngce.folders.FoldersConfig import ALL, LAST
+from ngce.raster import RasterConfig, VirtualMosaic
+
+
+'''
+--------------------------------------------------------------------------------
+Height of the upper surface above the lower surface. Heights below min_height
+and cells that are NaN in either surface are NaN.
+--------------------------------------------------------------------------------
+'''
+def computeHeight(upper_values, lower_values, min_height=RasterConfig.HEIGHT_MIN):
+    height = upper_values - lower_values
+    height[~(height >= min_height)] = numpy.nan
+    return height
+
+
+'''
+--------------------------------------------------------------------------------
+Percent of the points that aren't last returns (bounced off the canopy).
+Values near 100 mean dense canopy, near 0 open ground.
+--------------------------------------------------------------------------------
+'''
+def computeCanopyDensity(last_values, all_values, min_density=RasterConfig.CANOPY_DENSITY_MIN, max_density=RasterConfig.CANOPY_DENSITY_MAX):
+    density = numpy.full(all_values.shape, numpy.nan, dtype=numpy.float64)
+    has_points = all_values > 0
+    # Integer divide like the raster function
+    density[has_points] = 100 - numpy.floor(last_values[has_points] * 100 / all_values[has_points])
+    density[~((density >= min_density) & (density <= max_density))] = numpy.nan
+    return density
+
+
+'''
+--------------------------------------------------------------------------------
+Reads a single band raster as float64 with NaN for NoData.
+If like_raster is given the values are read over its extent (the rasters have
+to have the same cell size). Returns values, raster
+--------------------------------------------------------------------------------
+'''
+def readRaster(raster_path, like_raster=None):
+    raster = arcpy.Raster(raster_path)
+    nodata = raster.noDataValue
+    if like_raster is None:
+        values = arcpy.RasterToNumPyArray(raster)
+    elif nodata is None:
+        values = arcpy.RasterToNumPyArray(raster, like_raster.extent.lowerLeft, like_raster.width, like_raster.height)
+    else:
+        # Cells outside the raster are NoData
+        values = arcpy.RasterToNumPyArray(raster, like_raster.extent.lowerLeft, like_raster.width, like_raster.height, nodata)
+    values = values.astype(numpy.float64)
+    if nodata is not None:
+        values[values == nodata] = numpy.nan
+    return values, raster
+
+
+def isSameTileCellSize(raster, tile):
+    return abs(raster.meanCellWidth - tile[VirtualMosaic.CELL_WIDTH]) < raster.meanCellWidth * 0.001 and \
+        abs(raster.meanCellHeight - tile[VirtualMosaic.CELL_HEIGHT]) < raster.meanCellHeight * 0.001
+
+
+'''
+--------------------------------------------------------------------------------
+Writes the values on the grid of like_raster as a compressed tiled TIFF with
+statistics. NaN is written as NoData.
+--------------------------------------------------------------------------------
+'''
+def writeRaster(values, like_raster, out_path, nodata=float(RasterConfig.NODATA_DEFAULT)):
+    compression = arcpy.env.compression
+    tile_size = arcpy.env.tileSize
+    try:
+        arcpy.env.compression = RasterConfig.RASTER_COMPRESSION_ENV
+        arcpy.env.tileSize = RasterConfig.TILE_SIZE_512
+        values = values.astype(numpy.float32)
+        values[~numpy.isfinite(values)] = nodata
+        out_raster = arcpy.NumPyArrayToRaster(values, like_raster.extent.lowerLeft, like_raster.meanCellWidth, like_raster.meanCellHeight, nodata)
+        out_raster.save(out_path)
+        del out_raster
+    finally:
+        arcpy.env.compression = compression
+        arcpy.env.tileSize = tile_size
+
+    arcpy.DefineProjection_management(out_path, like_raster.spatialReference)
+    arcpy.SetRasterProperties_management(in_raster=out_path, nodata="1 {}".format(nodata))
+    arcpy.CalculateStatistics_management(in_raster_dataset=out_path, x_skip_factor="1", y_skip_factor="1", ignore_values="", skip_existing="OVERWRITE")
+
+
+'''
+--------------------------------------------------------------------------------
+Process pool task: writes the height of one upper tile over the lower surface
+read from the lower_mosaic (VirtualMosaic) across the lower tiles under it
+Returns the output path or None if it wasn't created
+--------------------------------------------------------------------------------
+'''
+def createHeightTile(upper_folder, lower_mosaic, out_folder, tile_file):
+    out_path = os.path.join(out_folder, tile_file)
+    if os.path.exists(out_path):
+        return out_path
+
+    a = datetime.now()
+    upper_raster = arcpy.Raster(os.path.join(upper_folder, tile_file))
+    extent = upper_raster.extent
+    bbox = [extent.XMin, extent.YMin, extent.XMax, extent.YMax]
+    lower_tiles = lower_mosaic.getTiles(bbox)
+    if len(lower_tiles) <= 0:
+        arcpy.AddWarning("WARNING: No lower surface for height tile, skipping {}".format(out_path))
+        return None
+    if not all([isSameTileCellSize(upper_raster, tile) for tile in lower_tiles]):
+        arcpy.AddWarning("WARNING: Cell sizes don't match, skipping height tile {}".format(out_path))
+        return None
+    upper_values = readRaster(upper_raster.catalogPath)[0]
+    lower_values = lower_mosaic.read(bbox, upper_raster.meanCellWidth).astype(numpy.float64)
+    if lower_values.shape != upper_values.shape:
+        arcpy.AddWarning("WARNING: Lower surface grid doesn't match, skipping height tile {}".format(out_path))
+        return None
+
+    writeRaster(computeHeight(upper_values, lower_values), upper_raster, out_path)
+    doTime(a, "\tCreated height tile {}".format(out_path))
+    return out_path
+
+
+def getPointCountPath(point_count_folder, f_name, return_type):
+    return os.path.join(point_count_folder, return_type, "{}_{}.tif".format(f_name, return_type))
+
+
+'''
+--------------------------------------------------------------------------------
+Process pool task: writes the canopy density of one ALL/LAST point count pair
+Returns the output path or None if it wasn't created
+--------------------------------------------------------------------------------
+'''
+def createCanopyDensityTile(point_count_folder, out_folder, f_name):
+    out_path = os.path.join(out_folder, "{}.tif".format(f_name))
+    last_path = getPointCountPath(point_count_folder, f_name, LAST)
+    if os.path.exists(out_path):
+        return out_path
+    if not os.path.exists(last_path):
+        arcpy.AddWarning("WARNING: No LAST point count, skipping canopy density tile {}".format(last_path))
+        return None
+
+    a = datetime.now()
+    all_values, all_raster = readRaster(getPointCountPath(point_count_folder, f_name, ALL))
+    last_values = readRaster(last_path, all_raster)[0]
+    all_values[~numpy.isfinite(all_values)] = 0
+    last_values[~numpy.isfinite(last_values)] = 0
+
+    writeRaster(computeCanopyDensity(last_values, all_values), all_raster, out_path)
+    doTime(a, "\tCreated canopy density tile {}".format(out_path))
+    return out_path
+
+
+def runTasks(task, items):
+    pool = Pool(processes=max(1, cpu_count() - RasterConfig.HEIGHT_CPU_HANDICAP))
+    try:
+        results = pool.map(task, items)
+    finally:
+        pool.close()
+        pool.join()
+    return [result for result in results if result is not None]
+
+
+'''
+--------------------------------------------------------------------------------
+Creates the height tiles (upper - lower) for every .tif tile in upper_folder
+Returns the list of height tiles
+--------------------------------------------------------------------------------
+'''
+def createHeightRasters(upper_folder, lower_folder, out_folder):
+    a = datetime.now()
+    if not os.path.exists(out_folder):
+        os.makedirs(out_folder)
+
+    tile_files = [f for f in os.listdir(upper_folder) if f.upper().endswith(".TIF")]
+    # The workers get a pickled copy (tile index only) and keep their own block cache
+    lower_mosaic = VirtualMosaic.VirtualMosaic(VirtualMosaic.getTileIndex(lower_folder))
+    out_paths = runTasks(partial(createHeightTile, upper_folder, lower_mosaic, out_folder), tile_files)
+    doTime(a, "Created {} of {} height tiles in {}".format(len(out_paths), len(tile_files), out_folder))
+    return out_paths
+
+
+'''
+--------------------------------------------------------------------------------
+Creates the canopy density tiles from the ALL and LAST point count rasters
+(classified LAS only) in point_count_folder
+Returns the list of canopy density tiles
+--------------------------------------------------------------------------------
+'''
+def createCanopyDensityRasters(point_count_folder, out_folder):
+    a = datetime.now()
+    if not os.path.exists(out_folder):
+        os.makedirs(out_folder)
+
+    all_folder = os.path.join(point_count_folder, ALL)
+    postfix = "_{}.TIF".format(ALL)
+    f_names = []
+    if os.path.exists(all_folder):
+        f_names = [f[:-len(postfix)] for f in os.listdir(all_folder) if f.upper().endswith(postfix)]
+    out_paths = runTasks(partial(createCanopyDensityTile, point_count_folder, out_folder), f_names)
+    doTime(a, "Created {} of {} canopy density tiles in {}".format(len(out_paths), len(f_names), out_folder))
+    return out_paths
+
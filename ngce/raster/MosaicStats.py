@@ -0,0 +1,111 @@
+'''
+Created on Oct 19, 2026
+
+@author: eric5946
+
+Mosaic dataset statistics merged from the tile statistics.
+
+Every published tile already has exact statistics (min, max, mean, standard
+deviation) and a histogram (valid pixel count) in the project statistics store,
+so the statistics of the whole mosaic can be calculated exactly without reading
+any pixels:
+    count = sum(n)
+    mean  = sum(n * mean) / count
+    var   = sum(n * (std^2 + (mean - mosaic mean)^2)) / count
+    min   = min(min), max = max(max)
+'''
+import math
+
+from ngce.raster import TileStats, ZHistogram
+from ngce.raster.RasterConfig import FIELD_INFO, MIN, MAX, MEAN, STAND_DEV, \
+    STAT_FOLDER_PUB
+
+
+COUNT = "count"
+HISTOGRAM = "histogram"
+BIN_WIDTH = "bin_width"
+
+
+'''
+--------------------------------------------------------------------------------
+Merges a list of tile statistics [count, min, max, mean, std]
+Returns [count, min, max, mean, std] or None if there are no valid pixels
+--------------------------------------------------------------------------------
+'''
+def mergeStats(tile_stats):
+    count = 0
+    z_min = None
+    z_max = None
+    z_sum = 0.0
+    for n, t_min, t_max, t_mean, t_std in tile_stats:  # @UnusedVariable
+        if n > 0:
+            count = count + n
+            z_sum = z_sum + n * t_mean
+            z_min = t_min if z_min is None else min(z_min, t_min)
+            z_max = t_max if z_max is None else max(z_max, t_max)
+
+    if count <= 0:
+        return None
+
+    z_mean = z_sum / count
+    z_var = 0.0
+    for n, t_min, t_max, t_mean, t_std in tile_stats:  # @UnusedVariable
+        if n > 0:
+            z_var = z_var + n * (t_std * t_std + (t_mean - z_mean) * (t_mean - z_mean))
+    z_std = math.sqrt(max(z_var / count, 0.0))
+
+    return [count, z_min, z_max, z_mean, z_std]
+
+
+'''
+--------------------------------------------------------------------------------
+Reads the tile statistics and histograms for the elevation type from the
+project statistics store and merges them.
+
+Returns a dictionary {COUNT, MIN, MAX, MEAN, STAND_DEV, HISTOGRAM, BIN_WIDTH} or
+None if any tile is missing its statistics or histogram (then the statistics
+have to be calculated from the pixels)
+--------------------------------------------------------------------------------
+'''
+def getMosaicStats(target_path, elev_type, raster_version=STAT_FOLDER_PUB):
+    store_path = TileStats.getStatStorePath(target_path)
+    raster_stats = TileStats.getRasterStats(store_path, elev_type, raster_version)
+    tile_histograms = TileStats.getZHistograms(store_path, TileStats.getRasterHistogramSource(elev_type, raster_version))
+
+    if len(raster_stats) <= 0:
+        return None
+
+    tile_stats = []
+    for raster_stat in raster_stats:
+        f_name = raster_stat[TileStats.RASTER_STATS_NAME_COLUMN]
+        z_min = raster_stat[FIELD_INFO[MIN][0]]
+        z_max = raster_stat[FIELD_INFO[MAX][0]]
+        z_mean = raster_stat[FIELD_INFO[MEAN][0]]
+        z_std = raster_stat[FIELD_INFO[STAND_DEV][0]]
+        if f_name not in tile_histograms or z_min is None or z_max is None or z_mean is None or z_std is None:
+            return None
+        count = sum(tile_histograms[f_name][1].values())
+        tile_stats.append([count, float(z_min), float(z_max), float(z_mean), float(z_std)])
+
+    merged = mergeStats(tile_stats)
+    if merged is None:
+        return None
+
+    bin_width, histogram = ZHistogram.mergeTileHistograms(tile_histograms)
+    return {COUNT: merged[0],
+            MIN: merged[1],
+            MAX: merged[2],
+            MEAN: merged[3],
+            STAND_DEV: merged[4],
+            HISTOGRAM: histogram,
+            BIN_WIDTH: bin_width}
+
+
+'''
+--------------------------------------------------------------------------------
+Returns the statistics string for SetRasterProperties_management
+(band min max mean std) multiplying the values by z_factor for unit conversions
+--------------------------------------------------------------------------------
+'''
+def getStatisticsString(mosaic_stats, z_factor=1.0):
+    return "1 {} {} {} {}".format(mosaic_stats[MIN] * z_factor, mosaic_stats[MAX] * z_factor, mosaic_stats[MEAN] * z_factor, mosaic_stats[STAND_DEV] * z_factor)
@@ -0,0 +1,97 @@
+'''
+Created on Oct 19, 2026
+
+@author: eric5946
+
+Overview tile manifest for incremental (dirty tile) overview refreshes.
+
+The manifest is a SQLite database in the overview folder with one row per
+overview tile and the hash of its source:
+    level 0      hash of the Name and ItemTS of the primary mosaic items under the tile
+    level n > 0  hash of the hashes of its 2 x 2 child tiles
+Adding a project only changes the hashes of the tiles under the project and
+their ancestors, so only those tiles are rendered again.
+
+A child tile that isn't in the manifest was never rendered by the tile builder
+(e.g. the first incremental run on a master whose manifest wasn't seeded by a
+full build), so it can't be taken as NoData. Its parent is rendered from the
+mosaic dataset instead (getUnseededTiles).
+'''
+from datetime import datetime
+import hashlib
+import os
+
+from ngce.raster import RasterConfig, TileStats
+
+
+MANIFEST_NAME = "OverviewManifest.sqlite"
+MANIFEST_TABLE = "overview_tiles"
+MANIFEST_COLUMNS = ["name", "level", "tile_row", "tile_col", "source_hash", "has_data", "updated"]
+
+
+def getManifestPath(overview_path):
+    return os.path.join(overview_path, MANIFEST_NAME)
+
+
+def createTables(connection):
+    connection.execute("CREATE TABLE IF NOT EXISTS {} (name TEXT NOT NULL PRIMARY KEY, level INTEGER NOT NULL, tile_row INTEGER NOT NULL, tile_col INTEGER NOT NULL, source_hash TEXT, has_data INTEGER, updated TEXT)".format(MANIFEST_TABLE))
+
+
+'''
+--------------------------------------------------------------------------------
+Returns the hash of a list of source strings (order doesn't matter)
+--------------------------------------------------------------------------------
+'''
+def getHash(sources):
+    return hashlib.md5("\n".join(sorted(sources))).hexdigest()
+
+
+def getChildTiles(tile):
+    factor = RasterConfig.OVERVIEW_FACTOR
+    row, col = tile
+    return [(child_row, child_col) for child_row in range(row * factor, (row + 1) * factor) for child_col in range(col * factor, (col + 1) * factor)]
+
+
+'''
+--------------------------------------------------------------------------------
+Returns the parent tiles that have a child tile missing from child_hashes (the
+manifest of the level below). These can't be decimated from their children.
+--------------------------------------------------------------------------------
+'''
+def getUnseededTiles(parent_tiles, child_hashes):
+    return [tile for tile in parent_tiles if not all([child in child_hashes for child in getChildTiles(tile)])]
+
+
+def _getTileHashes(connection, level):
+    result = {}
+    for row in connection.execute("SELECT tile_row, tile_col, source_hash, has_data FROM {} WHERE level = ?".format(MANIFEST_TABLE), [level]):
+        result[(row[0], row[1])] = [row[2], row[3] == 1]
+    return result
+
+
+'''
+--------------------------------------------------------------------------------
+Returns {(row, col): [source_hash, has_data]} for every tile of the level
+--------------------------------------------------------------------------------
+'''
+def getTileHashes(manifest_path, level):
+    result = {}
+    if os.path.exists(manifest_path):
+        result = TileStats.runStoreTransaction(manifest_path, createTables, _getTileHashes, level)
+    return result
+
+
+def _setTileHashes(connection, tile_rows):
+    updated = str(datetime.now())
+    connection.executemany("INSERT OR REPLACE INTO {} ({}) VALUES (?, ?, ?, ?, ?, ?, ?)".format(MANIFEST_TABLE, ", ".join(MANIFEST_COLUMNS)),
+                           [list(tile_row) + [updated] for tile_row in tile_rows])
+
+
+'''
+--------------------------------------------------------------------------------
+Stores a list of [name, level, row, col, source_hash, has_data] tile rows
+--------------------------------------------------------------------------------
+'''
+def setTileHashes(manifest_path, tile_rows):
+    if len(tile_rows) > 0:
+        TileStats.runStoreTransaction(manifest_path, createTables, _setTileHashes, tile_rows)
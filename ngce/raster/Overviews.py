@@ -0,0 +1,485 @@
+'''
+Created on Oct 19, 2026
+
+@author: eric5946
+
+Parallel tile based overview builder for the project and master mosaic datasets.
+
+DefineOverviews/BuildOverviews render the overviews of a mosaic dataset in a
+single process, which takes hours on a large project. This builder plans the
+same pyramid (first level cell size from Raster.getOverviewCellSize, factor 2,
+5120 x 5120 tiles) and renders the tiles of each level across a process pool:
+    level 0     bilinear resample of the primary (Category = 1) mosaic items
+    level n > 0 bilinear decimation (2 x 2 mean) of the 4 tiles of level n - 1,
+                or a resample of the primary items when a child tile was never
+                rendered (incremental run without a seeded manifest)
+
+The tile grid is anchored at the origin of the coordinate system, so tiles built
+for different projects in the same overview folder (master mosaic) line up.
+Tile (level, row, col) covers
+    x = col * span .. (col + 1) * span, y = row * span .. (row + 1) * span
+where span = OVERVIEW_TILE_SIZE * cell size of the level.
+
+The tiles are written as compressed tiled TIFFs with statistics, added to the
+mosaic dataset and marked as overviews (Category = 2) with the MinPS/MaxPS of
+their level.
+'''
+import arcpy
+from datetime import datetime
+from functools import partial
+import math
+from multiprocessing import Pool, cpu_count
+import os
+
+import numpy
+
+from ngce.Utility import deleteFileIfExists, doTime
+from ngce.raster import RasterConfig, OverviewManifest
+
+
+OVERVIEW_CATEGORY = 2
+OVERVIEW_PREFIX = "OVR_"
+OVERVIEW_WHERE_CLAUSE = "Category = {}".format(OVERVIEW_CATEGORY)
+OVERVIEW_NAME_WHERE_CLAUSE = "Name LIKE '{}%'".format(OVERVIEW_PREFIX)
+SOURCE_WHERE_CLAUSE = "Category = 1"
+# The top level is shown at every smaller scale
+TOP_LEVEL_MAX_PS_FACTOR = 256
+
+
+def getTileName(level, row, col):
+    return "{}L{:02d}_R{}_C{}".format(OVERVIEW_PREFIX, level, row, col)
+
+def getTileLevel(tile_name):
+    return int(tile_name[len(OVERVIEW_PREFIX) + 1:len(OVERVIEW_PREFIX) + 3])
+
+def getLevelFolder(overview_path, level):
+    return os.path.join(overview_path, "L{:02d}".format(level))
+
+def getTilePath(overview_path, level, row, col):
+    return os.path.join(getLevelFolder(overview_path, level), "{}.tif".format(getTileName(level, row, col)))
+
+def getLevelCellSize(cellsize_ovr, level):
+    return cellsize_ovr * (RasterConfig.OVERVIEW_FACTOR ** level)
+
+def getTileExtent(cellsize, row, col, tile_size=RasterConfig.OVERVIEW_TILE_SIZE):
+    span = tile_size * cellsize
+    return [col * span, row * span, (col + 1) * span, (row + 1) * span]
+
+
+'''
+--------------------------------------------------------------------------------
+Returns the number of levels needed to cover the extent [xmin, ymin, xmax, ymax].
+The last level is the first one where the whole extent fits in a single tile
+width and height.
+--------------------------------------------------------------------------------
+'''
+def getLevelCount(extent, cellsize_ovr, tile_size=RasterConfig.OVERVIEW_TILE_SIZE):
+    size = max(extent[2] - extent[0], extent[3] - extent[1])
+    level = 0
+    while size / getLevelCellSize(cellsize_ovr, level) > tile_size:
+        level = level + 1
+    return level + 1
+
+
+'''
+--------------------------------------------------------------------------------
+Returns the [row, col] of the first level tiles that touch the extent and (if
+given) one of the boundary polygons
+--------------------------------------------------------------------------------
+'''
+def getFirstLevelTiles(extent, cellsize_ovr, spatial_ref, boundaries=None, tile_size=RasterConfig.OVERVIEW_TILE_SIZE):
+    span = tile_size * cellsize_ovr
+    tiles = []
+    for row in range(int(math.floor(extent[1] / span)), int(math.floor(extent[3] / span)) + 1):
+        for col in range(int(math.floor(extent[0] / span)), int(math.floor(extent[2] / span)) + 1):
+            is_tile = True
+            if boundaries is not None:
+                t_extent = getTileExtent(cellsize_ovr, row, col, tile_size)
+                tile_polygon = arcpy.Polygon(arcpy.Array([arcpy.Point(t_extent[0], t_extent[1]),
+                                                          arcpy.Point(t_extent[0], t_extent[3]),
+                                                          arcpy.Point(t_extent[2], t_extent[3]),
+                                                          arcpy.Point(t_extent[2], t_extent[1]),
+                                                          arcpy.Point(t_extent[0], t_extent[1])]), spatial_ref)
+                is_tile = False
+                for boundary in boundaries:
+                    if not boundary.disjoint(tile_polygon):
+                        is_tile = True
+                        break
+            if is_tile:
+                tiles.append([row, col])
+    return tiles
+
+
+'''
+--------------------------------------------------------------------------------
+Returns the [row, col] of the tiles one level up from the given tiles
+--------------------------------------------------------------------------------
+'''
+def getParentTiles(tiles):
+    factor = RasterConfig.OVERVIEW_FACTOR
+    return sorted(set([(row // factor, col // factor) for row, col in tiles]))
+
+
+def getSpatialReference(spatial_ref_string):
+    spatial_ref = arcpy.SpatialReference()
+    spatial_ref.loadFromString(spatial_ref_string)
+    return spatial_ref
+
+def setTileEnv(compression):
+    arcpy.env.overwriteOutput = True
+    arcpy.env.compression = compression
+    arcpy.env.tileSize = RasterConfig.TILE_SIZE_512
+    arcpy.env.pyramid = "NONE"
+    arcpy.env.rasterStatistics = "NONE"
+
+def calculateTileStatistics(tile_path):
+    arcpy.CalculateStatistics_management(in_raster_dataset=tile_path, x_skip_factor="1", y_skip_factor="1", ignore_values="", skip_existing="OVERWRITE")
+
+
+'''
+--------------------------------------------------------------------------------
+Process pool task: renders a tile from the primary (Category = 1) items of the
+mosaic dataset, so the OVR_ tiles of an earlier run aren't read back.
+Used for the first level, and for the parent tiles whose children were never
+rendered (OverviewManifest.getUnseededTiles).
+Returns the tile path or None if the tile has no data.
+--------------------------------------------------------------------------------
+'''
+def renderSourceTile(md_path, overview_path, level, cellsize, compression, overwrite, tile):
+    row, col = tile
+    tile_path = getTilePath(overview_path, level, row, col)
+    if os.path.exists(tile_path) and not overwrite:
+        return tile_path
+
+    setTileEnv(compression)
+    deleteFileIfExists(tile_path, True)
+    t_extent = getTileExtent(cellsize, row, col)
+    arcpy.env.extent = arcpy.Extent(t_extent[0], t_extent[1], t_extent[2], t_extent[3])
+    md_layer = "{}_source".format(getTileName(level, row, col))
+    arcpy.MakeMosaicLayer_management(in_mosaic_dataset=md_path, out_mosaic_layer=md_layer, where_clause=SOURCE_WHERE_CLAUSE)
+    try:
+        arcpy.Resample_management(in_raster=md_layer, out_raster=tile_path, cell_size="{} {}".format(cellsize, cellsize), resampling_type="BILINEAR")
+    finally:
+        arcpy.Delete_management(md_layer)
+
+    if int(arcpy.GetRasterProperties_management(tile_path, "ALLNODATA").getOutput(0)) == 1:
+        deleteFileIfExists(tile_path, True)
+        return None
+
+    calculateTileStatistics(tile_path)
+    return tile_path
+
+
+'''
+--------------------------------------------------------------------------------
+Halves the resolution of a 2D array by averaging each 2 x 2 block of cells
+(bilinear sampling at the block centers). NaN cells are left out of the mean,
+a block with no valid cells is NaN.
+--------------------------------------------------------------------------------
+'''
+def decimate(values):
+    rows = (values.shape[0] // 2) * 2
+    cols = (values.shape[1] // 2) * 2
+    blocks = values[:rows, :cols].reshape(rows // 2, 2, cols // 2, 2)
+    valid = numpy.isfinite(blocks)
+    counts = valid.sum(axis=(1, 3))
+    sums = numpy.where(valid, blocks, 0).sum(axis=(1, 3))
+    result = numpy.full(counts.shape, numpy.nan, dtype=numpy.float32)
+    numpy.divide(sums, counts, out=result, where=(counts > 0))
+    return result
+
+
+'''
+--------------------------------------------------------------------------------
+Reads tile_size x tile_size cells of a tile from its grid origin, so a tile that
+is smaller than the grid or off by part of a cell still lines up. Cells outside
+the raster are padded with NoData. NoData cells are NaN in the result.
+--------------------------------------------------------------------------------
+'''
+def readTile(tile_path, lower_left, tile_size=RasterConfig.OVERVIEW_TILE_SIZE):
+    raster = arcpy.Raster(tile_path)
+    nodata = raster.noDataValue
+    fill = nodata if nodata is not None else float(RasterConfig.NODATA_DEFAULT)
+    values = arcpy.RasterToNumPyArray(raster, lower_left, tile_size, tile_size, fill)
+    dtype = values.dtype
+    values = values.astype(numpy.float32)
+    values[values == numpy.float32(fill)] = numpy.nan
+    del raster
+    return values, dtype, nodata
+
+
+'''
+--------------------------------------------------------------------------------
+Process pool task: renders a tile of level > 0 by decimating the 2 x 2 tiles
+below it. Missing child tiles are NoData (the caller renders the parents of
+child tiles that were never rendered with renderSourceTile).
+Returns the tile path or None if the tile has no data.
+--------------------------------------------------------------------------------
+'''
+def renderParentTile(overview_path, level, cellsize, spatial_ref_string, compression, overwrite, tile):
+    row, col = tile
+    tile_path = getTilePath(overview_path, level, row, col)
+    if os.path.exists(tile_path) and not overwrite:
+        return tile_path
+
+    tile_size = RasterConfig.OVERVIEW_TILE_SIZE
+    half = tile_size // 2
+    result = numpy.full((tile_size, tile_size), numpy.nan, dtype=numpy.float32)
+    dtype = None
+    nodata = None
+    for child_row_offset in [0, 1]:
+        for child_col_offset in [0, 1]:
+            child_row = row * 2 + child_row_offset
+            child_col = col * 2 + child_col_offset
+            child_path = getTilePath(overview_path, level - 1, child_row, child_col)
+            if os.path.exists(child_path):
+                c_extent = getTileExtent(cellsize / RasterConfig.OVERVIEW_FACTOR, child_row, child_col)
+                values, dtype, child_nodata = readTile(child_path, arcpy.Point(c_extent[0], c_extent[1]), tile_size)
+                if child_nodata is not None:
+                    nodata = child_nodata
+                values = decimate(values)
+                # Array rows are top down, tile rows are bottom up
+                top = 0 if child_row_offset == 1 else half
+                left = child_col_offset * half
+                result[top:top + values.shape[0], left:left + values.shape[1]] = values
+                del values
+
+    if dtype is None or not numpy.any(numpy.isfinite(result)):
+        return None
+
+    if nodata is None:
+        nodata = float(RasterConfig.NODATA_DEFAULT)
+    is_float = numpy.issubdtype(dtype, numpy.floating)
+    if not is_float:
+        result = numpy.round(result)
+    result[~numpy.isfinite(result)] = nodata
+    result = result.astype(dtype)
+
+    setTileEnv(compression)
+    deleteFileIfExists(tile_path, True)
+    t_extent = getTileExtent(cellsize, row, col)
+    raster = arcpy.NumPyArrayToRaster(result, arcpy.Point(t_extent[0], t_extent[1]), cellsize, cellsize, nodata)
+    raster.save(tile_path)
+    del raster, result
+    arcpy.DefineProjection_management(tile_path, getSpatialReference(spatial_ref_string))
+    calculateTileStatistics(tile_path)
+    return tile_path
+
+
+'''
+--------------------------------------------------------------------------------
+Adds the overview tiles to the mosaic dataset and marks every OVR_ item as an
+overview with the pixel size range of its level
+--------------------------------------------------------------------------------
+'''
+def addOverviewsToMosaicDataset(md_path, tile_paths, cellsize_ovr):
+    a = datetime.now()
+    arcpy.AddRastersToMosaicDataset_management(in_mosaic_dataset=md_path, raster_type="Raster Dataset", input_path=tile_paths,
+                                               update_cellsize_ranges="NO_CELL_SIZES", update_boundary="NO_BOUNDARY", update_overviews="NO_OVERVIEWS",
+                                               maximum_pyramid_levels="", maximum_cell_size="0", minimum_dimension="0", spatial_reference="", filter="#",
+                                               sub_folder="NO_SUBFOLDERS", duplicate_items_action="OVERWRITE_DUPLICATES", build_pyramids="NO_PYRAMIDS",
+                                               calculate_statistics="NO_STATISTICS", build_thumbnails="NO_THUMBNAILS", operation_description="#",
+                                               force_spatial_reference="NO_FORCE_SPATIAL_REFERENCE")
+
+    # The master overview folder can have tiles from earlier projects, so find the top level in the mosaic
+    top_level = max([getTileLevel(row[0]) for row in arcpy.da.SearchCursor(md_path, ["Name"], OVERVIEW_NAME_WHERE_CLAUSE)])  # @UndefinedVariable
+    factor = RasterConfig.OVERVIEW_FACTOR
+    with arcpy.da.UpdateCursor(md_path, ["Name", "Category", "MinPS", "MaxPS"], OVERVIEW_NAME_WHERE_CLAUSE) as cursor:  # @UndefinedVariable
+        for row in cursor:
+            level = getTileLevel(row[0])
+            cellsize = getLevelCellSize(cellsize_ovr, level)
+            row[1] = OVERVIEW_CATEGORY
+            row[2] = cellsize / factor
+            row[3] = cellsize * (TOP_LEVEL_MAX_PS_FACTOR if level == top_level else factor)
+            cursor.updateRow(row)
+
+    doTime(a, "\tAdded {} overview tiles to {}".format(len(tile_paths), md_path))
+
+
+'''
+--------------------------------------------------------------------------------
+Removes the OVR_ overview items from the mosaic dataset (used before falling
+back to DefineOverviews/BuildOverviews)
+--------------------------------------------------------------------------------
+'''
+def removeOverviews(md_path):
+    arcpy.RemoveRastersFromMosaicDataset_management(in_mosaic_dataset=md_path, where_clause=OVERVIEW_NAME_WHERE_CLAUSE, update_boundary="NO_BOUNDARY",
+                                                    mark_overviews_items="NO_MARK_OVERVIEW_ITEMS", delete_overview_images="NO_DELETE_OVERVIEW_IMAGES",
+                                                    delete_item_cache="NO_DELETE_ITEM_CACHE", remove_items="REMOVE_MOSAICDATASET_ITEMS",
+                                                    update_cellsize_ranges="NO_CELL_SIZES")
+
+
+'''
+--------------------------------------------------------------------------------
+Returns {(row, col): source_hash} for the first level tiles from the Name and
+ItemTS of the primary (Category = 1) mosaic items that overlap each tile
+--------------------------------------------------------------------------------
+'''
+def getSourceHashes(md_path, cellsize_ovr, tiles, spatial_ref):
+    span = RasterConfig.OVERVIEW_TILE_SIZE * cellsize_ovr
+    sources = dict([(tuple(tile), []) for tile in tiles])
+    for name, item_ts, shape in arcpy.da.SearchCursor(md_path, ["Name", "ItemTS", "SHAPE@"], SOURCE_WHERE_CLAUSE, spatial_reference=spatial_ref):  # @UndefinedVariable
+        if shape is not None:
+            extent = shape.extent
+            for row in range(int(math.floor(extent.YMin / span)), int(math.floor(extent.YMax / span)) + 1):
+                for col in range(int(math.floor(extent.XMin / span)), int(math.floor(extent.XMax / span)) + 1):
+                    if (row, col) in sources:
+                        sources[(row, col)].append("{}|{}".format(name, item_ts))
+
+    return dict([(tile, OverviewManifest.getHash(tile_sources)) for tile, tile_sources in sources.iteritems()])
+
+
+'''
+--------------------------------------------------------------------------------
+Returns {(row, col): source_hash} for the parent tiles from the hashes of their
+child tiles (new hashes first, then the ones in the manifest)
+--------------------------------------------------------------------------------
+'''
+def getParentHashes(parent_tiles, child_hashes, manifest_child_hashes):
+    result = {}
+    for tile in parent_tiles:
+        sources = []
+        for child in OverviewManifest.getChildTiles(tile):
+            if child in child_hashes:
+                sources.append("{}|{}|{}".format(child[0], child[1], child_hashes[child]))
+            elif child in manifest_child_hashes:
+                sources.append("{}|{}|{}".format(child[0], child[1], manifest_child_hashes[child][0]))
+        result[tile] = OverviewManifest.getHash(sources)
+    return result
+
+
+'''
+--------------------------------------------------------------------------------
+Returns the tiles that have to be rendered: the source hash changed, or the
+manifest says there is data but the tile file is gone
+--------------------------------------------------------------------------------
+'''
+def getDirtyTiles(overview_path, level, tile_hashes, manifest_hashes):
+    dirty_tiles = []
+    for tile, source_hash in sorted(tile_hashes.iteritems()):
+        manifest_hash = manifest_hashes.get(tile, None)
+        if manifest_hash is None or manifest_hash[0] <> source_hash:
+            dirty_tiles.append(tile)
+        elif manifest_hash[1] and not os.path.exists(getTilePath(overview_path, level, tile[0], tile[1])):
+            dirty_tiles.append(tile)
+    return dirty_tiles
+
+
+def removeEmptyTiles(md_path, tile_names):
+    for index in range(0, len(tile_names), 500):
+        where_clause = "Name IN ({})".format(", ".join(["'{}'".format(tile_name) for tile_name in tile_names[index:index + 500]]))
+        arcpy.RemoveRastersFromMosaicDataset_management(in_mosaic_dataset=md_path, where_clause=where_clause, update_boundary="NO_BOUNDARY",
+                                                        mark_overviews_items="NO_MARK_OVERVIEW_ITEMS", delete_overview_images="NO_DELETE_OVERVIEW_IMAGES",
+                                                        delete_item_cache="NO_DELETE_ITEM_CACHE", remove_items="REMOVE_MOSAICDATASET_ITEMS",
+                                                        update_cellsize_ranges="NO_CELL_SIZES")
+
+
+'''
+--------------------------------------------------------------------------------
+Builds the overviews of a mosaic dataset.
+
+md_path            mosaic dataset
+overview_path      folder for the overview tiles
+cellsize_ovr       cell size of the first level (Raster.getOverviewCellSize)
+spatial_ref        spatial reference of the mosaic dataset
+boundary_fc_path   (optional) polygons limiting the first level tiles,
+                   otherwise the mosaic dataset extent is used
+compression        arcpy.env.compression for the tiles (LZ77, LZW, ...)
+overwrite          re-render existing tiles. Leave False to resume a failed run,
+                   set True when the source changed
+use_manifest       only render the tiles whose source changed since the last
+                   run (OverviewManifest in the overview folder). Use this on
+                   the master mosaic when a project is added.
+                   The levels are counted from the mosaic dataset extent.
+
+Returns the number of overview tiles rendered
+--------------------------------------------------------------------------------
+'''
+def buildOverviews(md_path, overview_path, cellsize_ovr, spatial_ref, boundary_fc_path=None, compression=RasterConfig.RASTER_COMPRESSION_ENV, overwrite=False, use_manifest=False):
+    a = datetime.now()
+    boundaries = None
+    if boundary_fc_path is not None and arcpy.Exists(boundary_fc_path):
+        boundaries = [row[0] for row in arcpy.da.SearchCursor(boundary_fc_path, ["SHAPE@"], spatial_reference=spatial_ref) if row[0] is not None]  # @UndefinedVariable
+    if boundaries is not None and len(boundaries) > 0:
+        extents = [boundary.extent for boundary in boundaries]
+        extent = [min([e.XMin for e in extents]), min([e.YMin for e in extents]), max([e.XMax for e in extents]), max([e.YMax for e in extents])]
+    else:
+        boundaries = None
+        md_extent = arcpy.Describe(md_path).extent
+        extent = [md_extent.XMin, md_extent.YMin, md_extent.XMax, md_extent.YMax]
+
+    level_count = getLevelCount(extent, cellsize_ovr)
+    if use_manifest:
+        # The boundary only limits the first level tiles, the levels go up to the top of the whole (master) mosaic
+        # so the changed tiles are carried into every ancestor up to the top level
+        md_extent = arcpy.Describe(md_path).extent
+        level_count = max(level_count, getLevelCount([md_extent.XMin, md_extent.YMin, md_extent.XMax, md_extent.YMax], cellsize_ovr))
+    arcpy.AddMessage("Building {} overview level(s) from cell size {} on {}".format(level_count, cellsize_ovr, md_path))
+    for level in range(0, level_count):
+        if not os.path.exists(getLevelFolder(overview_path, level)):
+            os.makedirs(getLevelFolder(overview_path, level))
+
+    manifest_path = OverviewManifest.getManifestPath(overview_path)
+    spatial_ref_string = spatial_ref.exportToString()
+    tile_paths = []
+    empty_tile_names = []
+    pool = Pool(processes=max(1, cpu_count() - RasterConfig.OVERVIEW_CPU_HANDICAP))
+    try:
+        tiles = getFirstLevelTiles(extent, cellsize_ovr, spatial_ref, boundaries)
+        tile_hashes = None
+        manifest_hashes = None
+        render_tiles = []
+        for level in range(0, level_count):
+            aa = datetime.now()
+            cellsize = getLevelCellSize(cellsize_ovr, level)
+            if level > 0:
+                tiles = getParentTiles(tiles)
+
+            child_render_tiles = render_tiles
+            render_tiles = tiles
+            if use_manifest:
+                if level == 0:
+                    tile_hashes = getSourceHashes(md_path, cellsize_ovr, tiles, spatial_ref)
+                else:
+                    tile_hashes = getParentHashes(tiles, tile_hashes, manifest_hashes)
+                manifest_hashes = OverviewManifest.getTileHashes(manifest_path, level)
+                dirty_tiles = getDirtyTiles(overview_path, level, tile_hashes, manifest_hashes)
+                if level > 0:
+                    # A child re-rendered for a missing file keeps its hash, re-render its parent too
+                    dirty_tiles = sorted(set(dirty_tiles) | set(getParentTiles(child_render_tiles)))
+                render_tiles = dirty_tiles
+
+            source_tiles = render_tiles if level == 0 else []
+            if level > 0 and use_manifest:
+                # A child that is not in the manifest was never rendered here (not NoData), so render the parent from the source
+                source_tiles = OverviewManifest.getUnseededTiles(render_tiles, OverviewManifest.getTileHashes(manifest_path, level - 1))
+                if len(source_tiles) > 0:
+                    arcpy.AddMessage("\tRendering {} level {} overview tiles with unseeded child tiles from the source".format(len(source_tiles), level))
+            parent_tiles = [tile for tile in render_tiles if tile not in source_tiles]
+            render_tiles = source_tiles + parent_tiles
+
+            level_paths = pool.map(partial(renderSourceTile, md_path, overview_path, level, cellsize, compression, overwrite or use_manifest), source_tiles)
+            level_paths = level_paths + pool.map(partial(renderParentTile, overview_path, level, cellsize, spatial_ref_string, compression, overwrite or use_manifest), parent_tiles)
+            tile_paths = tile_paths + [tile_path for tile_path in level_paths if tile_path is not None]
+
+            if use_manifest:
+                manifest_rows = []
+                for tile, tile_path in zip(render_tiles, level_paths):
+                    name = getTileName(level, tile[0], tile[1])
+                    manifest_rows.append([name, level, tile[0], tile[1], tile_hashes[tile], 0 if tile_path is None else 1])
+                    if tile_path is None and tile in manifest_hashes and manifest_hashes[tile][1]:
+                        empty_tile_names.append(name)
+                OverviewManifest.setTileHashes(manifest_path, manifest_rows)
+
+            doTime(aa, "\tRendered {} of {} level {} overview tiles (cell size {})".format(len([p for p in level_paths if p is not None]), len(tiles), level, cellsize))
+    finally:
+        pool.close()
+        pool.join()
+
+    if len(empty_tile_names) > 0:
+        removeEmptyTiles(md_path, empty_tile_names)
+    if len(tile_paths) > 0:
+        addOverviewsToMosaicDataset(md_path, tile_paths, cellsize_ovr)
+
+    doTime(a, "Built {} overview tiles on {}".format(len(tile_paths), md_path))
+    return len(tile_paths)
@@ -32,7 +32,7 @@ Contour_Feet_function_chain_path = os.path.join(os.path.dirname(os.path.realpath
 arcpy.env.overwriteOutput = False
 arcpy.env.pyramid = RasterConfig.NONE
 arcpy.env.resamplingmethod = RasterConfig.BILINEAR
-arcpy.env.compression = RasterConfig.COMPRESSION_LZ77
+arcpy.env.compression = RasterConfig.RASTER_COMPRESSION_ENV
 arcpy.env.tileSize = RasterConfig.TILE_SIZE_256
 arcpy.env.nodata = RasterConfig.NODATA_DEFAULT
 
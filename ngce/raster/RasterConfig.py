@@ -9,7 +9,57 @@ import os
 NONE = "NONE"
 BILINEAR = "BILINEAR"
 COMPRESSION_LZ77 = "LZ77"
+COMPRESSION_LZW = "LZW"
+COMPRESSION_LERC = "LERC"
+COMPRESSION_JPEG = "JPEG"
 TILE_SIZE_256 = "256 256"
+TILE_SIZE_512 = "512 512"
+
+# Compression used by the derived raster writers that opt in (A05_B derived and published tiles, Raster.py, COG,
+# height models, pyramids and overviews), pick from the CodecBenchmark.py results. Utility.setArcpyEnv keeps the NONE default.
+RASTER_COMPRESSION = COMPRESSION_LZ77  # NONE, LZ77 (deflate), LZW, LERC or JPEG
+RASTER_COMPRESSION_QUALITY = 75  # JPEG only
+RASTER_LERC_TOLERANCE = 0.01  # LERC only, max error in z units
+# Value for arcpy.env.compression, e.g. "LZ77", "LERC 0.01", "JPEG 75"
+RASTER_COMPRESSION_ENV = RASTER_COMPRESSION
+if RASTER_COMPRESSION == COMPRESSION_LERC:
+    RASTER_COMPRESSION_ENV = "{} {}".format(COMPRESSION_LERC, RASTER_LERC_TOLERANCE)
+elif RASTER_COMPRESSION == COMPRESSION_JPEG:
+    RASTER_COMPRESSION_ENV = "{} {}".format(COMPRESSION_JPEG, RASTER_COMPRESSION_QUALITY)
+# Pyramids can only be NONE, LZ77 or JPEG
+RASTER_PYRAMID_COMPRESSION = RASTER_COMPRESSION
+if RASTER_COMPRESSION not in [NONE, COMPRESSION_LZ77, COMPRESSION_JPEG]:
+    RASTER_PYRAMID_COMPRESSION = COMPRESSION_LZ77
+
+# Write DERIVED and PUBLISHED rasters as cloud optimized GeoTIFFs
+# (internal tiles and overviews, IFD at the start of the file). Needs GDAL (osgeo) for internal overviews.
+COG_OUTPUT = False
+COG_BLOCK_SIZE = 512
+COG_COMPRESSION = "DEFLATE"  # DEFLATE, ZSTD or LERC_DEFLATE/LERC_ZSTD (GDAL build dependent)
+COG_LEVEL = 6  # DEFLATE/ZSTD compression level
+COG_MAX_Z_ERROR = 0  # LERC only, 0 is lossless
+COG_RESAMPLING = "BILINEAR"
+
+# Build the mosaic dataset overviews with the parallel tile builder (Overviews.py)
+# instead of DefineOverviews/BuildOverviews (A06_A project and A08 master overviews)
+OVERVIEW_PARALLEL = False
+OVERVIEW_TILE_SIZE = 5120  # Rows and columns of an overview tile
+OVERVIEW_FACTOR = 2  # Each level is built from the 2 x 2 tiles of the level below
+OVERVIEW_CPU_HANDICAP = 1  # set higher to use fewer CPUs
+
+# Write the height models (DHM, DCM) and canopy density as rasters (HeightModels.py)
+# instead of serving them through the raster function chains
+HEIGHT_MATERIALIZE = False
+HEIGHT_MIN = 1.0  # Heights below this (raster z units) are NoData (same as Digital_Height_Model_1.rft.xml)
+CANOPY_DENSITY_MIN = 10  # Densities outside this range are NoData (same as Canopy_Density.rft.xml)
+CANOPY_DENSITY_MAX = 100
+HEIGHT_CPU_HANDICAP = 1  # set higher to use fewer CPUs
+
+# Virtual mosaic reader (VirtualMosaic.py)
+VIRTUAL_MOSAIC_BLOCK_SIZE = 512  # Cells per side of a cached block
+VIRTUAL_MOSAIC_CACHE_BLOCKS = 128  # Blocks kept in memory (float32, 1 MB each at 512)
+VIRTUAL_MOSAIC_OPEN_FILES = 32  # Tiles kept open (GDAL only)
+VIRTUAL_MOSAIC_INDEX_NAME = "TileIndex.json"
 
 SIMPLIFY_INTERVAL = 3  # Meters
 
@@ -114,10 +164,24 @@ MOSAIC_Z_TOLERANCE = 100
 STAT_LAS_FOLDER = os.path.join("STATS", "LAS")
 STAT_RASTER_FOLDER = os.path.join("STATS", "RASTER")
 
+# Consolidated per-project tile statistics (replaces the S_<name>.txt files)
+STAT_STORE_FOLDER = "STATS"
+STAT_STORE_NAME = "TileStats.sqlite"
+# Worker processes copy their local stores here for the parent to merge
+STAT_STORE_PARTS_FOLDER = "TileStats_parts"
+
 STAT_FOLDER_ORG = "ORIGINAL"
 STAT_FOLDER_DER = "DERIVED"
 STAT_FOLDER_PUB = "PUBLISHED"
 
+# Z histograms (fixed bin width in z units) used to find the valid Z range of a project
+Z_HIST_BIN_WIDTH = 1.0
+Z_HIST_BLOCK_SIZE = 2048  # Cells per side read at one time
+Z_HIST_LOW_PERCENT = 0.01
+Z_HIST_HIGH_PERCENT = 99.99
+Z_HIST_MAX_GAP = 10  # Empty bins that separate outliers from the rest of the data
+Z_HIST_BUFFER = 5  # Bins added to each end of the Z range
+
 CANOPY_DENSITY = "MR_POINT_DENSITY"
 
 SAMPLE_TYPE = "CELLSIZE"
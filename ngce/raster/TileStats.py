@@ -0,0 +1,456 @@
+'''
+Created on Oct 19, 2026
+
+@author: eric5946
+
+Per-project tile statistics store.
+
+Every LAS and raster tile used to leave an S_<name>.txt file in the STATS
+folders that had to be re-opened one by one over the network. The statistics
+now go into a single SQLite database in DERIVED/STATS so the consolidation steps
+can read every tile with one query.
+
+SQLite file locking isn't reliable on the SMB share, so the A04_B/A05_B worker
+processes never write to the shared store. Each worker writes to its own store
+on local scratch (openWorkerStore) and copies it into TileStats_parts when it
+finishes (closeWorkerStore). The parent (A04_A/A05_A) is the only writer of the
+shared store: once the workers are done it merges the parts into a local copy
+of the store and puts the copy back in place (mergeWorkerStores).
+'''
+import csv
+from glob import glob
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+import uuid
+
+from ngce.raster.RasterConfig import FIELD_INFO, KEY_LIST, NAME, \
+    STAT_STORE_FOLDER, STAT_STORE_NAME, STAT_STORE_PARTS_FOLDER
+
+
+MAX_TRIES = 10
+LOCK_TIMEOUT = 60  # Seconds to wait on a locked database before retrying
+RETRY_DELAY = 1  # Seconds
+
+LAS_STATS_TABLE = "las_stats"
+LAS_STATS_COLUMNS = ["name", "item", "category", "pt_cnt", "percent", "z_min", "z_max"]
+
+RASTER_STATS_TABLE = "raster_stats"
+RASTER_STATS_KEY_COLUMNS = ["elev_type", "version"]
+RASTER_STATS_NAME_COLUMN = FIELD_INFO[NAME][0]
+# Column names are the short field names used on the boundary shape files
+RASTER_STATS_COLUMNS = RASTER_STATS_KEY_COLUMNS + [FIELD_INFO[key][0] for key in KEY_LIST]
+
+Z_HIST_TABLE = "z_histograms"
+
+SQL_TYPES = {"DOUBLE": "REAL", "SHORT": "INTEGER", "LONG": "INTEGER", "TEXT": "TEXT"}
+
+# {shared store path: local scratch store path} of this worker process
+WORKER_STORES = {}
+
+
+def getStatStorePath(target_path):
+    return os.path.join(target_path, STAT_STORE_FOLDER, STAT_STORE_NAME)
+
+
+def getStorePartsFolder(store_path):
+    return os.path.join(os.path.dirname(store_path), STAT_STORE_PARTS_FOLDER)
+
+
+def getLocalStorePath():
+    return os.path.join(tempfile.gettempdir(), "TileStats_{}_{}.sqlite".format(os.getpid(), uuid.uuid4().hex))
+
+
+'''
+--------------------------------------------------------------------------------
+Makes this process write its statistics for the shared store to a store on
+local scratch. Reads see the shared store and the local store.
+Call closeWorkerStore when the process is done.
+--------------------------------------------------------------------------------
+'''
+def openWorkerStore(store_path):
+    if store_path not in WORKER_STORES:
+        WORKER_STORES[store_path] = getLocalStorePath()
+    return WORKER_STORES[store_path]
+
+
+'''
+--------------------------------------------------------------------------------
+Copies the local store of this process into the parts folder next to the shared
+store. The part is copied under a temporary name and renamed, so the merge never
+sees a partial file.
+--------------------------------------------------------------------------------
+'''
+def closeWorkerStore(store_path):
+    local_path = WORKER_STORES.pop(store_path, None)
+    if local_path is None or not os.path.exists(local_path):
+        return None
+
+    parts_folder = getStorePartsFolder(store_path)
+    try:
+        if not os.path.exists(parts_folder):
+            os.makedirs(parts_folder)
+    except:
+        # Another process must have made it
+        pass
+
+    part_path = os.path.join(parts_folder, os.path.basename(local_path))
+    shutil.copyfile(local_path, "{}.tmp".format(part_path))
+    os.rename("{}.tmp".format(part_path), part_path)
+    os.remove(local_path)
+    return part_path
+
+
+def getWriteStorePath(store_path):
+    return WORKER_STORES.get(store_path, store_path)
+
+
+def getReadStorePaths(store_path):
+    return [path for path in [store_path, WORKER_STORES.get(store_path, None)] if path is not None and os.path.exists(path)]
+
+
+def _mergeStore(connection, part_path):
+    connection.execute("ATTACH DATABASE ? AS part", [part_path])
+    # A tile's LAS stats are replaced as a whole (same as _addLasStats)
+    connection.execute("DELETE FROM {0} WHERE name IN (SELECT DISTINCT name FROM part.{0})".format(LAS_STATS_TABLE))
+    for table in [LAS_STATS_TABLE, RASTER_STATS_TABLE, Z_HIST_TABLE]:
+        connection.execute("INSERT OR REPLACE INTO {0} SELECT * FROM part.{0}".format(table))
+
+
+'''
+--------------------------------------------------------------------------------
+Merges the worker parts into the shared store. Only the parent calls this, after
+its worker processes have finished, so the store has a single writer.
+The store is copied to local scratch, merged there and copied back.
+Returns the number of parts merged
+--------------------------------------------------------------------------------
+'''
+def mergeWorkerStores(store_path):
+    part_paths = sorted(glob(os.path.join(getStorePartsFolder(store_path), "*.sqlite")))
+    if len(part_paths) == 0:
+        return 0
+
+    local_path = getLocalStorePath()
+    try:
+        if os.path.exists(store_path):
+            shutil.copyfile(store_path, local_path)
+        for part_path in part_paths:
+            runTransaction(local_path, _mergeStore, part_path)
+
+        shutil.copyfile(local_path, "{}.tmp".format(store_path))
+        if os.path.exists(store_path):
+            os.remove(store_path)
+        os.rename("{}.tmp".format(store_path), store_path)
+        for part_path in part_paths:
+            os.remove(part_path)
+    finally:
+        if os.path.exists(local_path):
+            os.remove(local_path)
+
+    return len(part_paths)
+
+
+def getRasterStatsColumnTypes():
+    column_types = [[column, "TEXT"] for column in RASTER_STATS_KEY_COLUMNS]
+    for key in KEY_LIST:
+        column_types.append([FIELD_INFO[key][0], SQL_TYPES.get(FIELD_INFO[key][2], "TEXT")])
+    return column_types
+
+
+def createTables(connection):
+    connection.execute("CREATE TABLE IF NOT EXISTS {} (name TEXT NOT NULL, item TEXT NOT NULL, category TEXT NOT NULL, pt_cnt REAL, percent REAL, z_min REAL, z_max REAL, PRIMARY KEY (name, category, item))".format(LAS_STATS_TABLE))
+
+    columns = ", ".join(["{} {}".format(column, column_type) for column, column_type in getRasterStatsColumnTypes()])
+    connection.execute("CREATE TABLE IF NOT EXISTS {} ({}, PRIMARY KEY (name, elev_type, version))".format(RASTER_STATS_TABLE, columns))
+
+    connection.execute("CREATE TABLE IF NOT EXISTS {} (name TEXT NOT NULL, source TEXT NOT NULL, bin_width REAL NOT NULL, histogram TEXT, PRIMARY KEY (name, source))".format(Z_HIST_TABLE))
+
+
+'''
+--------------------------------------------------------------------------------
+Opens (and creates if needed) the statistics store
+--------------------------------------------------------------------------------
+'''
+def connect(store_path, create_tables=createTables):
+    store_folder = os.path.dirname(store_path)
+    try:
+        if not os.path.exists(store_folder):
+            os.makedirs(store_folder)
+    except:
+        # Another process must have made it
+        pass
+
+    connection = sqlite3.connect(store_path, timeout=LOCK_TIMEOUT)
+    create_tables(connection)
+    connection.commit()
+    return connection
+
+
+'''
+--------------------------------------------------------------------------------
+Runs a function against an open connection inside one transaction.
+Retries if another process has the store locked.
+create_tables lets other SQLite stores (e.g. the overview manifest) use the
+same locking and retries.
+--------------------------------------------------------------------------------
+'''
+def runStoreTransaction(store_path, create_tables, function, *args):
+    tries = 0
+    while True:
+        tries = tries + 1
+        connection = None
+        try:
+            connection = connect(store_path, create_tables)
+            result = function(connection, *args)
+            connection.commit()
+            return result
+        except sqlite3.OperationalError:
+            if tries >= MAX_TRIES:
+                raise
+            time.sleep(RETRY_DELAY)
+        finally:
+            if connection is not None:
+                connection.close()
+
+
+def runTransaction(store_path, function, *args):
+    return runStoreTransaction(store_path, createTables, function, *args)
+
+
+def toFloat(value):
+    result = None
+    try:
+        if value is not None and len(str(value).strip()) > 0:
+            result = float(value)
+    except:
+        pass
+    return result
+
+
+'''
+--------------------------------------------------------------------------------
+Reads the rows of a LasDatasetStatistics S_<name>.txt file.
+Returns a list of [item, category, pt_cnt, percent, z_min, z_max]
+--------------------------------------------------------------------------------
+'''
+def readLasStatFile(stat_file_path):
+    rows = []
+    stat_file = open(stat_file_path, 'rb')
+    try:
+        indx = 0
+        for row in csv.reader(stat_file):
+            indx = indx + 1
+            # First two lines are the header
+            if indx > 2 and len(row) > 6:
+                rows.append([str(row[1]), str(row[2]), toFloat(row[3]), toFloat(row[4]), toFloat(row[5]), toFloat(row[6])])
+    finally:
+        stat_file.close()
+
+    return rows
+
+
+def _addLasStats(connection, f_name, stat_rows):
+    connection.execute("DELETE FROM {} WHERE name = ?".format(LAS_STATS_TABLE), [f_name])
+    connection.executemany("INSERT OR REPLACE INTO {} ({}) VALUES (?, ?, ?, ?, ?, ?, ?)".format(LAS_STATS_TABLE, ", ".join(LAS_STATS_COLUMNS)),
+                           [[f_name] + list(stat_row) for stat_row in stat_rows])
+
+
+def addLasStats(store_path, f_name, stat_rows):
+    runTransaction(getWriteStorePath(store_path), _addLasStats, f_name, stat_rows)
+
+
+def addLasStatFile(store_path, f_name, stat_file_path):
+    stat_rows = readLasStatFile(stat_file_path)
+    addLasStats(store_path, f_name, stat_rows)
+    return stat_rows
+
+
+def _getLasStats(connection, f_name):
+    sql = "SELECT {} FROM {}".format(", ".join(LAS_STATS_COLUMNS), LAS_STATS_TABLE)
+    params = []
+    if f_name is not None:
+        sql = "{} WHERE name = ?".format(sql)
+        params = [f_name]
+
+    result = {}
+    for row in connection.execute(sql, params):
+        result.setdefault(row[0], []).append(list(row[1:]))
+    return result
+
+
+'''
+--------------------------------------------------------------------------------
+Returns {f_name: [[item, category, pt_cnt, percent, z_min, z_max], ...]}
+for one file or (f_name=None) every LAS file in the project
+--------------------------------------------------------------------------------
+'''
+def getLasStats(store_path, f_name=None):
+    result = {}
+    for path in getReadStorePaths(store_path):
+        result.update(runTransaction(path, _getLasStats, f_name))
+    return result
+
+
+def _getLasStatNames(connection):
+    return set([row[0] for row in connection.execute("SELECT DISTINCT name FROM {}".format(LAS_STATS_TABLE))])
+
+
+def getLasStatNames(store_path):
+    result = set()
+    for path in getReadStorePaths(store_path):
+        result.update(runTransaction(path, _getLasStatNames))
+    return result
+
+
+def _addRasterStats(connection, f_name, elev_type, raster_version, raster_props):
+    values = [elev_type, raster_version]
+    for key in KEY_LIST:
+        value = raster_props.get(key, None)
+        # Keep unicode names (e.g. vertical CS names) as they are, only convert bools and numbers
+        if value is not None and SQL_TYPES.get(FIELD_INFO[key][2], "TEXT") == "TEXT" and isinstance(value, (bool, int, long, float)):
+            value = str(value)
+        values.append(value)
+
+    # The name column is the key, always store the tile name
+    values[RASTER_STATS_COLUMNS.index(RASTER_STATS_NAME_COLUMN)] = f_name
+
+    connection.execute("INSERT OR REPLACE INTO {} ({}) VALUES ({})".format(RASTER_STATS_TABLE, ", ".join(RASTER_STATS_COLUMNS), ", ".join(["?"] * len(values))), values)
+
+
+def addRasterStats(store_path, f_name, elev_type, raster_version, raster_props):
+    runTransaction(getWriteStorePath(store_path), _addRasterStats, f_name, elev_type, raster_version, raster_props)
+
+
+'''
+--------------------------------------------------------------------------------
+Reads a raster S_<name>.txt file left by earlier runs (KEY_LIST names on the
+first line, the values on the second).
+Returns the raster_props or None if the file can't be read
+--------------------------------------------------------------------------------
+'''
+def readRasterStatFile(stat_file_path):
+    stat_file = open(stat_file_path, 'r')
+    try:
+        lines = [line.strip() for line in stat_file.readlines()]
+    finally:
+        stat_file.close()
+
+    if len(lines) < 2:
+        return None
+    keys = lines[0].split(",")
+    values = lines[1].split(",")
+    # Values were written without quoting, a comma in a value shifts the columns
+    if len(keys) <> len(values) or set(keys) <> set(KEY_LIST):
+        return None
+
+    raster_props = {}
+    for key, value in zip(keys, values):
+        if value == "None":
+            value = None
+        elif SQL_TYPES.get(FIELD_INFO[key][2], "TEXT") <> "TEXT":
+            value = toFloat(value)
+        raster_props[key] = value
+    return raster_props
+
+
+def addRasterStatFile(store_path, f_name, elev_type, raster_version, stat_file_path):
+    raster_props = readRasterStatFile(stat_file_path)
+    if raster_props is not None:
+        addRasterStats(store_path, f_name, elev_type, raster_version, raster_props)
+    return raster_props
+
+
+def _getRasterStats(connection, elev_type, raster_version, f_name):
+    where = []
+    params = []
+    for column, value in [["elev_type", elev_type], ["version", raster_version], ["name", f_name]]:
+        if value is not None:
+            where.append("{} = ?".format(column))
+            params.append(value)
+
+    sql = "SELECT {} FROM {}".format(", ".join(RASTER_STATS_COLUMNS), RASTER_STATS_TABLE)
+    if len(where) > 0:
+        sql = "{} WHERE {}".format(sql, " AND ".join(where))
+
+    return [dict(zip(RASTER_STATS_COLUMNS, row)) for row in connection.execute(sql, params)]
+
+
+'''
+--------------------------------------------------------------------------------
+Returns a list of dictionaries keyed by the RASTER_STATS_COLUMNS for all the
+raster tiles matching the (optional) elevation type, version and name
+--------------------------------------------------------------------------------
+'''
+def getRasterStats(store_path, elev_type=None, raster_version=None, f_name=None):
+    result = {}
+    for path in getReadStorePaths(store_path):
+        for row in runTransaction(path, _getRasterStats, elev_type, raster_version, f_name):
+            result[(row[RASTER_STATS_NAME_COLUMN], row["elev_type"], row["version"])] = row
+    return result.values()
+
+
+'''
+--------------------------------------------------------------------------------
+Returns the set of raster tile names that already have statistics.
+Query once and test membership instead of checking for each stat file.
+--------------------------------------------------------------------------------
+'''
+def getRasterStatNames(store_path, elev_type, raster_version):
+    return set([row[RASTER_STATS_NAME_COLUMN] for row in getRasterStats(store_path, elev_type, raster_version)])
+
+
+def hasRasterStats(store_path, f_name, elev_type, raster_version):
+    return len(getRasterStats(store_path, elev_type, raster_version, f_name)) > 0
+
+
+def getRasterHistogramSource(elev_type, raster_version):
+    return "{}_{}".format(elev_type, raster_version)
+
+
+def _addZHistogram(connection, f_name, source, bin_width, histogram):
+    # JSON keys are always strings, store the bins as [bin, count] pairs
+    connection.execute("INSERT OR REPLACE INTO {} (name, source, bin_width, histogram) VALUES (?, ?, ?, ?)".format(Z_HIST_TABLE),
+                       [f_name, source, bin_width, json.dumps(sorted(histogram.items()))])
+
+
+def addZHistogram(store_path, f_name, source, bin_width, histogram):
+    runTransaction(getWriteStorePath(store_path), _addZHistogram, f_name, source, bin_width, histogram)
+
+
+def _getZHistograms(connection, source):
+    sql = "SELECT name, bin_width, histogram FROM {}".format(Z_HIST_TABLE)
+    params = []
+    if source is not None:
+        sql = "{} WHERE source = ?".format(sql)
+        params = [source]
+
+    result = {}
+    for row in connection.execute(sql, params):
+        result[row[0]] = [row[1], dict([(int(z_bin), int(count)) for z_bin, count in json.loads(row[2])])]
+    return result
+
+
+'''
+--------------------------------------------------------------------------------
+Returns {f_name: [bin_width, {bin: count}]} for every tile histogram from the source
+--------------------------------------------------------------------------------
+'''
+def getZHistograms(store_path, source=None):
+    result = {}
+    for path in getReadStorePaths(store_path):
+        result.update(runTransaction(path, _getZHistograms, source))
+    return result
+
+
+def _getZHistogramNames(connection, source):
+    return set([row[0] for row in connection.execute("SELECT name FROM {} WHERE source = ?".format(Z_HIST_TABLE), [source])])
+
+
+def getZHistogramNames(store_path, source):
+    result = set()
+    for path in getReadStorePaths(store_path):
+        result.update(runTransaction(path, _getZHistogramNames, source))
+    return result
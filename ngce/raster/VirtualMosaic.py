@@ -0,0 +1,310 @@
+'''
+Created on Oct 19, 2026
+
+@author: eric5946
+
+Virtual mosaic reader for sampling elevation across project tiles.
+
+Reading across tile seams used to need a (referenced) mosaic dataset in a file
+GDB, which is slow to create and slow to read. A virtual mosaic is only a tile
+index (bounds and geotransform of every GeoTIFF tile, e.g. the A05 outputs in
+PUBLISHED/<elev type>) with an R-tree on the bounds. read(bbox, cellsize)
+finds the tiles under the box and assembles the array from their blocks:
+    - cells are sampled nearest neighbor at the center of each output cell
+    - where tiles overlap the first tile (by name) with data wins
+    - NoData and cells outside every tile are NaN
+Blocks of VIRTUAL_MOSAIC_BLOCK_SIZE x VIRTUAL_MOSAIC_BLOCK_SIZE cells are kept in
+a least recently used cache, so neighboring reads don't go back to the disk.
+
+GDAL (osgeo) is used to read the blocks when it is available, otherwise arcpy.
+A VirtualMosaic can be pickled (the open files and the cache are dropped), so
+it can be passed to multiprocessing worker functions.
+'''
+import arcpy
+from collections import OrderedDict
+import json
+import math
+import os
+
+import numpy
+
+from ngce.raster import RasterConfig
+
+try:
+    from osgeo import gdal
+except ImportError:
+    gdal = None
+
+
+# Tile index columns
+PATH = 0
+XMIN = 1
+YMIN = 2
+XMAX = 3
+YMAX = 4
+CELL_WIDTH = 5
+CELL_HEIGHT = 6
+COLUMNS = 7
+ROWS = 8
+NODATA = 9
+
+RTREE_NODE_SIZE = 16
+
+
+'''
+--------------------------------------------------------------------------------
+Returns the tile index entry [path, xmin, ymin, xmax, ymax, cell width,
+cell height, columns, rows, nodata] of a single band raster
+--------------------------------------------------------------------------------
+'''
+def getTileInfo(raster_path):
+    if gdal is not None:
+        dataset = gdal.Open(raster_path)
+        try:
+            x0, cell_width, rot_x, y0, rot_y, cell_height = dataset.GetGeoTransform()  # @UnusedVariable
+            cell_height = abs(cell_height)
+            columns = dataset.RasterXSize
+            rows = dataset.RasterYSize
+            nodata = dataset.GetRasterBand(1).GetNoDataValue()
+        finally:
+            dataset = None
+        return [raster_path, x0, y0 - rows * cell_height, x0 + columns * cell_width, y0, cell_width, cell_height, columns, rows, nodata]
+
+    raster = arcpy.Raster(raster_path)
+    extent = raster.extent
+    result = [raster_path, extent.XMin, extent.YMin, extent.XMax, extent.YMax, raster.meanCellWidth, raster.meanCellHeight, raster.width, raster.height, raster.noDataValue]
+    del raster
+    return result
+
+
+'''
+--------------------------------------------------------------------------------
+Creates the tile index of every .tif in the folder, sorted by name
+--------------------------------------------------------------------------------
+'''
+def createTileIndex(raster_folder):
+    tile_index = []
+    for f_name in sorted(os.listdir(raster_folder)):
+        if f_name.upper().endswith(".TIF"):
+            tile_index.append(getTileInfo(os.path.join(raster_folder, f_name)))
+    return tile_index
+
+
+def getTileIndexPath(raster_folder):
+    return os.path.join(raster_folder, RasterConfig.VIRTUAL_MOSAIC_INDEX_NAME)
+
+def saveTileIndex(tile_index, index_path):
+    index_file = open(index_path, 'w')
+    try:
+        json.dump(tile_index, index_file)
+    finally:
+        index_file.close()
+
+def loadTileIndex(index_path):
+    index_file = open(index_path, 'r')
+    try:
+        return json.load(index_file)
+    finally:
+        index_file.close()
+
+
+'''
+--------------------------------------------------------------------------------
+Returns the tile index of the folder. The index is saved next to the tiles
+(TileIndex.json) and re-created if a tile was added or removed since.
+--------------------------------------------------------------------------------
+'''
+def getTileIndex(raster_folder):
+    index_path = getTileIndexPath(raster_folder)
+    tile_names = sorted([f_name for f_name in os.listdir(raster_folder) if f_name.upper().endswith(".TIF")])
+    if os.path.exists(index_path):
+        tile_index = loadTileIndex(index_path)
+        if [os.path.split(tile[PATH])[1] for tile in tile_index] == tile_names:
+            # The folder may have moved since the index was saved
+            for tile in tile_index:
+                tile[PATH] = os.path.join(raster_folder, os.path.split(tile[PATH])[1])
+            return tile_index
+
+    tile_index = createTileIndex(raster_folder)
+    try:
+        saveTileIndex(tile_index, index_path)
+    except:
+        arcpy.AddWarning("WARNING: Failed to save tile index {}".format(index_path))
+    return tile_index
+
+
+'''
+--------------------------------------------------------------------------------
+Static R-tree on [xmin, ymin, xmax, ymax] boxes, bulk loaded with the
+Sort-Tile-Recursive algorithm. Nodes are [box, children, is_leaf], leaf nodes
+are [box, box indexes, True, boxes].
+--------------------------------------------------------------------------------
+'''
+class RTree(object):
+
+    def __init__(self, boxes, node_size=RTREE_NODE_SIZE):
+        self.node_size = node_size
+        self.root = None
+        nodes = [[list(box), index, True] for index, box in enumerate(boxes)]
+        is_leaf = True
+        while len(nodes) > 0:
+            nodes = self.pack(nodes, is_leaf)
+            is_leaf = False
+            if len(nodes) == 1:
+                self.root = nodes[0]
+                break
+
+    def getBox(self, nodes):
+        return [min([node[0][0] for node in nodes]), min([node[0][1] for node in nodes]), max([node[0][2] for node in nodes]), max([node[0][3] for node in nodes])]
+
+    def pack(self, nodes, is_leaf):
+        size = self.node_size
+        slice_count = int(math.ceil(math.sqrt(math.ceil(len(nodes) / float(size)))))
+        slice_size = slice_count * size
+        nodes = sorted(nodes, key=lambda node: node[0][0] + node[0][2])
+        parents = []
+        for i in range(0, len(nodes), slice_size):
+            slice_nodes = sorted(nodes[i:i + slice_size], key=lambda node: node[0][1] + node[0][3])
+            for j in range(0, len(slice_nodes), size):
+                children = slice_nodes[j:j + size]
+                if is_leaf:
+                    parents.append([self.getBox(children), [child[1] for child in children], True, [child[0] for child in children]])
+                else:
+                    parents.append([self.getBox(children), children, False])
+        return parents
+
+    '''
+    Returns the indexes of the boxes that intersect the box
+    '''
+    def query(self, box):
+        result = []
+        if self.root is not None:
+            stack = [self.root]
+            while len(stack) > 0:
+                node = stack.pop()
+                node_box = node[0]
+                if node_box[0] <= box[2] and node_box[2] >= box[0] and node_box[1] <= box[3] and node_box[3] >= box[1]:
+                    if node[2]:
+                        for index, child_box in zip(node[1], node[3]):
+                            if child_box[0] < box[2] and child_box[2] > box[0] and child_box[1] < box[3] and child_box[3] > box[1]:
+                                result.append(index)
+                    else:
+                        stack.extend(node[1])
+        return sorted(result)
+
+
+'''
+--------------------------------------------------------------------------------
+Virtual mosaic of GeoTIFF tiles.
+
+mosaic = VirtualMosaic.VirtualMosaic(VirtualMosaic.getTileIndex(publish_dtm_folder))
+values = mosaic.read([xmin, ymin, xmax, ymax], cellsize)
+values[0, 0] is the upper left cell
+--------------------------------------------------------------------------------
+'''
+class VirtualMosaic(object):
+
+    def __init__(self, tile_index, block_size=RasterConfig.VIRTUAL_MOSAIC_BLOCK_SIZE, cache_blocks=RasterConfig.VIRTUAL_MOSAIC_CACHE_BLOCKS):
+        self.tile_index = tile_index
+        self.block_size = block_size
+        self.cache_blocks = cache_blocks
+        self.rtree = RTree([tile[XMIN:YMAX + 1] for tile in tile_index])
+        self.cache = OrderedDict()
+        self.datasets = OrderedDict()
+
+    def __getstate__(self):
+        # Open files and cached blocks stay in the process that made them
+        return {"tile_index": self.tile_index, "block_size": self.block_size, "cache_blocks": self.cache_blocks}
+
+    def __setstate__(self, state):
+        self.__init__(state["tile_index"], state["block_size"], state["cache_blocks"])
+
+    def getExtent(self):
+        if len(self.tile_index) <= 0:
+            return None
+        return [min([tile[XMIN] for tile in self.tile_index]), min([tile[YMIN] for tile in self.tile_index]),
+                max([tile[XMAX] for tile in self.tile_index]), max([tile[YMAX] for tile in self.tile_index])]
+
+    def getTiles(self, bbox):
+        return [self.tile_index[index] for index in self.rtree.query(bbox)]
+
+    def getDataset(self, tile_path):
+        dataset = self.datasets.pop(tile_path, None)
+        if dataset is None:
+            dataset = gdal.Open(tile_path)
+            if len(self.datasets) >= RasterConfig.VIRTUAL_MOSAIC_OPEN_FILES:
+                self.datasets.popitem(last=False)
+        self.datasets[tile_path] = dataset
+        return dataset
+
+    '''
+    Reads one block of a tile as float32 with NaN for NoData
+    '''
+    def readBlock(self, tile, block_col, block_row):
+        x_off = block_col * self.block_size
+        y_off = block_row * self.block_size
+        columns = min(self.block_size, tile[COLUMNS] - x_off)
+        rows = min(self.block_size, tile[ROWS] - y_off)
+        nodata = tile[NODATA]
+        if gdal is not None:
+            values = self.getDataset(tile[PATH]).GetRasterBand(1).ReadAsArray(x_off, y_off, columns, rows)
+        else:
+            lower_left = arcpy.Point(tile[XMIN] + x_off * tile[CELL_WIDTH], tile[YMAX] - (y_off + rows) * tile[CELL_HEIGHT])
+            if nodata is None:
+                values = arcpy.RasterToNumPyArray(tile[PATH], lower_left, columns, rows)
+            else:
+                values = arcpy.RasterToNumPyArray(tile[PATH], lower_left, columns, rows, nodata)
+        values = values.astype(numpy.float32)
+        if nodata is not None:
+            values[values == numpy.float32(nodata)] = numpy.nan
+        return values
+
+    def getBlock(self, tile, block_col, block_row):
+        key = (tile[PATH], block_col, block_row)
+        block = self.cache.pop(key, None)
+        if block is None:
+            block = self.readBlock(tile, block_col, block_row)
+            if len(self.cache) >= self.cache_blocks:
+                self.cache.popitem(last=False)
+        self.cache[key] = block
+        return block
+
+    '''
+    Returns the values over bbox [xmin, ymin, xmax, ymax] on a grid of cellsize
+    as a float32 array (rows from the top) with NaN where there is no data
+    '''
+    def read(self, bbox, cellsize):
+        columns = int(math.ceil(round((bbox[2] - bbox[0]) / cellsize, 6)))
+        rows = int(math.ceil(round((bbox[3] - bbox[1]) / cellsize, 6)))
+        result = numpy.full((rows, columns), numpy.nan, dtype=numpy.float32)
+        # Cell centers of the output grid
+        x_centers = bbox[0] + (numpy.arange(columns) + 0.5) * cellsize
+        y_centers = bbox[3] - (numpy.arange(rows) + 0.5) * cellsize
+
+        for tile in self.getTiles(bbox):
+            out_cols = numpy.nonzero((x_centers >= tile[XMIN]) & (x_centers < tile[XMAX]))[0]
+            out_rows = numpy.nonzero((y_centers > tile[YMIN]) & (y_centers <= tile[YMAX]))[0]
+            if len(out_cols) == 0 or len(out_rows) == 0:
+                continue
+
+            src_cols = numpy.minimum(((x_centers[out_cols] - tile[XMIN]) / tile[CELL_WIDTH]).astype(numpy.int64), tile[COLUMNS] - 1)
+            src_rows = numpy.minimum(((tile[YMAX] - y_centers[out_rows]) / tile[CELL_HEIGHT]).astype(numpy.int64), tile[ROWS] - 1)
+            block_cols = src_cols // self.block_size
+            block_rows = src_rows // self.block_size
+            for block_row in numpy.unique(block_rows):
+                row_select = block_rows == block_row
+                for block_col in numpy.unique(block_cols):
+                    col_select = block_cols == block_col
+                    block = self.getBlock(tile, int(block_col), int(block_row))
+                    values = block[numpy.ix_(src_rows[row_select] % self.block_size, src_cols[col_select] % self.block_size)]
+                    window = numpy.ix_(out_rows[row_select], out_cols[col_select])
+                    current = result[window]
+                    fill = numpy.isnan(current)
+                    current[fill] = values[fill]
+                    result[window] = current
+
+        return result
+
+    def close(self):
+        self.datasets.clear()
+        self.cache.clear()
@@ -0,0 +1,133 @@
+'''
+Created on Oct 19, 2026
+
+@author: eric5946
+
+Fixed bin width Z histograms.
+
+A histogram is a sparse dictionary {bin: count} where bin = floor(z / bin_width).
+Tile histograms are built once (reading the raster in blocks) and cached in the
+project statistics store. Adding the tile histograms together gives the project
+histogram, so the Z limits can be recalculated without touching the rasters.
+'''
+import arcpy
+from itertools import izip
+import numpy
+
+from ngce.raster.RasterConfig import Z_HIST_BIN_WIDTH, Z_HIST_BLOCK_SIZE, \
+    Z_HIST_LOW_PERCENT, Z_HIST_HIGH_PERCENT, Z_HIST_MAX_GAP, Z_HIST_BUFFER
+
+
+'''
+--------------------------------------------------------------------------------
+Adds a numpy array of z values to the histogram. NaN values are ignored.
+--------------------------------------------------------------------------------
+'''
+def addValues(histogram, values, bin_width=Z_HIST_BIN_WIDTH):
+    values = values[numpy.isfinite(values)]
+    if values.size > 0:
+        z_bins, counts = numpy.unique(numpy.floor(values / bin_width).astype(numpy.int64), return_counts=True)
+        for z_bin, count in izip(z_bins, counts):
+            z_bin = int(z_bin)
+            histogram[z_bin] = histogram.get(z_bin, 0) + int(count)
+    return histogram
+
+
+'''
+--------------------------------------------------------------------------------
+Creates the histogram of a single band raster, reading it in blocks of
+Z_HIST_BLOCK_SIZE x Z_HIST_BLOCK_SIZE cells so large tiles don't run out of memory
+--------------------------------------------------------------------------------
+'''
+def createRasterHistogram(raster_path, bin_width=Z_HIST_BIN_WIDTH, block_size=Z_HIST_BLOCK_SIZE):
+    histogram = {}
+    raster = arcpy.Raster(raster_path)
+    extent = raster.extent
+    for x in range(0, raster.width, block_size):
+        for y in range(0, raster.height, block_size):
+            # lower left corner of the block, rows are counted from the bottom
+            lower_left = arcpy.Point(extent.XMin + x * raster.meanCellWidth, extent.YMin + y * raster.meanCellHeight)
+            ncols = min(block_size, raster.width - x)
+            nrows = min(block_size, raster.height - y)
+            values = arcpy.RasterToNumPyArray(raster, lower_left, ncols, nrows, numpy.nan).astype(numpy.float64)
+            addValues(histogram, values, bin_width)
+            del values
+
+    del raster
+    return histogram
+
+
+def mergeHistograms(histograms):
+    result = {}
+    for histogram in histograms:
+        for z_bin, count in histogram.iteritems():
+            result[z_bin] = result.get(z_bin, 0) + count
+    return result
+
+
+'''
+--------------------------------------------------------------------------------
+Returns the index (in the sorted bins) of the bin containing the percentile
+--------------------------------------------------------------------------------
+'''
+def getPercentileIndex(z_bins, counts, percent):
+    target = sum(counts) * percent / 100.0
+    total = 0
+    for index, count in enumerate(counts):
+        total = total + count
+        if total >= target:
+            return index
+    return len(z_bins) - 1
+
+
+'''
+--------------------------------------------------------------------------------
+Finds the valid Z range of a histogram.
+
+Starts with the low and high percentile bins and grows outwards as long as
+the data is continuous. A run of more than max_gap empty bins marks the start
+of the outliers (spikes and pits), so everything past it is left out.
+Returns z_min, z_max (None, None if the histogram is empty)
+--------------------------------------------------------------------------------
+'''
+def getZLimits(histogram, bin_width=Z_HIST_BIN_WIDTH, low_percent=Z_HIST_LOW_PERCENT, high_percent=Z_HIST_HIGH_PERCENT, max_gap=Z_HIST_MAX_GAP, buffer_bins=Z_HIST_BUFFER):
+    z_min = None
+    z_max = None
+
+    z_bins = sorted([z_bin for z_bin in histogram.keys() if histogram[z_bin] > 0])
+    if len(z_bins) > 0:
+        counts = [histogram[z_bin] for z_bin in z_bins]
+
+        low_index = getPercentileIndex(z_bins, counts, low_percent)
+        while low_index > 0 and (z_bins[low_index] - z_bins[low_index - 1] - 1) <= max_gap:
+            low_index = low_index - 1
+
+        high_index = getPercentileIndex(z_bins, counts, high_percent)
+        while high_index < len(z_bins) - 1 and (z_bins[high_index + 1] - z_bins[high_index] - 1) <= max_gap:
+            high_index = high_index + 1
+
+        z_min = (z_bins[low_index] - buffer_bins) * bin_width
+        z_max = (z_bins[high_index] + 1 + buffer_bins) * bin_width
+
+    return z_min, z_max
+
+
+'''
+--------------------------------------------------------------------------------
+Merges the tile histograms {f_name: [bin_width, histogram]} from the statistics store
+Tiles with a different bin width than the first one are skipped
+Returns bin_width, histogram
+--------------------------------------------------------------------------------
+'''
+def mergeTileHistograms(tile_histograms):
+    bin_width = None
+    histograms = []
+    for f_name, tile_histogram in tile_histograms.iteritems():
+        if bin_width is None:
+            bin_width = tile_histogram[0]
+        if tile_histogram[0] == bin_width:
+            histograms.append(tile_histogram[1])
+        else:
+            arcpy.AddWarning("WARNING: Z histogram for {} has bin width {} (expected {}), skipping it".format(f_name, tile_histogram[0], bin_width))
+
+    return bin_width, mergeHistograms(histograms)
@@ -0,0 +1,58 @@
+'''
+Created on Oct 19, 2026
+
+@author: eric5946
+
+Incremental overview planning: two sibling first level tiles under the same
+parent where only one of them is dirty.
+'''
+import os
+import shutil
+import tempfile
+import unittest
+
+from ngce.raster import OverviewManifest
+
+
+DIRTY_TILE = (0, 0)
+SIBLING_TILE = (0, 1)
+PARENT_TILE = (0, 0)
+
+
+def getTileRow(level, tile, source_hash, has_data):
+    return ["L{}_R{}_C{}".format(level, tile[0], tile[1]), level, tile[0], tile[1], source_hash, has_data]
+
+
+class IncrementalSiblingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.manifest_path = OverviewManifest.getManifestPath(self.folder)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, True)
+
+    def testChildTiles(self):
+        self.assertEqual(sorted(OverviewManifest.getChildTiles(PARENT_TILE)), [(0, 0), (0, 1), (1, 0), (1, 1)])
+        self.assertTrue(DIRTY_TILE in OverviewManifest.getChildTiles(PARENT_TILE))
+        self.assertTrue(SIBLING_TILE in OverviewManifest.getChildTiles(PARENT_TILE))
+
+    def testUnseededSibling(self):
+        # First incremental run: only the dirty tile was rendered, the sibling has data from before the manifest
+        OverviewManifest.setTileHashes(self.manifest_path, [getTileRow(0, DIRTY_TILE, "new", 1)])
+        child_hashes = OverviewManifest.getTileHashes(self.manifest_path, 0)
+        self.assertEqual(OverviewManifest.getUnseededTiles([PARENT_TILE], child_hashes), [PARENT_TILE])
+
+    def testSeededSibling(self):
+        # A full build seeded every child (the ones without data too), then only the dirty tile changed
+        OverviewManifest.setTileHashes(self.manifest_path, [getTileRow(0, child, "old", 0) for child in OverviewManifest.getChildTiles(PARENT_TILE)])
+        OverviewManifest.setTileHashes(self.manifest_path, [getTileRow(0, SIBLING_TILE, "old", 1)])
+        OverviewManifest.setTileHashes(self.manifest_path, [getTileRow(0, DIRTY_TILE, "new", 1)])
+        child_hashes = OverviewManifest.getTileHashes(self.manifest_path, 0)
+        self.assertEqual(child_hashes[DIRTY_TILE], ["new", True])
+        self.assertEqual(child_hashes[SIBLING_TILE], ["old", True])
+        self.assertEqual(OverviewManifest.getUnseededTiles([PARENT_TILE], child_hashes), [])
+
+
+if __name__ == "__main__":
+    unittest.main()